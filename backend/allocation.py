@@ -0,0 +1,244 @@
+"""
+设备分配
+租赁申请按装备类型分配多台在库设备：原先先按编号 count（编号唯一，结果恒为 1），
+再按类型 limit(quantity) 查询，不加锁直接使用，两个并发申请可能分到同一台设备。
+现在一条 SELECT ... FOR UPDATE SKIP LOCKED 选出 N 台在库设备并加行锁（已被其他事务锁定的设备直接跳过，
+不排队等待），随后在同一事务中标记为出库（与 trg_order_created 的设计一致），事务提交后其他申请不会再选中。
+直接创建订单（/api/orders、/api/orders/batch）时明细指定的设备同样经此分配（order_requests），
+订单取消、申请被拒绝时由 release_order 放回在库，各条下单路径的设备状态一致。
+没有行锁的数据库（SQLite）上以条件 UPDATE 校验：设备已被并发请求抢先时抛出 AllocationConflict，由调用方回滚重试
+用法:
+    python allocation.py stress --threads 32 --units 500 --quantity 3    # 多线程并发分配，检查是否重复分配
+"""
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+import availability
+import models
+from database import SessionLocal
+
+
+# 分配冲突时的重试次数
+ALLOCATION_RETRIES = 3
+
+
+class AllocationConflict(RuntimeError):
+    """候选设备在选出后被并发请求抢先分配（仅出现在不支持行锁的数据库上），回滚后重试即可"""
+
+
+def allocate(
+    db: Session,
+    category: str,
+    quantity: int,
+    equipment_id: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    在调用方事务中分配 quantity 台指定类型的在库设备并标记为出库
+    传入 equipment_id 时只分配该设备（quantity 须为 1）。
+    可分配数量不足时不做任何修改，返回的 equipment 为空、available 为当前可分配数量；
+    返回 {"category", "requested", "available", "equipment": [Equipment]}
+    """
+    query = db.query(models.Equipment).filter(
+        models.Equipment.category == category,
+        models.Equipment.status == models.EquipmentStatus.IN_STOCK,
+        models.Equipment.is_deleted == 0
+    )
+    if equipment_id is not None:
+        query = query.filter(models.Equipment.equipment_id == equipment_id)
+    # idx_equipment_allocation (is_deleted, category, status, equipment_id) 按主键有序，LIMIT 只锁定选中的行
+    candidates = query.order_by(models.Equipment.equipment_id).limit(quantity).with_for_update(skip_locked=True).all()
+
+    result = {"category": category, "requested": quantity, "available": len(candidates), "equipment": []}
+    if len(candidates) < quantity:
+        return result
+
+    ids = [equipment.equipment_id for equipment in candidates]
+    claimed = db.execute(
+        update(models.Equipment)
+        .where(
+            models.Equipment.equipment_id.in_(ids),
+            models.Equipment.status == models.EquipmentStatus.IN_STOCK
+        )
+        .values(status=models.EquipmentStatus.OUT, updated_at=datetime.now())
+        .execution_options(synchronize_session=False, availability_tracked=True)
+    ).rowcount
+    if claimed != len(ids):
+        raise AllocationConflict(f"{category} 的候选设备已被其他申请分配")
+    # 已由上面的 UPDATE 写入，只同步已加载对象的状态，不再逐台生成 UPDATE
+    for equipment in candidates:
+        set_committed_value(equipment, "status", models.EquipmentStatus.OUT)
+    availability.record_status(db, ids, models.EquipmentStatus.OUT)
+    result["equipment"] = candidates
+    return result
+
+
+def allocate_batch(
+    db: Session,
+    requests: List[Dict[str, Any]],
+    retries: int = ALLOCATION_RETRIES
+) -> List[Dict[str, Any]]:
+    """
+    在同一事务中依次分配多个请求，每个请求为 {"category", "quantity", "equipment_id"（可选）}
+    各请求独立：可分配数量不足的请求不分配，不影响其他请求；返回结果与 requests 顺序一致
+    发生 AllocationConflict 时回滚事务并整体重试，须在事务中的其他写入之前调用
+    """
+    for attempt in range(retries):
+        try:
+            return [
+                allocate(db, request["category"], request["quantity"], request.get("equipment_id"))
+                for request in requests
+            ]
+        except AllocationConflict:
+            db.rollback()
+            if attempt == retries - 1:
+                raise
+    return []
+
+
+def order_requests(db: Session, orders: List[Any]) -> List[Dict[str, Any]]:
+    """
+    订单明细指定的设备逐台转为分配请求（{"category", "quantity": 1, "equipment_id"}），顺序与明细一致；
+    orders 为 schemas.LeaseOrderCreate，明细中不存在或已删除的设备 category 为 None，由调用方报错
+    """
+    equipment_ids = {item.equipment_id for order in orders for item in order.order_items}
+    categories = dict(
+        db.query(models.Equipment.equipment_id, models.Equipment.category).filter(
+            models.Equipment.equipment_id.in_(equipment_ids),
+            models.Equipment.is_deleted == 0
+        ).all()
+    ) if equipment_ids else {}
+    return [
+        {"category": categories.get(item.equipment_id), "quantity": 1, "equipment_id": item.equipment_id}
+        for order in orders for item in order.order_items
+    ]
+
+
+def release(db: Session, equipment_ids: List[int]) -> int:
+    """将分配后仍处于出库状态的设备放回在库（申请被拒绝、订单取消时调用），返回放回的台数"""
+    if not equipment_ids:
+        return 0
+    # 不知道其中哪些设备仍为出库状态，不登记到可用性索引，提交后索引重建
+    return db.execute(
+        update(models.Equipment)
+        .where(
+            models.Equipment.equipment_id.in_(equipment_ids),
+            models.Equipment.status == models.EquipmentStatus.OUT
+        )
+        .values(status=models.EquipmentStatus.IN_STOCK, updated_at=datetime.now())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def release_order(db: Session, order: models.LeaseOrder) -> int:
+    """
+    订单取消时放回其明细的设备（在调用方事务中），已取消或已完结的订单不处理；返回放回的台数
+    """
+    if order.status in (models.OrderStatus.CANCELLED, models.OrderStatus.COMPLETED):
+        return 0
+    equipment_ids = [
+        equipment_id for (equipment_id,) in db.query(models.OrderItem.equipment_id).filter(
+            models.OrderItem.order_id == order.order_id
+        ).all()
+    ]
+    return release(db, equipment_ids)
+
+
+# ========== 命令行 ==========
+STRESS_CATEGORY = "_allocation_stress"
+
+
+def stress(threads: int, units: int, quantity: int) -> Dict[str, Any]:
+    """
+    多线程并发分配：创建 units 台临时设备，各线程每次分配 quantity 台直到分配完，
+    检查没有设备被分配两次、分配总数等于设备数；结束后删除临时设备
+    """
+    db = SessionLocal()
+    try:
+        db.add_all([
+            models.Equipment(
+                equipment_code=f"STRESS-{i:06d}",
+                equipment_name="分配压测设备",
+                category=STRESS_CATEGORY
+            )
+            for i in range(units)
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+    allocated: List[int] = []
+    counters = {"requests": 0, "conflicts": 0}
+    lock = threading.Lock()
+
+    def worker(_):
+        session = SessionLocal()
+        try:
+            while True:
+                try:
+                    result = allocate(session, STRESS_CATEGORY, quantity)
+                    session.commit()
+                except AllocationConflict:
+                    session.rollback()
+                    with lock:
+                        counters["conflicts"] += 1
+                    continue
+                with lock:
+                    counters["requests"] += 1
+                    allocated.extend(equipment.equipment_id for equipment in result["equipment"])
+                if not result["equipment"]:
+                    return
+        finally:
+            session.close()
+
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(worker, range(threads)))
+        elapsed = time.perf_counter() - started
+    finally:
+        db = SessionLocal()
+        try:
+            db.query(models.Equipment).filter(models.Equipment.category == STRESS_CATEGORY).delete(
+                synchronize_session=False
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    granted = len(allocated) // quantity
+    return {
+        "units": units,
+        "allocated": len(allocated),
+        "duplicates": len(allocated) - len(set(allocated)),
+        "requests": counters["requests"],
+        "conflicts": counters["conflicts"],
+        "allocations_per_second": round(granted / elapsed, 1) if elapsed else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="设备分配")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    stress_parser = subparsers.add_parser("stress", help="多线程并发分配，检查是否重复分配")
+    stress_parser.add_argument("--threads", type=int, default=32, help="并发线程数")
+    stress_parser.add_argument("--units", type=int, default=500, help="临时设备数")
+    stress_parser.add_argument("--quantity", type=int, default=3, help="每次分配的台数")
+    args = parser.parse_args()
+
+    result = stress(args.threads, args.units, args.quantity)
+    print(result)
+    expected = args.units - args.units % args.quantity
+    return 1 if result["duplicates"] or result["allocated"] != expected else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
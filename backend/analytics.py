@@ -0,0 +1,105 @@
+"""
+统计分析聚合引擎
+按时间窗口一次性完成分组聚合，再在 Python 中补齐缺失日期，
+避免"每天一次查询"带来的 O(天数 × 指标) 次数据库往返
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+from datetime import datetime, date, timedelta
+
+# day_start 迁移至 date_ranges，这里继续导出供 analytics.day_start 调用
+from date_ranges import between_days, day_start
+
+
+def date_window(end_day: date, days: int) -> List[date]:
+    """生成以 end_day 结尾、长度为 days 的连续日期列表（升序）"""
+    return [end_day - timedelta(days=i) for i in range(days - 1, -1, -1)]
+
+
+def as_date(value) -> Optional[date]:
+    """将数据库返回的日期值统一转换为 date（不同驱动可能返回 str/datetime/date）"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def daily_aggregates_query(
+    db: Session,
+    date_column,
+    aggregates: Dict[str, Any],
+    days: List[date],
+    filters: Iterable = (),
+    joins: Iterable[Tuple[Any, Any]] = (),
+    source=None
+):
+    """构造 daily_aggregates 的分组查询（不执行），DATE() 只出现在分组列上，过滤条件为半开区间"""
+    day_col = func.date(date_column).label("day")
+    query = db.query(day_col, *[expr.label(name) for name, expr in aggregates.items()])
+    if source is not None:
+        query = query.select_from(source)
+    for target, onclause in joins:
+        query = query.join(target, onclause)
+    return query.filter(*filters, between_days(date_column, days[0], days[-1])).group_by(day_col)
+
+
+def daily_aggregates(
+    db: Session,
+    date_column,
+    aggregates: Dict[str, Any],
+    days: List[date],
+    filters: Iterable = (),
+    joins: Iterable[Tuple[Any, Any]] = (),
+    source=None
+) -> Dict[date, Dict[str, Any]]:
+    """
+    对一个事实表按天分组，一次查询得到整个窗口内的多个聚合指标
+
+    - date_column: 用于分组的时间列（DATETIME）
+    - aggregates: {指标名: 聚合表达式}
+    - days: 日期窗口（升序），查询使用半开区间 [首日零点, 末日次日零点)
+    - filters / joins: 额外的过滤条件与关联
+    返回 {日期: {指标名: 值}}，没有数据的日期不会出现在结果中
+    """
+    query = daily_aggregates_query(db, date_column, aggregates, days, filters, joins, source)
+    result = {}
+    for row in query.all():
+        result[as_date(row.day)] = {name: getattr(row, name) for name in aggregates}
+    return result
+
+
+def fill_series(
+    days: List[date],
+    rows: Dict[date, Dict[str, Any]],
+    metric: str,
+    default=0,
+    cast=int
+) -> List[Any]:
+    """按日期窗口补齐某个指标的序列，缺失日期使用默认值"""
+    series = []
+    for day in days:
+        value = rows.get(day, {}).get(metric)
+        series.append(cast(value) if value is not None else default)
+    return series
+
+
+def count_active_per_day(
+    intervals: Iterable[Tuple[Optional[date], Optional[date]]],
+    days: List[date]
+) -> List[int]:
+    """
+    统计每天处于活动状态的区间数量
+    区间 (start, end) 在某天 d 活动的条件：start <= d 且 (end 为空 或 end > d)
+    """
+    counts = [0] * len(days)
+    for start, end in intervals:
+        if start is None:
+            continue
+        for idx, day in enumerate(days):
+            if start <= day and (end is None or end > day):
+                counts[idx] += 1
+    return counts
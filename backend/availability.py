@@ -0,0 +1,579 @@
+"""
+设备可用性索引与预订日历
+租赁申请、出库、库存页面反复向数据库询问"X 类型有哪些在库设备""编号 Y 是否在库""维修中有几台"。
+本模块在进程内维护设备的可用性索引：每个 (类型, 状态) 一个按主键排序的设备ID数组，另有编号到设备的映射，
+上述问题在内存中以微秒级回答。索引的维护：
+- 服务启动时从 equipment 表构建
+- 本进程经 ORM 会话写入的设备变更在 after_flush 中收集，事务提交后增量更新，回滚时丢弃；
+  批量 UPDATE 由调用方通过 record_status 登记（见 allocation.py）
+- 未登记的批量写入，以及插入时数据库触发器会修改设备状态的表（质检、出入库记录）提交后，
+  索引标记为过期，下次查询时重建
+- 其他进程与绕过 ORM 的写入由定期核对（AVAILABILITY_RECONCILE_SECONDS）修正，核对时记录偏差台数
+索引只用于查询与展示，分配设备仍以数据库的行锁与条件 UPDATE 为准（见 allocation.py）
+
+设备状态不含日期：看不出设备被哪段日期占用，"设备 X 在 3/1 ~ 3/9 是否空闲"需要按日期扫描
+订单明细关联订单。预订日历（BookingCalendar）在进程内按设备保存预订区间（订单开始日 ~ 实际 / 预计归还日，两端都含：
+归还日当天设备仍被占用，与利用率 utilization.py 的在租判定相同），
+按开始日排序并记录前缀最大结束日，一次重叠判断为一次二分查找；写入过的订单在提交后登记，下次查询时只重新读取这些订单
+"""
+import asyncio
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from datetime import date, datetime
+from itertools import accumulate
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+import models
+from cache import on_tables_written
+from database import SessionLocal
+
+STATUSES = tuple(status.name for status in models.EquipmentStatus)
+
+# 插入时数据库触发器会修改设备状态的表（见 migrations/create_triggers_fixed.sql），提交写入后索引标记为过期。
+# trg_order_created 在订单明细写入之前触发，不会修改设备状态，lease_orders 不在其列
+TRIGGER_SOURCES = {"inspection_records", "outbound_records", "inbound_records"}
+
+# 单台设备：(编号, 类型, 状态名称)；只登记了状态的变更编号与类型为 None
+Unit = Tuple[Optional[str], Optional[str], str]
+
+# 会话中待提交的设备变更 {设备ID: Unit 或 None（删除）} 与未登记批量写入的标记
+_CHANGES_KEY = "availability_changes"
+_UNTRACKED_KEY = "availability_untracked"
+# 会话中写入过的订单ID 与无法确定订单的批量写入标记（预订日历）
+_ORDERS_KEY = "availability_orders"
+_ORDERS_UNTRACKED_KEY = "availability_orders_untracked"
+
+
+def _status_name(status) -> str:
+    return status.name if isinstance(status, models.EquipmentStatus) else status
+
+
+class _State:
+    """索引数据：设备、编号映射与每个 (类型, 状态) 的有序ID数组"""
+
+    def __init__(self):
+        self.units: Dict[int, Unit] = {}
+        self.codes: Dict[str, int] = {}
+        self.ids: Dict[Tuple[str, str], List[int]] = {}
+
+    def remove(self, equipment_id: int):
+        unit = self.units.pop(equipment_id, None)
+        if unit is None:
+            return
+        code, category, status = unit
+        if self.codes.get(code) == equipment_id:
+            del self.codes[code]
+        ids = self.ids[(category, status)]
+        del ids[bisect_left(ids, equipment_id)]
+
+    def set(self, equipment_id: int, unit: Optional[Unit]) -> bool:
+        """写入一台设备（None 为删除）；只有状态的变更对应的设备不在索引中时返回 False"""
+        if unit is not None and unit[0] is None:
+            current = self.units.get(equipment_id)
+            if current is None:
+                return False
+            unit = (current[0], current[1], unit[2])
+        self.remove(equipment_id)
+        if unit is not None:
+            code, category, status = unit
+            self.units[equipment_id] = unit
+            self.codes[code] = equipment_id
+            insort(self.ids.setdefault((category, status), []), equipment_id)
+        return True
+
+
+class AvailabilityIndex:
+    """设备可用性索引（线程安全）；首次查询或标记过期后的查询会先从数据库重建"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._state: Optional[_State] = None
+        # 每次标记过期递增；重建开始时记录，重建期间再次标记过期时重建后仍为过期
+        self._stale_generation = 0
+        self._stale_since: Optional[datetime] = None
+        # 重建期间提交的增量，重建完成后重放到新数据上
+        self._journal: Optional[List[Dict[int, Optional[Unit]]]] = None
+        self.built_at: Optional[datetime] = None
+        self.build_ms = 0.0
+        self.builds = 0
+        self.changes_applied = 0
+        self.last_change_at: Optional[datetime] = None
+        self.reconciled_at: Optional[datetime] = None
+        self.last_drift: Optional[int] = None
+
+    # ---------- 维护 ----------
+    def rebuild(self) -> int:
+        """从数据库重建索引，返回与重建前不一致的设备台数（首次构建为 0）"""
+        with self._build_lock:
+            with self._lock:
+                generation = self._stale_generation
+                self._journal = []
+            started = time.perf_counter()
+            try:
+                db = SessionLocal()
+                try:
+                    rows = db.execute(
+                        select(
+                            models.Equipment.equipment_id,
+                            models.Equipment.equipment_code,
+                            models.Equipment.category,
+                            models.Equipment.status
+                        ).where(models.Equipment.is_deleted == 0)
+                    ).all()
+                finally:
+                    db.close()
+            except BaseException:
+                with self._lock:
+                    self._journal = None
+                raise
+
+            state = _State()
+            for equipment_id, code, category, status in sorted(rows):
+                state.units[equipment_id] = (code, category, _status_name(status))
+                state.codes[code] = equipment_id
+                state.ids.setdefault((category, _status_name(status)), []).append(equipment_id)
+
+            with self._lock:
+                # 构建期间提交的变更可能未包含在读取结果中，重放一遍（变更为最终值，重复应用无影响）
+                for changes in self._journal:
+                    for equipment_id, unit in changes.items():
+                        state.set(equipment_id, unit)
+                self._journal = None
+                previous = self._state
+                drift = 0
+                if previous is not None:
+                    drift = sum(
+                        1 for equipment_id in previous.units.keys() | state.units.keys()
+                        if previous.units.get(equipment_id) != state.units.get(equipment_id)
+                    )
+                self._state = state
+                if generation == self._stale_generation:
+                    self._stale_since = None
+                self.built_at = datetime.now()
+                self.build_ms = round((time.perf_counter() - started) * 1000, 2)
+                self.builds += 1
+            return drift
+
+    def reconcile(self) -> int:
+        """与数据库核对（重建），记录偏差台数"""
+        drift = self.rebuild()
+        with self._lock:
+            self.last_drift = drift
+            self.reconciled_at = datetime.now()
+        return drift
+
+    def mark_stale(self):
+        """标记过期，下次查询时重建"""
+        with self._lock:
+            self._stale_generation += 1
+            if self._stale_since is None:
+                self._stale_since = datetime.now()
+
+    def apply(self, changes: Dict[int, Optional[Unit]]):
+        """应用已提交的设备变更"""
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append(changes)
+            if self._state is None:
+                return
+            unknown = [equipment_id for equipment_id, unit in changes.items() if not self._state.set(equipment_id, unit)]
+            self.changes_applied += len(changes)
+            self.last_change_at = datetime.now()
+        if unknown:
+            self.mark_stale()
+
+    def _current(self) -> _State:
+        with self._lock:
+            if self._state is not None and self._stale_since is None:
+                return self._state
+        self.rebuild()
+        with self._lock:
+            return self._state
+
+    # ---------- 查询 ----------
+    def ids(self, category: str, status: str = models.EquipmentStatus.IN_STOCK.name, limit: Optional[int] = None) -> List[int]:
+        """指定类型、状态的设备ID（按主键升序），limit 为最多返回的个数"""
+        state = self._current()
+        with self._lock:
+            ids = state.ids.get((category, status), [])
+            return ids[:limit] if limit is not None else list(ids)
+
+    def count(self, category: Optional[str] = None, status: Optional[str] = None) -> int:
+        """设备台数，category / status 为空时不按该项筛选"""
+        state = self._current()
+        with self._lock:
+            return sum(
+                len(ids) for (unit_category, unit_status), ids in state.ids.items()
+                if (category is None or unit_category == category) and (status is None or unit_status == status)
+            )
+
+    def lookup(self, equipment_code: str) -> Optional[Dict[str, Any]]:
+        """按编号查找设备，不存在（或已删除）时返回 None"""
+        state = self._current()
+        with self._lock:
+            equipment_id = state.codes.get(equipment_code)
+            if equipment_id is None:
+                return None
+            _, category, status = state.units[equipment_id]
+        return {"equipment_id": equipment_id, "equipment_code": equipment_code, "category": category, "status": status}
+
+    def units(self, equipment_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        """多台设备的编号、类型与状态，不存在（或已删除）的设备不在结果中"""
+        state = self._current()
+        with self._lock:
+            return {
+                equipment_id: {"equipment_id": equipment_id, "equipment_code": unit[0], "category": unit[1], "status": unit[2]}
+                for equipment_id in equipment_ids if (unit := state.units.get(equipment_id))
+            }
+
+    def is_in_stock(self, equipment_code: str) -> bool:
+        """编号对应的设备是否在库"""
+        unit = self.lookup(equipment_code)
+        return unit is not None and unit["status"] == models.EquipmentStatus.IN_STOCK.name
+
+    def summary(self, category: Optional[str] = None) -> Dict[str, Dict[str, int]]:
+        """各类型各状态的设备台数 {类型: {状态: 台数}}"""
+        state = self._current()
+        with self._lock:
+            result: Dict[str, Dict[str, int]] = {}
+            for (unit_category, status), ids in sorted(state.ids.items()):
+                if ids and (category is None or unit_category == category):
+                    result.setdefault(unit_category, dict.fromkeys(STATUSES, 0))[status] = len(ids)
+            return result
+
+    def freshness(self) -> Dict[str, Any]:
+        """索引的新鲜度：构建 / 核对时间、增量更新次数、是否过期及最近一次核对的偏差"""
+        with self._lock:
+            now = datetime.now()
+            return {
+                "built": self._state is not None,
+                "units": len(self._state.units) if self._state is not None else 0,
+                "built_at": self.built_at,
+                "age_seconds": round((now - self.built_at).total_seconds(), 1) if self.built_at else None,
+                "build_ms": self.build_ms,
+                "builds": self.builds,
+                "changes_applied": self.changes_applied,
+                "last_change_at": self.last_change_at,
+                "stale": self._stale_since is not None,
+                "stale_since": self._stale_since,
+                "reconciled_at": self.reconciled_at,
+                "last_drift": self.last_drift,
+            }
+
+
+index = AvailabilityIndex()
+
+
+def record_status(db: Session, equipment_ids: Iterable[int], status: models.EquipmentStatus):
+    """登记调用方以批量 UPDATE 修改的设备状态，随会话提交更新索引（批量语句需带 availability_tracked 执行选项）"""
+    changes = db.info.setdefault(_CHANGES_KEY, {})
+    for equipment_id in equipment_ids:
+        changes[equipment_id] = (None, None, status.name)
+
+
+# ========== 预订日历 ==========
+# 未填预计归还日的未完结订单一直占用设备
+OPEN_END = date.max
+# 刷新订单的预订区间时每条 IN 查询的订单数
+REFRESH_CHUNK = 500
+
+# 一次预订：(开始日, 结束日（含）, 订单ID, 订单编号)
+Booking = Tuple[date, date, int, str]
+
+
+def _booking_end(status, start_date: date, expected_return_date: Optional[date], actual_return_date: Optional[date]) -> date:
+    """预订的结束日（含）：已归还取实际归还日，否则取预计归还日；都未填写时已完结订单只占开始日，其余一直占用"""
+    if actual_return_date:
+        return actual_return_date
+    if expected_return_date:
+        return expected_return_date
+    return start_date if status == models.OrderStatus.COMPLETED else OPEN_END
+
+
+class _Bookings:
+    """单台设备的预订区间：按开始日排序，max_ends[i] 为前 i + 1 个区间结束日的最大值"""
+
+    __slots__ = ("entries", "starts", "max_ends")
+
+    def __init__(self, entries: Iterable[Booking]):
+        self.entries = sorted(entries)
+        self.starts = [booking[0] for booking in self.entries]
+        self.max_ends = list(accumulate((booking[1] for booking in self.entries), max))
+
+    def overlaps(self, start: date, end: date) -> bool:
+        """[start, end] 内是否有预订：开始日不晚于 end 的区间中最大的结束日不早于 start"""
+        k = bisect_right(self.starts, end)
+        return k > 0 and self.max_ends[k - 1] >= start
+
+    def conflicts(self, start: date, end: date) -> List[Booking]:
+        """与 [start, end] 重叠的预订（按开始日排序）"""
+        result = []
+        # 从开始日不晚于 end 的最后一个区间往前找，前缀最大结束日早于 start 时更早的区间都不重叠
+        i = bisect_right(self.starts, end) - 1
+        while i >= 0 and self.max_ends[i] >= start:
+            if self.entries[i][1] >= start:
+                result.append(self.entries[i])
+            i -= 1
+        result.reverse()
+        return result
+
+
+class BookingCalendar:
+    """按设备的预订日历（线程安全）；首次查询或标记过期后的查询会先从数据库重建，有待刷新的订单时先刷新这些订单"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._units: Optional[Dict[int, _Bookings]] = None
+        # 订单ID -> 该订单预订的设备ID
+        self._orders: Dict[int, Set[int]] = {}
+        # 已提交写入、尚未重新读取的订单
+        self._pending: Set[int] = set()
+        self._stale_generation = 0
+        self._stale_since: Optional[datetime] = None
+        self.built_at: Optional[datetime] = None
+        self.build_ms = 0.0
+        self.builds = 0
+        self.orders_refreshed = 0
+        self.last_refresh_at: Optional[datetime] = None
+
+    @staticmethod
+    def _load(order_ids: Optional[List[int]] = None) -> List[Tuple[int, Booking]]:
+        """读取订单明细的预订区间 [(设备ID, Booking)]，order_ids 为空时读取全部未取消的订单"""
+        query = select(
+            models.OrderItem.equipment_id,
+            models.LeaseOrder.order_id,
+            models.LeaseOrder.order_code,
+            models.LeaseOrder.status,
+            models.LeaseOrder.start_date,
+            models.LeaseOrder.expected_return_date,
+            models.LeaseOrder.actual_return_date
+        ).join(
+            models.LeaseOrder, models.LeaseOrder.order_id == models.OrderItem.order_id
+        ).where(
+            models.LeaseOrder.is_deleted == 0,
+            models.LeaseOrder.status != models.OrderStatus.CANCELLED
+        )
+        if order_ids is not None:
+            query = query.where(models.LeaseOrder.order_id.in_(order_ids))
+        db = SessionLocal()
+        try:
+            rows = db.execute(query).all()
+        finally:
+            db.close()
+        return [
+            (equipment_id, (start_date, _booking_end(status, start_date, expected, actual), order_id, order_code))
+            for equipment_id, order_id, order_code, status, start_date, expected, actual in rows
+        ]
+
+    # ---------- 维护 ----------
+    def rebuild(self):
+        """从数据库重建日历"""
+        with self._build_lock:
+            with self._lock:
+                generation = self._stale_generation
+                # 重建期间提交的订单重新登记，下次查询时刷新
+                self._pending.clear()
+            started = time.perf_counter()
+            grouped: Dict[int, List[Booking]] = {}
+            orders: Dict[int, Set[int]] = {}
+            for equipment_id, booking in self._load():
+                grouped.setdefault(equipment_id, []).append(booking)
+                orders.setdefault(booking[2], set()).add(equipment_id)
+            units = {equipment_id: _Bookings(entries) for equipment_id, entries in grouped.items()}
+            with self._lock:
+                self._units, self._orders = units, orders
+                if generation == self._stale_generation:
+                    self._stale_since = None
+                self.built_at = datetime.now()
+                self.build_ms = round((time.perf_counter() - started) * 1000, 2)
+                self.builds += 1
+
+    def _refresh(self):
+        """重新读取已提交写入的订单，替换这些订单在各设备上的预订"""
+        with self._build_lock:
+            with self._lock:
+                order_ids = sorted(self._pending)
+                self._pending.clear()
+            if not order_ids:
+                return
+            try:
+                rows = []
+                for i in range(0, len(order_ids), REFRESH_CHUNK):
+                    rows.extend(self._load(order_ids[i:i + REFRESH_CHUNK]))
+            except BaseException:
+                with self._lock:
+                    self._pending.update(order_ids)
+                raise
+
+            refreshed = set(order_ids)
+            loaded: Dict[int, List[Booking]] = {}
+            for equipment_id, booking in rows:
+                loaded.setdefault(equipment_id, []).append(booking)
+            with self._lock:
+                touched = set(loaded)
+                for order_id in order_ids:
+                    touched |= self._orders.pop(order_id, set())
+                for equipment_id, booking in rows:
+                    self._orders.setdefault(booking[2], set()).add(equipment_id)
+                for equipment_id in touched:
+                    current = self._units.get(equipment_id)
+                    entries = [booking for booking in current.entries if booking[2] not in refreshed] if current else []
+                    entries.extend(loaded.get(equipment_id, []))
+                    if entries:
+                        self._units[equipment_id] = _Bookings(entries)
+                    else:
+                        self._units.pop(equipment_id, None)
+                self.orders_refreshed += len(order_ids)
+                self.last_refresh_at = datetime.now()
+
+    def orders_written(self, order_ids: Iterable[int]):
+        """登记已提交写入的订单，下次查询时重新读取"""
+        with self._lock:
+            self._pending.update(order_ids)
+
+    def mark_stale(self):
+        """标记过期，下次查询时重建"""
+        with self._lock:
+            self._stale_generation += 1
+            if self._stale_since is None:
+                self._stale_since = datetime.now()
+
+    def _current(self) -> Dict[int, _Bookings]:
+        with self._lock:
+            stale = self._units is None or self._stale_since is not None
+            pending = bool(self._pending)
+        if stale:
+            self.rebuild()
+        elif pending:
+            self._refresh()
+        with self._lock:
+            return self._units
+
+    # ---------- 查询 ----------
+    def is_free(self, equipment_id: int, start: date, end: date) -> bool:
+        """设备在 [start, end]（含两端）内是否没有预订"""
+        units = self._current()
+        with self._lock:
+            bookings = units.get(equipment_id)
+        return bookings is None or not bookings.overlaps(start, end)
+
+    def conflicts(self, equipment_ids: Iterable[int], start: date, end: date) -> Dict[int, List[Booking]]:
+        """多台设备在 [start, end]（含两端）内的预订 {设备ID: [Booking]}，没有预订的设备为空列表"""
+        units = self._current()
+        with self._lock:
+            selected = {equipment_id: units.get(equipment_id) for equipment_id in equipment_ids}
+        return {
+            equipment_id: bookings.conflicts(start, end) if bookings is not None and bookings.overlaps(start, end) else []
+            for equipment_id, bookings in selected.items()
+        }
+
+    def freshness(self) -> Dict[str, Any]:
+        """日历的新鲜度：构建时间、待刷新订单数、增量刷新次数、是否过期"""
+        with self._lock:
+            now = datetime.now()
+            return {
+                "built": self._units is not None,
+                "units": len(self._units) if self._units is not None else 0,
+                "bookings": sum(len(bookings.entries) for bookings in self._units.values()) if self._units is not None else 0,
+                "built_at": self.built_at,
+                "age_seconds": round((now - self.built_at).total_seconds(), 1) if self.built_at else None,
+                "build_ms": self.build_ms,
+                "builds": self.builds,
+                "pending_orders": len(self._pending),
+                "orders_refreshed": self.orders_refreshed,
+                "last_refresh_at": self.last_refresh_at,
+                "stale": self._stale_since is not None,
+                "stale_since": self._stale_since,
+            }
+
+
+bookings = BookingCalendar()
+
+
+async def reconcile_periodically(interval: float):
+    """后台任务：每 interval 秒与数据库核对一次（在线程池中执行），预订日历同时重建"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            drift = await asyncio.to_thread(index.reconcile)
+            if drift:
+                print(f"设备可用性索引核对：修正 {drift} 台设备")
+            await asyncio.to_thread(bookings.rebuild)
+        except Exception as e:
+            print(f"设备可用性索引核对失败: {e}")
+
+
+# ========== 写入追踪 ==========
+@event.listens_for(Session, "after_flush")
+def _collect_flushed_units(session, flush_context):
+    changes = None
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, models.Equipment):
+            continue
+        if changes is None:
+            changes = session.info.setdefault(_CHANGES_KEY, {})
+        if obj in session.deleted or obj.is_deleted:
+            changes[obj.equipment_id] = None
+        else:
+            changes[obj.equipment_id] = (obj.equipment_code, obj.category, _status_name(obj.status))
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed_orders(session, flush_context):
+    order_ids = None
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (models.LeaseOrder, models.OrderItem)):
+            if order_ids is None:
+                order_ids = session.info.setdefault(_ORDERS_KEY, set())
+            order_ids.add(obj.order_id)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk_writes(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    table = getattr(getattr(orm_execute_state.statement, "table", None), "name", None)
+    info = orm_execute_state.session.info
+    # 未登记的批量写入无法得知修改了哪些设备，提交后整体重建
+    if table == models.Equipment.__tablename__ and not orm_execute_state.execution_options.get("availability_tracked"):
+        info[_UNTRACKED_KEY] = True
+    # 订单、明细的批量写入：参数行都带订单ID时只刷新这些订单；新订单行本身不产生预订，明细写入时再登记
+    if table in (models.LeaseOrder.__tablename__, models.OrderItem.__tablename__):
+        parameters = orm_execute_state.parameters
+        rows = parameters if isinstance(parameters, list) else [parameters] if parameters else []
+        if rows and all("order_id" in row for row in rows):
+            info.setdefault(_ORDERS_KEY, set()).update(row["order_id"] for row in rows)
+        elif not (orm_execute_state.is_insert and table == models.LeaseOrder.__tablename__):
+            info[_ORDERS_UNTRACKED_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_committed_units(session):
+    changes = session.info.pop(_CHANGES_KEY, None)
+    if session.info.pop(_UNTRACKED_KEY, False):
+        index.mark_stale()
+    if changes:
+        index.apply(changes)
+    order_ids = session.info.pop(_ORDERS_KEY, None)
+    if session.info.pop(_ORDERS_UNTRACKED_KEY, False):
+        bookings.mark_stale()
+    if order_ids:
+        bookings.orders_written(order_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back_units(session):
+    for key in (_CHANGES_KEY, _UNTRACKED_KEY, _ORDERS_KEY, _ORDERS_UNTRACKED_KEY):
+        session.info.pop(key, None)
+
+
+@on_tables_written
+def _mark_stale_after_triggers(tables):
+    if tables & TRIGGER_SOURCES:
+        index.mark_stale()
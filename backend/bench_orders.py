@@ -0,0 +1,178 @@
+"""
+批量下单压测
+对比逐个创建订单（crud.create_order：明细逐行插入，MySQL 上触发器逐行重算订单金额）与
+批量创建（crud.create_orders_batch：订单、明细各一条批量 INSERT，每个订单更新一次金额）的
+吞吐量与执行的 SQL 语句数，并核对两种方式的明细数、小计合计一致（MySQL 上逐个创建的订单金额由触发器计算，
+同时核对订单金额）。
+使用临时客户与设备，结束后删除本次创建的订单、明细、设备与客户
+
+用法:
+    python bench_orders.py --orders 200 --items 40    # 存在不一致时退出码为 1
+"""
+import argparse
+import sys
+import time
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List
+
+from sqlalchemy import event, func
+
+import crud
+import models
+import schemas
+from database import SessionLocal, engine
+
+BENCH_CATEGORY = "_orders_bench"
+BENCH_CUSTOMER = "_orders_bench_customer"
+
+
+def _create_fixtures(items: int):
+    """临时客户与 items 台临时设备，返回 (客户, 设备列表)"""
+    db = SessionLocal()
+    try:
+        customer = models.Customer(customer_name=BENCH_CUSTOMER)
+        units = [
+            models.Equipment(
+                equipment_code=f"BENCH-{i:06d}",
+                equipment_name="下单压测设备",
+                category=BENCH_CATEGORY,
+                daily_rental_rate=100.0 + i
+            )
+            for i in range(items)
+        ]
+        db.add(customer)
+        db.add_all(units)
+        db.commit()
+        return (
+            (customer.customer_id, customer.customer_name),
+            [(unit.equipment_id, unit.equipment_code, unit.equipment_name, unit.daily_rental_rate) for unit in units],
+        )
+    finally:
+        db.close()
+
+
+def _payload(customer, units, orders: int) -> List[schemas.LeaseOrderCreate]:
+    today = date.today()
+    return [
+        schemas.LeaseOrderCreate(
+            customer_id=customer[0],
+            customer_name=customer[1],
+            start_date=today,
+            expected_return_date=today + timedelta(days=7),
+            created_by="批量下单压测",
+            order_items=[
+                schemas.OrderItemCreate(
+                    equipment_id=equipment_id,
+                    equipment_code=code,
+                    equipment_name=name,
+                    daily_rate=rate,
+                    rental_days=1 + (i + n) % 10
+                )
+                for n, (equipment_id, code, name, rate) in enumerate(units)
+            ]
+        )
+        for i in range(orders)
+    ]
+
+
+def _measure(run: Callable[[], List[str]]) -> Dict[str, Any]:
+    """执行 run（返回创建的订单编号），统计耗时与语句数"""
+    counter = {"statements": 0}
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        counter["statements"] += 1
+
+    event.listen(engine, "before_cursor_execute", record)
+    started = time.perf_counter()
+    try:
+        codes = run()
+    finally:
+        elapsed = time.perf_counter() - started
+        event.remove(engine, "before_cursor_execute", record)
+    return {"codes": codes, "elapsed_ms": round(elapsed * 1000, 1), "statements": counter["statements"]}
+
+
+def _order_totals(db, codes: List[str]) -> List[tuple]:
+    """按创建顺序的 (明细数, 明细小计合计, 订单金额)"""
+    items = {
+        order_id: (count, round(subtotal or 0, 2))
+        for order_id, count, subtotal in db.query(
+            models.OrderItem.order_id, func.count(models.OrderItem.item_id), func.sum(models.OrderItem.subtotal)
+        ).join(
+            models.LeaseOrder, models.LeaseOrder.order_id == models.OrderItem.order_id
+        ).filter(models.LeaseOrder.order_code.in_(codes)).group_by(models.OrderItem.order_id)
+    }
+    orders = {
+        code: (order_id, round(total or 0, 2))
+        for code, order_id, total in db.query(
+            models.LeaseOrder.order_code, models.LeaseOrder.order_id, models.LeaseOrder.total_amount
+        ).filter(models.LeaseOrder.order_code.in_(codes))
+    }
+    return [(*items.get(orders[code][0], (0, 0.0)), orders[code][1]) for code in codes]
+
+
+def _consistent(loop: List[tuple], batch: List[tuple], triggers: bool) -> bool:
+    """两种方式的明细数、小计合计相同；有触发器（MySQL）时逐个创建的订单金额须等于小计合计"""
+    if [row[:2] for row in loop] != [row[:2] for row in batch]:
+        return False
+    return all(row[1] == row[2] for row in batch + (loop if triggers else []))
+
+
+def bench(orders: int, items: int) -> Dict[str, Any]:
+    """逐个创建与批量创建各 orders 个订单（每单 items 条明细），返回两种方式的耗时、语句数与吞吐量"""
+    customer, units = _create_fixtures(items)
+    payload = _payload(customer, units, orders)
+    created: List[str] = []
+    db = SessionLocal()
+    try:
+        def loop():
+            return [crud.create_order(db, order).order_code for order in payload]
+
+        def batch():
+            return [row["order_code"] for row in crud.create_orders_batch(db, payload)]
+
+        results = {}
+        for name, run in (("loop", loop), ("batch", batch)):
+            result = _measure(run)
+            created += result.pop("codes")
+            result["orders_per_second"] = round(orders / result["elapsed_ms"] * 1000, 1) if result["elapsed_ms"] else None
+            results[name] = result
+        results["consistent"] = _consistent(
+            _order_totals(db, created[:orders]), _order_totals(db, created[orders:]),
+            triggers=engine.dialect.name == "mysql"
+        )
+        return results
+    finally:
+        db.rollback()
+        order_ids = db.query(models.LeaseOrder.order_id).filter(models.LeaseOrder.order_code.in_(created))
+        db.query(models.OrderItem).filter(models.OrderItem.order_id.in_(order_ids.scalar_subquery())).delete(
+            synchronize_session=False
+        )
+        db.query(models.LeaseOrder).filter(models.LeaseOrder.order_code.in_(created)).delete(synchronize_session=False)
+        db.query(models.Equipment).filter(models.Equipment.category == BENCH_CATEGORY).delete(synchronize_session=False)
+        db.query(models.Customer).filter(models.Customer.customer_name == BENCH_CUSTOMER).delete(synchronize_session=False)
+        db.commit()
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量下单压测")
+    parser.add_argument("--orders", type=int, default=200, help="每种方式创建的订单数（批量方式不超过 500）")
+    parser.add_argument("--items", type=int, default=40, help="每个订单的明细数")
+    args = parser.parse_args()
+
+    results = bench(args.orders, args.items)
+    print(f"{args.orders} 个订单 x {args.items} 条明细")
+    print(f"{'方式':<8}{'耗时(ms)':>12}{'语句数':>10}{'订单/秒':>12}")
+    for name in ("loop", "batch"):
+        result = results[name]
+        print(f"{name:<8}{result['elapsed_ms']:>12.1f}{result['statements']:>10}{result['orders_per_second'] or 0:>12.1f}")
+    if not results["consistent"]:
+        print("两种方式的订单金额或明细数不一致")
+        return 1
+    print("两种方式的订单金额与明细数一致")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
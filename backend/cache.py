@@ -0,0 +1,265 @@
+"""
+进程内缓存
+- TTLCache: 带过期时间的线程安全缓存，支持单飞（single-flight）计算：
+  同一个 key 的并发请求只有一个会真正执行计算，其余请求等待其结果
+- 写入追踪：监听 ORM 会话的写操作，事务提交后按被写入的表名通知订阅者，
+  用于让缓存在数据变更后失效；text() 原始 SQL 与绕过会话的 Connection 写入无法自动识别，
+  须调用 mark_tables_written / notify_tables_written 登记（crud.update_equipment 的原始 SQL 回退、
+  sequences.py 的序列行创建与删除）
+"""
+import asyncio
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Set
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+class _Inflight:
+    """一次正在进行中的计算"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+
+
+class TTLCache:
+    """带过期时间与单飞保护的缓存"""
+
+    def __init__(self, name: str, ttl: float):
+        self.name = name
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data: Dict[Hashable, tuple] = {}  # key -> (过期时间, 值)
+        self._inflight: Dict[Hashable, _Inflight] = {}
+        self._generation = 0  # 每次失效递增，防止计算期间失效的数据被写回
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.invalidations = 0
+        _registry[name] = self
+
+    def get(self, key: Hashable, default=None):
+        """读取未过期的缓存值"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return default
+
+    @property
+    def generation(self) -> int:
+        """失效代数：在计算前读取，写回时传给 set 以丢弃计算期间已失效的结果"""
+        with self._lock:
+            return self._generation
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None):
+        """写入缓存值；指定 generation 且期间发生过失效时放弃写入"""
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value)
+
+    def _claim(self, key: Hashable):
+        """
+        命中时返回 (True, 值, None, None)；未命中时返回 (False, None, 进行中的计算, 失效代数)，
+        失效代数为 None 表示已有其他调用在计算，本次调用只需等待其结果
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry and entry[0] > time.monotonic():
+                self.hits += 1
+                return True, entry[1], None, None
+            flight = self._inflight.get(key)
+            if flight is not None:
+                self.waits += 1
+                return False, None, flight, None
+            flight = _Inflight()
+            self._inflight[key] = flight
+            self.misses += 1
+            return False, None, flight, self._generation
+
+    def _finish(self, key: Hashable, flight: _Inflight, generation: int):
+        """计算结束（成功或失败）：写回结果并唤醒等待的调用"""
+        with self._lock:
+            if flight.error is None and generation == self._generation:
+                self._data[key] = (time.monotonic() + self.ttl, flight.value)
+            self._inflight.pop(key, None)
+        flight.event.set()
+
+    @staticmethod
+    def _result(flight: _Inflight):
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]):
+        """读取缓存，未命中时计算；同一 key 的并发调用共享一次计算结果"""
+        hit, value, flight, generation = self._claim(key)
+        if hit:
+            return value
+        if generation is None:
+            flight.event.wait()
+            return self._result(flight)
+        try:
+            flight.value = compute()
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            self._finish(key, flight, generation)
+
+    async def get_or_compute_async(self, key: Hashable, compute: Callable[[], Awaitable[Any]]):
+        """get_or_compute 的异步版本，与同步调用共享进行中的计算；等待在线程池中进行，不阻塞事件循环"""
+        hit, value, flight, generation = self._claim(key)
+        if hit:
+            return value
+        if generation is None:
+            if not flight.event.is_set():
+                await asyncio.to_thread(flight.event.wait)
+            return self._result(flight)
+        try:
+            flight.value = await compute()
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            self._finish(key, flight, generation)
+
+    def invalidate(self, predicate: Optional[Callable[[Hashable], bool]] = None):
+        """使缓存失效；predicate 为空时清空全部，否则只删除满足条件的 key"""
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            if predicate is None:
+                self._data.clear()
+            else:
+                for key in [k for k in self._data if predicate(k)]:
+                    del self._data[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """命中/未命中等计数"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "name": self.name,
+                "ttl": self.ttl,
+                "size": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "waits": self.waits,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+# 已创建的缓存（用于统一输出统计信息）
+_registry: Dict[str, TTLCache] = {}
+
+
+def all_cache_stats() -> List[Dict[str, Any]]:
+    """所有缓存的统计信息"""
+    return [c.stats() for c in list(_registry.values())]
+
+
+# ========== 写入追踪 ==========
+_write_listeners: List[Callable[[Set[str]], None]] = []
+
+
+def on_tables_written(listener: Callable[[Set[str]], None]):
+    """注册写入监听：事务提交后以被写入的表名集合调用 listener"""
+    _write_listeners.append(listener)
+    return listener
+
+
+# 数据库触发器在写入某张表时直接写入的表
+# （见 migrations/create_triggers_fixed.sql、migrations/create_stats_counters.sql、
+#   migrations/create_equipment_inventory.sql、migrations/create_rental_summaries.sql）
+TRIGGER_WRITES: Dict[str, Set[str]] = {
+    "order_items": {
+        "lease_orders", "trigger_logs", "equipment_inventory", "customer_rental_stats", "billing_summary",
+    },
+    "lease_orders": {"equipment", "trigger_logs", "stats_counters", "equipment_inventory", "customer_rental_stats"},
+    "return_records": {"trigger_logs", "stats_counters"},
+    "inspection_records": {"equipment", "trigger_logs", "stats_counters", "equipment_inventory"},
+    "billing": {"trigger_logs", "stats_counters", "customer_rental_stats", "billing_summary"},
+    "customers": {"customer_rental_stats"},
+    "equipment": {"trigger_logs", "stats_counters", "equipment_inventory"},
+    "outbound_records": {"equipment", "trigger_logs", "stats_counters", "equipment_inventory"},
+    "inbound_records": {"equipment", "trigger_logs", "stats_counters", "equipment_inventory"},
+}
+
+
+def _trigger_closure(writes: Dict[str, Set[str]]) -> Dict[str, Set[str]]:
+    """传递闭包：被触发器写入的表上的触发器继续写入的表（如 order_items -> lease_orders -> equipment）"""
+    closure = {}
+    for table in writes:
+        reached: Set[str] = set()
+        pending = list(writes[table])
+        while pending:
+            current = pending.pop()
+            if current not in reached:
+                reached.add(current)
+                pending.extend(writes.get(current, ()))
+        closure[table] = reached
+    return closure
+
+
+# 写入某张表时经触发器（含多级）连带写入的全部表
+TRIGGER_WRITES_CLOSURE: Dict[str, Set[str]] = _trigger_closure(TRIGGER_WRITES)
+
+
+def notify_tables_written(tables: Iterable[str]):
+    """手动通知表已被写入（用于绕过 ORM 会话的写操作）"""
+    tables = set(tables)
+    for table in list(tables):
+        tables |= TRIGGER_WRITES_CLOSURE.get(table, set())
+    if not tables:
+        return
+    for listener in list(_write_listeners):
+        listener(tables)
+
+
+def _pending_tables(session: Session) -> Set[str]:
+    return session.info.setdefault("written_tables", set())
+
+
+def mark_tables_written(session: Session, *tables: str):
+    """登记会话中通过 text() 原始 SQL 写入的表，随会话提交通知（回滚时丢弃）"""
+    _pending_tables(session).update(tables)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed_tables(session, flush_context):
+    tables = _pending_tables(session)
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, "__table__", None)
+        if table is not None:
+            tables.add(table.name)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_statement_tables(orm_execute_state):
+    # 通过 session.execute(insert/update/delete) 执行的批量写操作
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, "table", None)
+        if table is not None and hasattr(table, "name"):
+            _pending_tables(orm_execute_state.session).add(table.name)
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_committed_tables(session):
+    tables = session.info.pop("written_tables", None)
+    if tables:
+        notify_tables_written(tables)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back_tables(session):
+    session.info.pop("written_tables", None)
@@ -0,0 +1,120 @@
+"""
+数据库视图能力探测
+列表与统计查询原先在每个请求中先查视图、失败后再用 ORM 重查一遍，视图缺失或损坏期间
+每个请求都执行两遍查询且无人察觉。改为在服务启动时探测一次各视图能否查询，按结果选择查询方式：
+    materialized  物化表已刷新（见 summaries.py）
+    view          视图可用
+    orm           视图不可用，使用 ORM 查询
+探测结果通过 /health 公开；新建或修复视图后调用 POST /api/system/capabilities/refresh 重新探测
+"""
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+import rollups
+import summaries
+from database import ReadSessionLocal
+
+STRATEGY_MATERIALIZED = "materialized"
+STRATEGY_VIEW = "view"
+STRATEGY_ORM = "orm"
+
+VIEWS = (
+    "v_equipment_inventory",
+    "v_order_summary",
+    "v_customer_rental_stats",
+    "v_billing_summary",
+    "v_equipment_category_stats",
+    "v_equipment_usage",
+)
+
+# 查询 -> (物化表, 视图)
+QUERIES = {
+    "equipment_inventory": (summaries.EQUIPMENT_INVENTORY, "v_equipment_inventory"),
+    "order_summary": (None, "v_order_summary"),
+    "customer_rental_stats": (summaries.CUSTOMER_RENTAL_STATS, "v_customer_rental_stats"),
+    "billing_summary": (summaries.BILLING_SUMMARY, "v_billing_summary"),
+    "equipment_category_stats": (None, "v_equipment_category_stats"),
+    "equipment_usage": (None, "v_equipment_usage"),
+}
+
+# 最近一次探测：{视图名: 错误信息（可用时为 None）}
+_view_errors: Optional[Dict[str, Optional[str]]] = None
+_checked_at: Optional[datetime] = None
+_probe_lock = threading.Lock()
+
+
+def probe_view(db: Session, name: str) -> Optional[str]:
+    """检查视图能否查询，返回错误信息（可用时为 None）；WHERE 1 = 0 只校验定义，不读取数据"""
+    try:
+        db.execute(text(f"SELECT * FROM {name} WHERE 1 = 0")).fetchall()
+        return None
+    except Exception as e:
+        db.rollback()
+        return str(getattr(e, "orig", None) or e).splitlines()[0]
+
+
+def probe(db: Optional[Session] = None) -> Dict[str, Any]:
+    """探测全部视图（只读库）、物化表与每日汇总表，更新查询方式并返回探测结果"""
+    global _view_errors, _checked_at
+    session = db or ReadSessionLocal()
+    try:
+        with _probe_lock:
+            errors = {name: probe_view(session, name) for name in VIEWS}
+            for name in summaries.SUMMARIES:
+                summaries.probe(session, name)
+            rollups.probe(session)
+            _view_errors, _checked_at = errors, datetime.now()
+    finally:
+        if db is None:
+            session.close()
+    for name, error in errors.items():
+        if error is not None:
+            print(f"视图 {name} 不可用，相关查询改用 ORM: {error}")
+    return snapshot()
+
+
+def _ensure_probed():
+    # 未经服务启动流程（如脚本直接调用 crud）时，在首次使用前探测一次
+    if _view_errors is None:
+        probe()
+
+
+def view_available(name: str) -> bool:
+    """视图是否可用（按最近一次探测结果）"""
+    _ensure_probed()
+    return _view_errors.get(name) is None
+
+
+def strategy(query: str) -> str:
+    """查询当前使用的方式：materialized / view / orm"""
+    summary, view = QUERIES[query]
+    if summary is not None and summaries.known_ready(summary):
+        return STRATEGY_MATERIALIZED
+    return STRATEGY_VIEW if view_available(view) else STRATEGY_ORM
+
+
+def snapshot() -> Dict[str, Any]:
+    """探测结果（/health 的 capabilities 属性）"""
+    _ensure_probed()
+    return {
+        "checked_at": _checked_at,
+        "strategies": {query: strategy(query) for query in QUERIES},
+        "unavailable_views": {name: error for name, error in _view_errors.items() if error is not None},
+        "daily_rollups": rollups.known_ready(),
+    }
+
+
+def read_source(name: str) -> Optional[str]:
+    """
+    物化表对应列表的查询来源：物化表可读时为物化表子查询，否则视图可用时为视图名，
+    两者都不可用时为 None（使用 ORM 查询）；按最近一次探测结果选择，不查询数据库
+    """
+    _ensure_probed()
+    summary = summaries.SUMMARIES[name]
+    if summaries.known_ready(name):
+        return summary["source"]
+    return summary["view"] if view_available(summary["view"]) else None
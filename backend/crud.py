@@ -1,9 +1,22 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_, text
+from sqlalchemy import func, and_, or_, text, case, select, insert, update
 from typing import List, Optional, Dict, Any
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
+from types import SimpleNamespace
 import models
 import schemas
+import allocation
+import analytics
+import date_ranges
+import pagination
+import rollups
+import search
+import sequences
+import summaries
+import utilization
+import capabilities
+import database
+from cache import TTLCache, mark_tables_written, on_tables_written
 import hashlib
 
 def hash_password(password: str) -> str:
@@ -15,6 +28,63 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return hash_password(plain_password) == hashed_password
 
 
+# ========== 批量预取 ==========
+# 列表页先取出当前页的主记录，再按主键集合一次性加载关联数据，
+# 每页的查询次数固定，不随页大小增长（避免逐行查询的 N+1 问题）
+def prefetch_by_ids(db: Session, model, key_column, ids, *criteria) -> Dict[Any, Any]:
+    """按主键集合批量加载，返回 {键: 对象}"""
+    ids = {i for i in ids if i is not None}
+    if not ids:
+        return {}
+    rows = db.query(model).filter(key_column.in_(ids), *criteria).all()
+    return {getattr(row, key_column.key): row for row in rows}
+
+
+def prefetch_grouped(db: Session, model, key_column, ids, *criteria, order_by=None) -> Dict[Any, List[Any]]:
+    """按外键集合批量加载一对多的子记录，返回 {键: [对象, ...]}"""
+    ids = {i for i in ids if i is not None}
+    if not ids:
+        return {}
+    query = db.query(model).filter(key_column.in_(ids), *criteria)
+    if order_by is not None:
+        query = query.order_by(order_by)
+    grouped: Dict[Any, List[Any]] = {}
+    for row in query.all():
+        grouped.setdefault(getattr(row, key_column.key), []).append(row)
+    return grouped
+
+
+def prefetch_orders(db: Session, order_ids, include_deleted: bool = False) -> Dict[int, models.LeaseOrder]:
+    """批量加载订单"""
+    criteria = [] if include_deleted else [models.LeaseOrder.is_deleted == 0]
+    return prefetch_by_ids(db, models.LeaseOrder, models.LeaseOrder.order_id, order_ids, *criteria)
+
+
+def prefetch_order_items(db: Session, order_ids) -> Dict[int, List[models.OrderItem]]:
+    """批量加载订单明细，按订单分组"""
+    return prefetch_grouped(
+        db, models.OrderItem, models.OrderItem.order_id, order_ids,
+        order_by=models.OrderItem.item_id
+    )
+
+
+def prefetch_return_items(db: Session, return_ids) -> Dict[int, List[models.ReturnItem]]:
+    """批量加载归还明细，按归还记录分组"""
+    return prefetch_grouped(
+        db, models.ReturnItem, models.ReturnItem.return_id, return_ids,
+        order_by=models.ReturnItem.item_id
+    )
+
+
+# 视图查询依赖的基础表（用于总数缓存失效）
+VIEW_SOURCE_TABLES = {
+    "v_equipment_inventory": ("equipment", "order_items", "lease_orders"),
+    "v_customer_rental_stats": ("customers", "lease_orders", "billing", "order_items"),
+    "v_order_summary": ("lease_orders", "customers", "order_items", "billing", "return_records"),
+    "v_billing_summary": ("billing", "lease_orders", "customers", "order_items"),
+}
+
+
 # ========== 设备管理 CRUD ==========
 def get_equipment_list(
     db: Session,
@@ -23,33 +93,177 @@ def get_equipment_list(
     keyword: Optional[str] = None,
     category: Optional[str] = None,
     status: Optional[str] = None,
-    use_view: bool = False
+    use_view: bool = False,
+    cursor: Optional[str] = None,
+    count_mode: str = pagination.COUNT_EXACT
 ):
     """
     获取设备列表
     如果 use_view=True，使用视图优化查询（包含租赁统计信息）
+    传入 cursor 时使用游标分页（首页传空字符串），返回 next_cursor
+    count_mode 为总数统计策略（exact/cached/none），见 pagination.py
     """
     if use_view:
-        return get_equipment_list_from_view(db, skip, limit, keyword, category, status)
+        return get_equipment_list_from_view(db, skip, limit, keyword, category, status, cursor, count_mode)
+    
+    query = db.query(models.Equipment).filter(*equipment_list_filters(keyword, category, status))
     
-    query = db.query(models.Equipment).filter(models.Equipment.is_deleted == 0)
+    total = pagination.count_query(query, ["equipment"], count_mode)
+    items, next_cursor, has_more = pagination.paginate(
+        query, models.Equipment.created_at, models.Equipment.equipment_id,
+        skip=skip, limit=limit, cursor=cursor
+    )
+    
+    return {"total": total, "items": items, "next_cursor": next_cursor, "has_more": has_more}
+
+
+def equipment_list_filters(
+    keyword: Optional[str] = None,
+    category: Optional[str] = None,
+    status: Optional[str] = None
+) -> List[Any]:
+    """设备列表的过滤条件（同步与异步查询共用）"""
+    filters = [models.Equipment.is_deleted == 0]
+    if keyword:
+        filters.append(search.keyword_filter(
+            keyword, models.Equipment.equipment_code, models.Equipment.equipment_name
+        ))
+    if category:
+        filters.append(models.Equipment.category == category)
+    if status:
+        filters.append(models.Equipment.status == status)
+    return filters
+
+
+def equipment_view_query(
+    keyword: Optional[str] = None,
+    category: Optional[str] = None,
+    status: Optional[str] = None,
+    source: str = "v_equipment_inventory"
+):
+    """
+    构造设备库存视图查询，返回 (SQL, 参数)
+    source 为查询来源：视图名，或物化表的读取来源（capabilities.read_source）
+    """
+    query = f"SELECT * FROM {source} WHERE 1=1"
+    params = {}
     
     if keyword:
-        query = query.filter(
-            or_(
-                models.Equipment.equipment_code.contains(keyword),
-                models.Equipment.equipment_name.contains(keyword)
-            )
+        clause, clause_params = search.keyword_sql(
+            keyword, [models.Equipment.equipment_code, models.Equipment.equipment_name], "equipment_id"
         )
+        query += " AND " + clause
+        params.update(clause_params)
+    
     if category:
-        query = query.filter(models.Equipment.category == category)
+        query += " AND category = :category"
+        params['category'] = category
+    
     if status:
-        query = query.filter(models.Equipment.status == status)
+        # 转换状态值
+        status_map = {
+            "在库": "在库",
+            "已出库": "已出库",
+            "维修中": "维修中",
+            "available": "在库",
+            "rented": "已出库",
+            "maintenance": "维修中"
+        }
+        status_value = status_map.get(status, status)
+        query += " AND status = :status"
+        params['status'] = status_value
+    
+    return query, params
+
+
+def equipment_view_item(row) -> Dict[str, Any]:
+    """将设备库存视图的一行转换为字典"""
+    # 转换状态显示值 - 同时支持枚举名称和枚举值
+    status_display_map = {
+        # 枚举值映射
+        "在库": "available",
+        "已出库": "rented",
+        "维修中": "maintenance",
+        "已报废": "maintenance",
+        # 枚举名称映射（SQLAlchemy 可能返回枚举名称）
+        "IN_STOCK": "available",
+        "OUT": "rented",
+        "MAINTENANCE": "maintenance",
+        "SCRAPPED": "maintenance",
+    }
+    # 清理状态值（去除首尾空格）
+    raw_status = str(row.status).strip() if row.status else ""
+    display_status = status_display_map.get(raw_status, "maintenance")
     
-    total = query.count()
-    items = query.order_by(models.Equipment.created_at.desc()).offset(skip).limit(limit).all()
+    # 调试日志：如果状态不在映射中，记录警告
+    if raw_status not in status_display_map and raw_status:
+        print(f"警告: 设备 {row.equipment_code} 的状态值 '{raw_status}' 不在映射中，使用默认值 'maintenance'")
     
-    return {"total": total, "items": items}
+    return {
+        'equipment_id': row.equipment_id,
+        'equipment_code': row.equipment_code,
+        'equipment_name': row.equipment_name,
+        'category': row.category,
+        'status': row.status,
+        'storage_location': row.storage_location,
+        'purchase_price': float(row.purchase_price) if row.purchase_price else 0.0,
+        'daily_rental_rate': float(row.daily_rental_rate) if row.daily_rental_rate else 0.0,
+        'supplier': row.supplier or "",
+        'manufacturer': row.manufacturer or "",
+        'purchase_date': row.purchase_date,
+        'warranty_date': row.warranty_date,
+        'last_maintenance_date': row.last_maintenance_date,
+        'serial_number': row.serial_number or "",
+        'specifications': row.specifications or "",
+        'created_at': row.created_at,
+        'updated_at': row.updated_at,
+        # 视图提供的统计信息
+        'available_quantity': int(row.available_quantity),
+        'rented_quantity': int(row.rented_quantity),
+        'maintenance_quantity': int(row.maintenance_quantity),
+        'rental_count': int(row.rental_count),
+        'total_rental_days': int(row.total_rental_days),
+        'total_revenue': float(row.total_revenue) if row.total_revenue else 0.0,
+        # 前端需要的字段
+        'display_status': display_status,
+    }
+
+
+def equipment_rental_stats_statement(equipment_ids):
+    """指定设备的租赁次数、天数、收入（口径与 v_equipment_inventory 一致）"""
+    return select(
+        models.OrderItem.equipment_id,
+        func.count(func.distinct(models.OrderItem.order_id)).label("rental_count"),
+        func.sum(models.OrderItem.rental_days).label("total_rental_days"),
+        func.sum(models.OrderItem.subtotal).label("total_revenue"),
+    ).join(
+        models.LeaseOrder, models.OrderItem.order_id == models.LeaseOrder.order_id
+    ).where(
+        models.LeaseOrder.is_deleted == 0,
+        models.OrderItem.equipment_id.in_(equipment_ids)
+    ).group_by(models.OrderItem.equipment_id)
+
+
+def equipment_inventory_items(equipment_list, stats_rows) -> List[Dict[str, Any]]:
+    """ORM 查询的设备与其租赁统计转换为与设备库存视图行一致的字典"""
+    stats = {row.equipment_id: row for row in stats_rows}
+    items = []
+    for equipment in equipment_list:
+        row = {column.key: getattr(equipment, column.key) for column in models.Equipment.__table__.columns}
+        # 视图返回的状态为数据库中存储的枚举名称
+        status = equipment.status.name if isinstance(equipment.status, models.EquipmentStatus) else equipment.status
+        rental = stats.get(equipment.equipment_id)
+        row.update(
+            status=status,
+            available_quantity=int(status == models.EquipmentStatus.IN_STOCK.name),
+            rented_quantity=int(status == models.EquipmentStatus.OUT.name),
+            maintenance_quantity=int(status == models.EquipmentStatus.MAINTENANCE.name),
+            rental_count=rental.rental_count if rental else 0,
+            total_rental_days=(rental.total_rental_days or 0) if rental else 0,
+            total_revenue=rental.total_revenue if rental else 0.0,
+        )
+        items.append(equipment_view_item(SimpleNamespace(**row)))
+    return items
 
 
 def get_equipment_list_from_view(
@@ -58,113 +272,42 @@ def get_equipment_list_from_view(
     limit: int = 10,
     keyword: Optional[str] = None,
     category: Optional[str] = None,
-    status: Optional[str] = None
+    status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    count_mode: str = pagination.COUNT_EXACT
 ) -> Dict[str, Any]:
     """
     从视图获取设备库存列表（优化版本）
-    使用视图: v_equipment_inventory
-    如果视图不存在，自动回退到原查询方式
+    使用视图: v_equipment_inventory；物化表 equipment_inventory 已刷新时改为读取物化表（见 summaries.py）
+    两者都不可用时（启动时探测，见 capabilities.py）使用 ORM 分页，只聚合当前页设备的租赁统计
     """
-    try:
-        query = "SELECT * FROM v_equipment_inventory WHERE 1=1"
-        params = {}
-        
-        if keyword:
-            query += " AND (equipment_code LIKE :keyword OR equipment_name LIKE :keyword)"
-            params['keyword'] = f'%{keyword}%'
-        
-        if category:
-            query += " AND category = :category"
-            params['category'] = category
-        
-        if status:
-            # 转换状态值
-            status_map = {
-                "在库": "在库",
-                "已出库": "已出库",
-                "维修中": "维修中",
-                "available": "在库",
-                "rented": "已出库",
-                "maintenance": "维修中"
-            }
-            status_value = status_map.get(status, status)
-            query += " AND status = :status"
-            params['status'] = status_value
-        
-        # 获取总数
-        count_query = query.replace("SELECT *", "SELECT COUNT(*)")
-        total = db.execute(text(count_query), params).scalar()
-        
-        # 获取分页数据
-        query += " ORDER BY created_at DESC LIMIT :limit OFFSET :skip"
-        params['limit'] = limit
-        params['skip'] = skip
-        
-        result = db.execute(text(query), params)
-        items = []
-        for row in result:
-            # 转换状态显示值 - 同时支持枚举名称和枚举值
-            status_display_map = {
-                # 枚举值映射
-                "在库": "available",
-                "已出库": "rented",
-                "维修中": "maintenance",
-                "已报废": "maintenance",
-                # 枚举名称映射（SQLAlchemy 可能返回枚举名称）
-                "IN_STOCK": "available",
-                "OUT": "rented",
-                "MAINTENANCE": "maintenance",
-                "SCRAPPED": "maintenance",
-            }
-            # 清理状态值（去除首尾空格）
-            raw_status = str(row.status).strip() if row.status else ""
-            display_status = status_display_map.get(raw_status, "maintenance")
-            
-            # 调试日志：如果状态不在映射中，记录警告
-            if raw_status not in status_display_map and raw_status:
-                print(f"警告: 设备 {row.equipment_code} 的状态值 '{raw_status}' 不在映射中，使用默认值 'maintenance'")
-            
-            items.append({
-                'equipment_id': row.equipment_id,
-                'equipment_code': row.equipment_code,
-                'equipment_name': row.equipment_name,
-                'category': row.category,
-                'status': row.status,
-                'storage_location': row.storage_location,
-                'purchase_price': float(row.purchase_price) if row.purchase_price else 0.0,
-                'daily_rental_rate': float(row.daily_rental_rate) if row.daily_rental_rate else 0.0,
-                'supplier': row.supplier or "",
-                'manufacturer': row.manufacturer or "",
-                'purchase_date': row.purchase_date,
-                'warranty_date': row.warranty_date,
-                'last_maintenance_date': row.last_maintenance_date,
-                'serial_number': row.serial_number or "",
-                'specifications': row.specifications or "",
-                'created_at': row.created_at,
-                'updated_at': row.updated_at,
-                # 视图提供的统计信息
-                'available_quantity': int(row.available_quantity),
-                'rented_quantity': int(row.rented_quantity),
-                'maintenance_quantity': int(row.maintenance_quantity),
-                'rental_count': int(row.rental_count),
-                'total_rental_days': int(row.total_rental_days),
-                'total_revenue': float(row.total_revenue) if row.total_revenue else 0.0,
-                # 前端需要的字段
-                'display_status': display_status,
-            })
-        
-        return {"total": total, "items": items}
-    except Exception as e:
-        # 视图不存在或其他错误，回退到原查询方式
-        import traceback
-        print(f"视图查询失败，回退到原查询方式: {e}")
-        traceback.print_exc()
-        # 调用原查询方法（禁用视图）
-        return get_equipment_list(
+    source = capabilities.read_source(summaries.EQUIPMENT_INVENTORY)
+    if source is None:
+        result = get_equipment_list(
             db, skip=skip, limit=limit,
             keyword=keyword, category=category, status=status,
-            use_view=False  # 禁用视图，使用原查询
+            use_view=False,
+            cursor=cursor,
+            count_mode=count_mode
         )
+        equipment_ids = [equipment.equipment_id for equipment in result["items"]]
+        stats_rows = db.execute(equipment_rental_stats_statement(equipment_ids)).all() if equipment_ids else []
+        result["items"] = equipment_inventory_items(result["items"], stats_rows)
+        return result
+
+    query, params = equipment_view_query(keyword, category, status, source)
+    
+    # 获取总数
+    total = pagination.count_sql(db, query, params, VIEW_SOURCE_TABLES["v_equipment_inventory"], count_mode)
+    
+    # 获取分页数据
+    query = pagination.keyset_sql(query, params, "created_at", "equipment_id", skip, limit, cursor)
+    
+    result = db.execute(text(query), params)
+    items = [equipment_view_item(row) for row in result]
+    
+    items, next_cursor, has_more = pagination.trim_page(items, 'created_at', 'equipment_id', limit, cursor)
+    return {"total": total, "items": items, "next_cursor": next_cursor, "has_more": has_more}
 
 
 def get_equipment_by_id(db: Session, equipment_id: int):
@@ -179,29 +322,9 @@ def create_equipment(db: Session, equipment: schemas.EquipmentCreate):
     """创建设备"""
     equipment_dict = equipment.dict()
     
-    # 如果没有提供设备编码，自动生成
+    # 如果没有提供设备编码，从编号序列生成
     if not equipment_dict.get('equipment_code'):
-        # 获取当前最大设备ID，生成新的编码
-        max_equipment = db.query(func.max(models.Equipment.equipment_id)).filter(
-            models.Equipment.is_deleted == 0
-        ).scalar()
-        next_id = (max_equipment or 0) + 1
-        
-        # 生成设备编码，确保唯一性
-        equipment_code = f"EQ{next_id:06d}"
-        # 检查编码是否已存在（虽然理论上不应该，但为了安全）
-        existing = db.query(models.Equipment).filter(
-            models.Equipment.equipment_code == equipment_code,
-            models.Equipment.is_deleted == 0
-        ).first()
-        
-        # 如果编码已存在，使用时间戳生成唯一编码
-        if existing:
-            from datetime import datetime
-            timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-            equipment_code = f"EQ{timestamp}{next_id:04d}"
-        
-        equipment_dict['equipment_code'] = equipment_code
+        equipment_dict['equipment_code'] = reserve_equipment_codes(db, None, 1)[0]
     
     db_equipment = models.Equipment(**equipment_dict)
     db.add(db_equipment)
@@ -210,6 +333,93 @@ def create_equipment(db: Session, equipment: schemas.EquipmentCreate):
     return db_equipment
 
 
+# ========== 设备入库 ==========
+def reserve_equipment_codes(db: Session, equipment_code: Optional[str], quantity: int) -> List[str]:
+    """
+    一次生成 quantity 个设备编号
+    提供编号时数量为 1 直接使用，否则依次加 -001、-002 后缀；未提供时从编号序列取一段编号，
+    跳过已被手工录入占用的编号
+    """
+    if equipment_code:
+        if quantity == 1:
+            return [equipment_code]
+        return [f"{equipment_code}-{i + 1:03d}" for i in range(quantity)]
+
+    codes: List[str] = []
+    while len(codes) < quantity:
+        candidates = sequences.next_codes(sequences.EQUIPMENT, quantity - len(codes))
+        taken = set(existing_equipment_codes(db, candidates))
+        codes.extend(code for code in candidates if code not in taken)
+    return codes
+
+
+def existing_equipment_codes(db: Session, codes: List[str]) -> List[str]:
+    """返回 codes 中已被占用的设备编号（一次 IN 查询；唯一索引包含已删除的设备）"""
+    if not codes:
+        return []
+    rows = db.query(models.Equipment.equipment_code).filter(
+        models.Equipment.equipment_code.in_(codes)
+    ).all()
+    taken = {row.equipment_code for row in rows}
+    return [code for code in codes if code in taken]
+
+
+def create_equipment_inbound(
+    db: Session,
+    equipment: schemas.EquipmentCreate,
+    codes: List[str],
+    supplier: Optional[str] = None,
+    operator: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    批量入库：在一个事务中按 codes 创建设备，并写入一张入库单及每台设备的入库明细
+    设备与明细均为一条批量 INSERT（executemany），往返次数与数量无关；
+    返回 [{"equipment_id", "equipment_code"}]，顺序与 codes 一致
+    """
+    inbound_code = sequences.next_code(sequences.INBOUND)
+    equipment_dict = equipment.model_dump(exclude={"equipment_code"})
+    if supplier:
+        equipment_dict["supplier"] = supplier
+    db.execute(
+        insert(models.Equipment),
+        [{**equipment_dict, "equipment_code": code} for code in codes]
+    )
+    rows = db.query(models.Equipment.equipment_id, models.Equipment.equipment_code).filter(
+        models.Equipment.equipment_code.in_(codes)
+    ).all()
+    equipment_ids = {row.equipment_code: row.equipment_id for row in rows}
+
+    inbound_record = models.InboundRecord(
+        inbound_code=inbound_code,
+        supplier=supplier,
+        operator=operator,
+        total_quantity=len(codes),
+        total_amount=(equipment.purchase_price or 0.0) * len(codes),
+        status=models.InboundStatus.COMPLETED,
+        remarks=equipment.remarks
+    )
+    db.add(inbound_record)
+    db.flush()  # 获取 inbound_id
+
+    db.execute(insert(models.InboundItem), [
+        {
+            "inbound_id": inbound_record.inbound_id,
+            "equipment_id": equipment_ids[code],
+            "equipment_code": code,
+            "equipment_name": equipment.equipment_name,
+            "category": equipment.category,
+            "specifications": equipment.specifications,
+            "quantity": 1,
+            "unit_price": equipment.purchase_price or 0.0,
+            "subtotal": equipment.purchase_price or 0.0,
+            "storage_location": equipment.storage_location,
+        }
+        for code in codes
+    ])
+    db.commit()
+    return [{"equipment_id": equipment_ids[code], "equipment_code": code} for code in codes]
+
+
 def update_equipment(db: Session, equipment_id: int, equipment: schemas.EquipmentUpdate):
     """更新设备"""
     db_equipment = get_equipment_by_id(db, equipment_id)
@@ -294,6 +504,8 @@ def update_equipment(db: Session, equipment_id: int, equipment: schemas.Equipmen
                     "status": status_to_use,
                     "equipment_id": equipment_id
                 })
+                # 原始 SQL 写入不会被自动追踪，登记后提交时失效相关缓存
+                mark_tables_written(db, "equipment")
                 db.commit()
                 
                 # 重新查询设备
@@ -324,24 +536,31 @@ def get_customer_list(
     skip: int = 0, 
     limit: int = 10, 
     keyword: Optional[str] = None,
-    use_view: bool = False
+    use_view: bool = False,
+    cursor: Optional[str] = None,
+    count_mode: str = pagination.COUNT_EXACT
 ):
     """
     获取客户列表
     如果 use_view=True，使用视图优化查询（包含租赁统计信息）
+    传入 cursor 时使用游标分页（首页传空字符串），返回 next_cursor
+    count_mode 为总数统计策略（exact/cached/none），见 pagination.py
     """
     if use_view:
-        return get_customer_list_from_view(db, skip, limit, keyword)
+        return get_customer_list_from_view(db, skip, limit, keyword, cursor=cursor, count_mode=count_mode)
     
     query = db.query(models.Customer).filter(models.Customer.is_deleted == 0)
     
     if keyword:
-        query = query.filter(models.Customer.customer_name.contains(keyword))
+        query = query.filter(search.keyword_filter(keyword, models.Customer.customer_name))
     
-    total = query.count()
-    items = query.order_by(models.Customer.created_at.desc()).offset(skip).limit(limit).all()
+    total = pagination.count_query(query, ["customers"], count_mode)
+    items, next_cursor, has_more = pagination.paginate(
+        query, models.Customer.created_at, models.Customer.customer_id,
+        skip=skip, limit=limit, cursor=cursor
+    )
     
-    return {"total": total, "items": items}
+    return {"total": total, "items": items, "next_cursor": next_cursor, "has_more": has_more}
 
 
 def get_customer_list_from_view(
@@ -349,31 +568,37 @@ def get_customer_list_from_view(
     skip: int = 0,
     limit: int = 10,
     keyword: Optional[str] = None,
-    credit_rating: Optional[str] = None
+    credit_rating: Optional[str] = None,
+    cursor: Optional[str] = None,
+    count_mode: str = pagination.COUNT_EXACT
 ) -> Dict[str, Any]:
     """
     从视图获取客户租赁统计列表（优化版本）
-    使用视图: v_customer_rental_stats
+    使用视图: v_customer_rental_stats；物化表 customer_rental_stats 已刷新时改为读取物化表（见 summaries.py）
+    游标分页按 (total_rental_amount, customer_id) 定位；物化表与视图都不可用时使用 ORM 查询（不含统计信息）
     """
-    query = "SELECT * FROM v_customer_rental_stats WHERE 1=1"
+    source = capabilities.read_source(summaries.CUSTOMER_RENTAL_STATS)
+    if source is None:
+        return get_customer_list(db, skip, limit, keyword, use_view=False, cursor=cursor, count_mode=count_mode)
+    query = f"SELECT * FROM {source} WHERE 1=1"
     params = {}
     
     if keyword:
-        query += " AND (customer_name LIKE :keyword OR contact_person LIKE :keyword)"
-        params['keyword'] = f'%{keyword}%'
+        clause, clause_params = search.keyword_sql(
+            keyword, [models.Customer.customer_name, models.Customer.contact_person], "customer_id"
+        )
+        query += " AND " + clause
+        params.update(clause_params)
     
     if credit_rating:
         query += " AND credit_rating = :credit_rating"
         params['credit_rating'] = credit_rating
     
     # 获取总数
-    count_query = query.replace("SELECT *", "SELECT COUNT(*)")
-    total = db.execute(text(count_query), params).scalar()
+    total = pagination.count_sql(db, query, params, VIEW_SOURCE_TABLES["v_customer_rental_stats"], count_mode)
     
     # 获取分页数据
-    query += " ORDER BY total_rental_amount DESC LIMIT :limit OFFSET :skip"
-    params['limit'] = limit
-    params['skip'] = skip
+    query = pagination.keyset_sql(query, params, "total_rental_amount", "customer_id", skip, limit, cursor)
     
     result = db.execute(text(query), params)
     items = []
@@ -400,7 +625,8 @@ def get_customer_list_from_view(
             'last_order_code': row.last_order_code,
         })
     
-    return {"total": total, "items": items}
+    items, next_cursor, has_more = pagination.trim_page(items, 'total_rental_amount', 'customer_id', limit, cursor)
+    return {"total": total, "items": items, "next_cursor": next_cursor, "has_more": has_more}
 
 
 def create_customer(db: Session, customer: schemas.CustomerCreate):
@@ -419,32 +645,102 @@ def get_order_list(
     limit: int = 10,
     status: Optional[str] = None,
     keyword: Optional[str] = None,
-    use_view: bool = False
+    use_view: bool = False,
+    cursor: Optional[str] = None,
+    count_mode: str = pagination.COUNT_EXACT
 ):
     """
     获取订单列表
     如果 use_view=True，使用视图优化查询（包含客户、账单、归还等关联信息）
+    传入 cursor 时使用游标分页（首页传空字符串），返回 next_cursor
+    count_mode 为总数统计策略（exact/cached/none），见 pagination.py
     """
     if use_view:
-        return get_order_list_from_view(db, skip, limit, status, keyword)
+        return get_order_list_from_view(db, skip, limit, status, keyword, cursor, count_mode)
+    
+    query = db.query(models.LeaseOrder).filter(*order_list_filters(status, keyword))
     
-    query = db.query(models.LeaseOrder).filter(models.LeaseOrder.is_deleted == 0)
+    total = pagination.count_query(query, ["lease_orders"], count_mode)
+    items, next_cursor, has_more = pagination.paginate(
+        query, models.LeaseOrder.created_at, models.LeaseOrder.order_id,
+        skip=skip, limit=limit, cursor=cursor
+    )
     
+    return {"total": total, "items": items, "next_cursor": next_cursor, "has_more": has_more}
+
+
+def order_list_filters(status: Optional[str] = None, keyword: Optional[str] = None) -> List[Any]:
+    """订单列表的过滤条件"""
+    filters = [models.LeaseOrder.is_deleted == 0]
     if status:
-        query = query.filter(models.LeaseOrder.status == status)
+        filters.append(models.LeaseOrder.status == status)
     if keyword:
-        query = query.filter(
-            or_(
-                models.LeaseOrder.order_code.contains(keyword),
-                models.LeaseOrder.customer_name.contains(keyword),
-                models.LeaseOrder.voyage_no.contains(keyword)
-            )
-        )
+        filters.append(search.keyword_filter(
+            keyword,
+            models.LeaseOrder.order_code, models.LeaseOrder.customer_name, models.LeaseOrder.voyage_no
+        ))
+    return filters
+
+
+def order_view_query(status: Optional[str] = None, keyword: Optional[str] = None):
+    """构造订单汇总视图查询，返回 (SQL, 参数)"""
+    query = "SELECT * FROM v_order_summary WHERE 1=1"
+    params = {}
     
-    total = query.count()
-    items = query.order_by(models.LeaseOrder.created_at.desc()).offset(skip).limit(limit).all()
+    if status:
+        query += " AND order_status = :status"
+        params['status'] = status
     
-    return {"total": total, "items": items}
+    if keyword:
+        clause, clause_params = search.keyword_sql(
+            keyword,
+            [models.LeaseOrder.order_code, models.LeaseOrder.customer_name, models.LeaseOrder.voyage_no],
+            "order_id"
+        )
+        query += " AND " + clause
+        params.update(clause_params)
+    
+    return query, params
+
+
+def order_view_item(row) -> Dict[str, Any]:
+    """将订单汇总视图的一行转换为字典"""
+    return {
+        'order_id': row.order_id,
+        'order_code': row.order_code,
+        'customer_id': row.customer_id,
+        'customer_name': row.customer_name,
+        'contact_person': row.contact_person,
+        'customer_phone': row.customer_phone,
+        'customer_email': row.customer_email,
+        'credit_rating': row.credit_rating,
+        'voyage_no': row.voyage_no,
+        'start_date': row.start_date,
+        'expected_return_date': row.expected_return_date,
+        'actual_return_date': row.actual_return_date,
+        'order_status': row.order_status,
+        'total_amount': float(row.total_amount) if row.total_amount else 0.0,
+        'created_by': row.created_by,
+        'created_at': row.created_at,
+        'updated_at': row.updated_at,
+        # 视图提供的统计信息
+        'equipment_count': int(row.equipment_count),
+        'total_rental_days': int(row.total_rental_days),
+        'avg_daily_rate': float(row.avg_daily_rate) if row.avg_daily_rate else 0.0,
+        # 账单信息
+        'bill_id': row.bill_id,
+        'bill_code': row.bill_code,
+        'billing_status': row.billing_status,
+        'billing_amount': float(row.billing_amount) if row.billing_amount else 0.0,
+        'payment_method': row.payment_method,
+        'paid_amount': float(row.paid_amount) if row.paid_amount else 0.0,
+        # 归还信息
+        'return_id': row.return_id,
+        'return_code': row.return_code,
+        'return_date': row.return_date,
+        'inspection_status': row.inspection_status,
+        'total_damage_fee': float(row.total_damage_fee) if row.total_damage_fee else 0.0,
+    }
 
 
 def get_order_list_from_view(
@@ -452,73 +748,29 @@ def get_order_list_from_view(
     skip: int = 0,
     limit: int = 10,
     status: Optional[str] = None,
-    keyword: Optional[str] = None
+    keyword: Optional[str] = None,
+    cursor: Optional[str] = None,
+    count_mode: str = pagination.COUNT_EXACT
 ) -> Dict[str, Any]:
     """
     从视图获取订单汇总列表（优化版本）
-    使用视图: v_order_summary
+    使用视图: v_order_summary；视图不可用时（启动时探测，见 capabilities.py）使用 ORM 查询
     """
-    query = "SELECT * FROM v_order_summary WHERE 1=1"
-    params = {}
-    
-    if status:
-        query += " AND order_status = :status"
-        params['status'] = status
-    
-    if keyword:
-        query += " AND (order_code LIKE :keyword OR customer_name LIKE :keyword OR voyage_no LIKE :keyword)"
-        params['keyword'] = f'%{keyword}%'
+    if not capabilities.view_available("v_order_summary"):
+        return get_order_list(db, skip, limit, status, keyword, use_view=False, cursor=cursor, count_mode=count_mode)
+    query, params = order_view_query(status, keyword)
     
     # 获取总数
-    count_query = query.replace("SELECT *", "SELECT COUNT(*)")
-    total = db.execute(text(count_query), params).scalar()
+    total = pagination.count_sql(db, query, params, VIEW_SOURCE_TABLES["v_order_summary"], count_mode)
     
     # 获取分页数据
-    query += " ORDER BY created_at DESC LIMIT :limit OFFSET :skip"
-    params['limit'] = limit
-    params['skip'] = skip
+    query = pagination.keyset_sql(query, params, "created_at", "order_id", skip, limit, cursor)
     
     result = db.execute(text(query), params)
-    items = []
-    for row in result:
-        items.append({
-            'order_id': row.order_id,
-            'order_code': row.order_code,
-            'customer_id': row.customer_id,
-            'customer_name': row.customer_name,
-            'contact_person': row.contact_person,
-            'customer_phone': row.customer_phone,
-            'customer_email': row.customer_email,
-            'credit_rating': row.credit_rating,
-            'voyage_no': row.voyage_no,
-            'start_date': row.start_date,
-            'expected_return_date': row.expected_return_date,
-            'actual_return_date': row.actual_return_date,
-            'order_status': row.order_status,
-            'total_amount': float(row.total_amount) if row.total_amount else 0.0,
-            'created_by': row.created_by,
-            'created_at': row.created_at,
-            'updated_at': row.updated_at,
-            # 视图提供的统计信息
-            'equipment_count': int(row.equipment_count),
-            'total_rental_days': int(row.total_rental_days),
-            'avg_daily_rate': float(row.avg_daily_rate) if row.avg_daily_rate else 0.0,
-            # 账单信息
-            'bill_id': row.bill_id,
-            'bill_code': row.bill_code,
-            'billing_status': row.billing_status,
-            'billing_amount': float(row.billing_amount) if row.billing_amount else 0.0,
-            'payment_method': row.payment_method,
-            'paid_amount': float(row.paid_amount) if row.paid_amount else 0.0,
-            # 归还信息
-            'return_id': row.return_id,
-            'return_code': row.return_code,
-            'return_date': row.return_date,
-            'inspection_status': row.inspection_status,
-            'total_damage_fee': float(row.total_damage_fee) if row.total_damage_fee else 0.0,
-        })
+    items = [order_view_item(row) for row in result]
     
-    return {"total": total, "items": items}
+    items, next_cursor, has_more = pagination.trim_page(items, 'created_at', 'order_id', limit, cursor)
+    return {"total": total, "items": items, "next_cursor": next_cursor, "has_more": has_more}
 
 
 def get_order_by_id(db: Session, order_id: int):
@@ -529,15 +781,17 @@ def get_order_by_id(db: Session, order_id: int):
     ).first()
 
 
-def create_order(db: Session, order: schemas.LeaseOrderCreate):
+def create_order(db: Session, order: schemas.LeaseOrderCreate, order_code: Optional[str] = None):
     """
     创建租赁订单
     注意：订单总金额和设备状态更新由触发器自动处理
     - trg_order_item_insert: 自动计算订单总金额
-    - trg_order_created: 自动更新设备状态为"已出库"
+    - trg_order_created: 自动更新设备状态为"已出库"（在明细写入之前触发，实际不修改设备；
+      设备由调用方先经 allocation 分配并标记为出库）
+    order_code 为事先分配的订单编号（事务中已有写入时须事先取号，见 sequences.py），不传时在此分配
     """
     # 生成订单编号
-    order_code = f"ORD-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    order_code = order_code or sequences.next_code(sequences.ORDER)
     
     # 创建订单（初始总金额设为0，触发器会自动计算）
     order_dict = order.dict(exclude={'order_items'})
@@ -566,13 +820,68 @@ def create_order(db: Session, order: schemas.LeaseOrderCreate):
     return db_order
 
 
+def create_orders_batch(
+    db: Session,
+    orders: List[schemas.LeaseOrderCreate],
+    codes: Optional[List[str]] = None
+) -> List[Dict[str, Any]]:
+    """
+    批量创建租赁订单（一个事务）
+    订单与全部明细各为一条批量 INSERT，小计与订单金额在 Python 中一次算出，随后每个订单更新一次总金额。
+    MySQL 上明细插入期间设置会话变量 @order_items_batch：订单明细的插入触发器跳过逐行的金额重算、
+    日志与统计重算，改由订单行的更新触发器每个订单执行一次（见 migrations/create_triggers_fixed.sql）
+    codes 为事先分配的订单编号（与 orders 一一对应），不传时在此分配
+    返回 [{"order_id", "order_code", "total_amount", "item_count"}]，顺序与 orders 一致
+    """
+    codes = codes or sequences.next_codes(sequences.ORDER, len(orders))
+    db.execute(insert(models.LeaseOrder), [
+        {**order.model_dump(exclude={'order_items'}), 'order_code': code, 'total_amount': 0.0}
+        for order, code in zip(orders, codes)
+    ])
+    order_ids = dict(
+        db.query(models.LeaseOrder.order_code, models.LeaseOrder.order_id)
+        .filter(models.LeaseOrder.order_code.in_(codes)).all()
+    )
+
+    item_rows: List[Dict[str, Any]] = []
+    created: List[Dict[str, Any]] = []
+    for order, code in zip(orders, codes):
+        total_amount = 0.0
+        for item in order.order_items:
+            subtotal = item.daily_rate * (item.rental_days or 0)
+            item_rows.append({**item.model_dump(), 'order_id': order_ids[code], 'subtotal': subtotal})
+            total_amount += subtotal
+        created.append({
+            "order_id": order_ids[code],
+            "order_code": code,
+            "total_amount": total_amount,
+            "item_count": len(order.order_items),
+        })
+
+    deferred = db.get_bind().dialect.name == "mysql"
+    if deferred:
+        # 用户变量不随事务回滚：出错时未执行到下面的清除，由连接归还连接池时的 reset 事件清除
+        database.set_user_variable(db, "order_items_batch", 1)
+    if item_rows:
+        db.execute(insert(models.OrderItem), item_rows)
+    db.execute(update(models.LeaseOrder), [
+        {"order_id": row["order_id"], "total_amount": row["total_amount"]} for row in created
+    ])
+    if deferred:
+        database.clear_user_variable(db, "order_items_batch")
+    db.commit()
+    return created
+
+
 def update_order(db: Session, order_id: int, order: schemas.LeaseOrderUpdate):
-    """更新订单"""
+    """更新订单；状态改为已取消时，下单时分配的设备放回在库（见 allocation.release_order）"""
     db_order = get_order_by_id(db, order_id)
     if not db_order:
         return None
     
     update_data = order.dict(exclude_unset=True)
+    if update_data.get('status') == models.OrderStatus.CANCELLED:
+        allocation.release_order(db, db_order)
     for key, value in update_data.items():
         setattr(db_order, key, value)
     
@@ -588,31 +897,35 @@ def get_billing_list(
     limit: int = 10,
     status: Optional[str] = None,
     keyword: Optional[str] = None,
-    use_view: bool = False
+    use_view: bool = False,
+    cursor: Optional[str] = None,
+    count_mode: str = pagination.COUNT_EXACT
 ):
     """
     获取账单列表
     如果 use_view=True，使用视图优化查询（包含订单、客户等关联信息）
+    传入 cursor 时使用游标分页（首页传空字符串），返回 next_cursor
+    count_mode 为总数统计策略（exact/cached/none），见 pagination.py
     """
     if use_view:
-        return get_billing_list_from_view(db, skip, limit, status, keyword)
+        return get_billing_list_from_view(db, skip, limit, status, keyword, cursor=cursor, count_mode=count_mode)
     
     query = db.query(models.Billing).filter(models.Billing.is_deleted == 0)
     
     if status:
         query = query.filter(models.Billing.status == status)
     if keyword:
-        query = query.filter(
-            or_(
-                models.Billing.bill_code.contains(keyword),
-                models.Billing.customer_name.contains(keyword)
-            )
-        )
-    
-    total = query.count()
-    items = query.order_by(models.Billing.created_at.desc()).offset(skip).limit(limit).all()
+        query = query.filter(search.keyword_filter(
+            keyword, models.Billing.bill_code, models.Billing.customer_name
+        ))
+    
+    total = pagination.count_query(query, ["billing"], count_mode)
+    items, next_cursor, has_more = pagination.paginate(
+        query, models.Billing.created_at, models.Billing.bill_id,
+        skip=skip, limit=limit, cursor=cursor
+    )
     
-    return {"total": total, "items": items}
+    return {"total": total, "items": items, "next_cursor": next_cursor, "has_more": has_more}
 
 
 def get_billing_list_from_view(
@@ -621,13 +934,19 @@ def get_billing_list_from_view(
     limit: int = 10,
     status: Optional[str] = None,
     keyword: Optional[str] = None,
-    payment_method: Optional[str] = None
+    payment_method: Optional[str] = None,
+    cursor: Optional[str] = None,
+    count_mode: str = pagination.COUNT_EXACT
 ) -> Dict[str, Any]:
     """
     从视图获取财务汇总列表（优化版本）
-    使用视图: v_billing_summary
+    使用视图: v_billing_summary；物化表 billing_summary 已刷新时改为读取物化表（见 summaries.py）
+    物化表与视图都不可用时使用 ORM 查询（不含关联信息）
     """
-    query = "SELECT * FROM v_billing_summary WHERE 1=1"
+    source = capabilities.read_source(summaries.BILLING_SUMMARY)
+    if source is None:
+        return get_billing_list(db, skip, limit, status, keyword, use_view=False, cursor=cursor, count_mode=count_mode)
+    query = f"SELECT * FROM {source} WHERE 1=1"
     params = {}
     
     if status:
@@ -635,21 +954,26 @@ def get_billing_list_from_view(
         params['status'] = status
     
     if keyword:
-        query += " AND (bill_code LIKE :keyword OR customer_name LIKE :keyword OR order_code LIKE :keyword)"
-        params['keyword'] = f'%{keyword}%'
+        # 账单编号、客户名称匹配账单，订单编号匹配所属订单
+        bill_clause, clause_params = search.keyword_sql(
+            keyword, [models.Billing.bill_code, models.Billing.customer_name], "bill_id"
+        )
+        order_clause, order_params = search.keyword_sql(
+            keyword, [models.LeaseOrder.order_code], "order_id", param="order_keyword"
+        )
+        query += f" AND ({bill_clause} OR {order_clause})"
+        params.update(clause_params)
+        params.update(order_params)
     
     if payment_method:
         query += " AND payment_method = :payment_method"
         params['payment_method'] = payment_method
     
     # 获取总数
-    count_query = query.replace("SELECT *", "SELECT COUNT(*)")
-    total = db.execute(text(count_query), params).scalar()
+    total = pagination.count_sql(db, query, params, VIEW_SOURCE_TABLES["v_billing_summary"], count_mode)
     
     # 获取分页数据
-    query += " ORDER BY created_at DESC LIMIT :limit OFFSET :skip"
-    params['limit'] = limit
-    params['skip'] = skip
+    query = pagination.keyset_sql(query, params, "created_at", "bill_id", skip, limit, cursor)
     
     result = db.execute(text(query), params)
     items = []
@@ -690,7 +1014,8 @@ def get_billing_list_from_view(
             'total_rental_days': int(row.total_rental_days),
         })
     
-    return {"total": total, "items": items}
+    items, next_cursor, has_more = pagination.trim_page(items, 'created_at', 'bill_id', limit, cursor)
+    return {"total": total, "items": items, "next_cursor": next_cursor, "has_more": has_more}
 
 
 def create_billing(db: Session, billing: schemas.BillingCreate):
@@ -699,7 +1024,7 @@ def create_billing(db: Session, billing: schemas.BillingCreate):
     注意：总金额计算由触发器 trg_billing_before_insert 自动处理
     如果total_amount未提供或为0，触发器会自动计算：rental_fee + repair_fee + other_fee - discount
     """
-    bill_code = f"BILL-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    bill_code = sequences.next_code(sequences.BILL, db)
     
     billing_dict = billing.dict()
     billing_dict['bill_code'] = bill_code
@@ -744,7 +1069,7 @@ def create_return_record(db: Session, return_record: schemas.ReturnRecordCreate)
     创建归还记录
     注意：操作日志由触发器 trg_return_record_created 自动记录
     """
-    return_code = f"RET-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    return_code = sequences.next_code(sequences.RETURN)
     
     db_return = models.ReturnRecord(
         **return_record.dict(),
@@ -830,74 +1155,131 @@ def create_inspection_record(db: Session, inspection: schemas.InspectionRecordCr
 
 
 # ========== 统计数据 CRUD ==========
-def get_dashboard_stats(db: Session):
-    """获取工作台统计数据"""
-    # 设备统计
-    total_equipment = db.query(func.count(models.Equipment.equipment_id)).filter(
-        models.Equipment.is_deleted == 0
-    ).scalar()
-    
-    in_stock = db.query(func.count(models.Equipment.equipment_id)).filter(
-        models.Equipment.is_deleted == 0,
-        models.Equipment.status == models.EquipmentStatus.IN_STOCK
-    ).scalar()
-    
-    out_stock = db.query(func.count(models.Equipment.equipment_id)).filter(
-        models.Equipment.is_deleted == 0,
-        models.Equipment.status == models.EquipmentStatus.OUT
-    ).scalar()
-    
-    maintenance = db.query(func.count(models.Equipment.equipment_id)).filter(
-        models.Equipment.is_deleted == 0,
-        models.Equipment.status == models.EquipmentStatus.MAINTENANCE
-    ).scalar()
-    
-    # 订单统计
-    pending_checkout = db.query(func.count(models.LeaseOrder.order_id)).filter(
-        models.LeaseOrder.is_deleted == 0,
-        models.LeaseOrder.status == models.OrderStatus.PENDING
-    ).scalar()
-    
-    in_progress_orders = db.query(func.count(models.LeaseOrder.order_id)).filter(
-        models.LeaseOrder.is_deleted == 0,
-        models.LeaseOrder.status == models.OrderStatus.IN_PROGRESS
-    ).scalar()
-    
-    # 财务统计
-    total_revenue = db.query(func.sum(models.Billing.total_amount)).filter(
-        models.Billing.is_deleted == 0,
-        models.Billing.status == models.BillingStatus.PAID
-    ).scalar() or 0.0
-    
-    pending_amount = db.query(func.sum(models.Billing.total_amount)).filter(
-        models.Billing.is_deleted == 0,
-        models.Billing.status.in_([models.BillingStatus.PENDING, models.BillingStatus.CONFIRMED])
-    ).scalar() or 0.0
-    
-    overdue_bills = db.query(func.count(models.Billing.bill_id)).filter(
-        models.Billing.is_deleted == 0,
-        models.Billing.status == models.BillingStatus.OVERDUE
-    ).scalar()
-    
-    # 质检统计
-    pending_inspection = db.query(func.count(models.ReturnRecord.return_id)).filter(
-        models.ReturnRecord.inspection_status == "待质检"
-    ).scalar()
-    
+def _count_if(condition):
+    """条件计数：COUNT(CASE WHEN condition THEN 1 END)"""
+    return func.count(case((condition, 1)))
+
+
+def _sum_if(condition, column):
+    """条件求和：SUM(CASE WHEN condition THEN column END)"""
+    return func.sum(case((condition, column)))
+
+
+def dashboard_stats_statements() -> Dict[str, Any]:
+    """
+    工作台统计的查询语句（同步与异步查询共用）
+    按表分组，每张表只扫描一次，用条件聚合一次得到该表的全部统计项；
+    各组之间互不依赖，可以在不同连接上并发执行
+    """
+    equipment = models.Equipment
+    order = models.LeaseOrder
+    billing = models.Billing
+    return {
+        # 设备统计
+        "equipment": select(
+            func.count(equipment.equipment_id).label("total_equipment"),
+            _count_if(equipment.status == models.EquipmentStatus.IN_STOCK).label("in_stock"),
+            _count_if(equipment.status == models.EquipmentStatus.OUT).label("out_stock"),
+            _count_if(equipment.status == models.EquipmentStatus.MAINTENANCE).label("maintenance"),
+        ).where(equipment.is_deleted == 0),
+        # 订单统计
+        "orders": select(
+            _count_if(order.status == models.OrderStatus.PENDING).label("pending_checkout"),
+            _count_if(order.status == models.OrderStatus.IN_PROGRESS).label("in_progress_orders"),
+        ).where(
+            order.is_deleted == 0,
+            order.status.in_([models.OrderStatus.PENDING, models.OrderStatus.IN_PROGRESS])
+        ),
+        # 财务统计
+        "billing": select(
+            _sum_if(billing.status == models.BillingStatus.PAID, billing.total_amount).label("total_revenue"),
+            _sum_if(
+                billing.status.in_([models.BillingStatus.PENDING, models.BillingStatus.CONFIRMED]),
+                billing.total_amount
+            ).label("pending_amount"),
+            _count_if(billing.status == models.BillingStatus.OVERDUE).label("overdue_bills"),
+        ).where(billing.is_deleted == 0),
+        # 质检统计
+        "inspection": select(
+            func.count(models.ReturnRecord.return_id).label("pending_inspection")
+        ).where(models.ReturnRecord.inspection_status == "待质检"),
+    }
+
+
+def build_dashboard_stats(values: Dict[str, Any]) -> schemas.DashboardStats:
+    """由各项统计值组装工作台统计数据"""
     return schemas.DashboardStats(
-        total_equipment=total_equipment or 0,
-        in_stock=in_stock or 0,
-        out_stock=out_stock or 0,
-        maintenance=maintenance or 0,
-        pending_checkout=pending_checkout or 0,
-        in_progress_orders=in_progress_orders or 0,
-        pending_inspection=pending_inspection or 0,
-        total_revenue=total_revenue,
-        pending_amount=pending_amount,
-        overdue_bills=overdue_bills or 0
+        total_equipment=values["total_equipment"] or 0,
+        in_stock=values["in_stock"] or 0,
+        out_stock=values["out_stock"] or 0,
+        maintenance=values["maintenance"] or 0,
+        pending_checkout=values["pending_checkout"] or 0,
+        in_progress_orders=values["in_progress_orders"] or 0,
+        pending_inspection=values["pending_inspection"] or 0,
+        total_revenue=values["total_revenue"] or 0.0,
+        pending_amount=values["pending_amount"] or 0.0,
+        overdue_bills=values["overdue_bills"] or 0
     )
 
 
+# 触发器维护的统计项（migrations/create_stats_counters.sql）
+STATS_COUNTER_NAMES = (
+    "total_equipment", "in_stock", "out_stock", "maintenance",
+    "total_orders", "pending_checkout", "in_progress_orders",
+    "total_revenue", "pending_amount", "overdue_bills",
+    "total_returned", "pending_inspection",
+)
+# 金额类统计项，其余为计数
+STATS_AMOUNT_COUNTERS = {"total_revenue", "pending_amount"}
+# 每个统计项分散到的槽位行数，须与迁移脚本中的 64 一致
+STATS_COUNTER_SLOTS = 64
+
+
+def stats_counters_statement():
+    """读取全部统计项：每项为各槽位之和（按主键前缀范围读取）"""
+    return select(
+        models.StatsCounter.name,
+        func.sum(models.StatsCounter.value).label("value")
+    ).where(
+        models.StatsCounter.name.in_(STATS_COUNTER_NAMES)
+    ).group_by(models.StatsCounter.name)
+
+
+def parse_stats_counters(rows) -> Optional[Dict[str, Any]]:
+    """将统计项行转换为字典；统计项不全（尚未初始化）时返回 None"""
+    values = {row.name: row.value for row in rows}
+    if any(name not in values for name in STATS_COUNTER_NAMES):
+        return None
+    return {
+        name: float(values[name] or 0) if name in STATS_AMOUNT_COUNTERS else int(round(values[name] or 0))
+        for name in STATS_COUNTER_NAMES
+    }
+
+
+def get_stats_counters(db: Session) -> Optional[Dict[str, Any]]:
+    """
+    读取触发器维护的统计计数
+    计数表不存在（未执行迁移）或未初始化时返回 None，由调用方回退到聚合查询
+    """
+    try:
+        return parse_stats_counters(db.execute(stats_counters_statement()))
+    except Exception:
+        db.rollback()
+        return None
+
+
+def get_dashboard_stats(db: Session):
+    """获取工作台统计数据（优先读取统计计数表，不可用时聚合查询）"""
+    counters = get_stats_counters(db)
+    if counters is not None:
+        return build_dashboard_stats(counters)
+
+    values = {}
+    for statement in dashboard_stats_statements().values():
+        values.update(db.execute(statement).mappings().one())
+    return build_dashboard_stats(values)
+
+
 # ========== 用户管理 CRUD ==========
 def get_user_by_username(db: Session, username: str):
     """根据用户名获取用户"""
@@ -974,35 +1356,36 @@ def get_rental_analysis_stats(db: Session):
     today = date.today()
     yesterday = today - timedelta(days=1)
     
+    # 总数优先取自统计计数表（触发器维护），不可用时扫描业务表
+    counters = get_stats_counters(db)
+    # 昨日数据取自每日汇总
+    yesterday_stats = rollups.daily_rows(db, [yesterday], ["orders", "order_items", "return_count"]).get(yesterday, {})
+    
     # 1. 租赁订单总数
-    total_orders = db.query(func.count(models.LeaseOrder.order_id)).filter(
-        models.LeaseOrder.is_deleted == 0
-    ).scalar() or 0
+    if counters is not None:
+        total_orders = counters["total_orders"]
+    else:
+        total_orders = db.query(func.count(models.LeaseOrder.order_id)).filter(
+            models.LeaseOrder.is_deleted == 0
+        ).scalar() or 0
     
     # 昨日订单数
-    yesterday_orders = db.query(func.count(models.LeaseOrder.order_id)).filter(
-        models.LeaseOrder.is_deleted == 0,
-        func.date(models.LeaseOrder.created_at) == yesterday
-    ).scalar() or 0
+    yesterday_orders = yesterday_stats.get("orders") or 0
     
     # 计算增长
     orders_growth = ((total_orders - yesterday_orders) / yesterday_orders * 100) if yesterday_orders > 0 else 0.0
     
     # 2. 装备出库量（已出库的设备数量）
-    total_outbound = db.query(func.count(models.Equipment.equipment_id)).filter(
-        models.Equipment.is_deleted == 0,
-        models.Equipment.status == models.EquipmentStatus.OUT
-    ).scalar() or 0
+    if counters is not None:
+        total_outbound = counters["out_stock"]
+    else:
+        total_outbound = db.query(func.count(models.Equipment.equipment_id)).filter(
+            models.Equipment.is_deleted == 0,
+            models.Equipment.status == models.EquipmentStatus.OUT
+        ).scalar() or 0
     
-    # 昨日出库量（通过订单创建时间判断）
-    yesterday_outbound = db.query(func.count(models.Equipment.equipment_id)).join(
-        models.OrderItem, models.OrderItem.equipment_id == models.Equipment.equipment_id
-    ).join(
-        models.LeaseOrder, models.LeaseOrder.order_id == models.OrderItem.order_id
-    ).filter(
-        models.Equipment.is_deleted == 0,
-        func.date(models.LeaseOrder.created_at) == yesterday
-    ).scalar() or 0
+    # 昨日出库量（昨日订单的明细数）
+    yesterday_outbound = yesterday_stats.get("order_items") or 0
     
     outbound_growth = ((total_outbound - yesterday_outbound) / yesterday_outbound * 100) if yesterday_outbound > 0 else 0.0
     
@@ -1010,28 +1393,23 @@ def get_rental_analysis_stats(db: Session):
     total_renting = total_outbound
     
     # 昨日在租数（通过昨日订单中的设备数量估算）
-    yesterday_renting = db.query(func.count(models.OrderItem.item_id)).join(
-        models.LeaseOrder, models.LeaseOrder.order_id == models.OrderItem.order_id
-    ).filter(
-        models.LeaseOrder.is_deleted == 0,
-        func.date(models.LeaseOrder.created_at) == yesterday
-    ).scalar() or 0
+    yesterday_renting = yesterday_stats.get("order_items") or 0
     
     renting_growth = ((total_renting - yesterday_renting) / yesterday_renting * 100) if yesterday_renting > 0 else 0.0
     
     # 4. 归还装备数（通过归还记录统计）
-    total_returned = db.query(func.count(models.ReturnRecord.return_id)).scalar() or 0
+    if counters is not None:
+        total_returned = counters["total_returned"]
+    else:
+        total_returned = db.query(func.count(models.ReturnRecord.return_id)).scalar() or 0
     
     # 昨日归还数
-    yesterday_returned = db.query(func.count(models.ReturnRecord.return_id)).filter(
-        func.date(models.ReturnRecord.return_date) == yesterday
-    ).scalar() or 0
+    yesterday_returned = yesterday_stats.get("return_count") or 0
     
     returned_growth = ((total_returned - yesterday_returned) / yesterday_returned * 100) if yesterday_returned > 0 else 0.0
     
-    # 5. 装备类型租赁比例（使用视图优化）
-    try:
-        # 尝试使用视图优化查询
+    # 5. 装备类型租赁比例（视图可用时使用视图，见 capabilities.py）
+    if capabilities.view_available("v_equipment_category_stats"):
         category_stats = db.execute(text("""
             SELECT category, total_rental_count as count
             FROM v_equipment_category_stats
@@ -1039,8 +1417,7 @@ def get_rental_analysis_stats(db: Session):
             ORDER BY total_rental_count DESC
         """)).fetchall()
         category_ratio = [{"name": row.category, "value": int(row.count)} for row in category_stats]
-    except Exception:
-        # 如果视图不存在，使用原查询方式
+    else:
         category_stats = db.query(
             models.Equipment.category,
             func.count(models.OrderItem.item_id).label('count')
@@ -1054,9 +1431,8 @@ def get_rental_analysis_stats(db: Session):
         ).group_by(models.Equipment.category).all()
         category_ratio = [{"name": cat, "value": cnt} for cat, cnt in category_stats]
     
-    # 6. 热门租赁装备榜单（使用视图优化）
-    try:
-        # 尝试使用视图优化查询
+    # 6. 热门租赁装备榜单（视图可用时使用视图，见 capabilities.py）
+    if capabilities.view_available("v_equipment_usage"):
         popular_stats = db.execute(text("""
             SELECT 
                 equipment_name,
@@ -1075,8 +1451,7 @@ def get_rental_analysis_stats(db: Session):
             }
             for row in popular_stats
         ]
-    except Exception:
-        # 如果视图不存在，使用原查询方式
+    else:
         popular_stats = db.query(
             models.Equipment.equipment_name,
             func.count(models.OrderItem.item_id).label('rental_count'),
@@ -1110,17 +1485,8 @@ def get_rental_analysis_stats(db: Session):
         month_date = today - timedelta(days=30 * i)
         months_list.append(month_date.strftime('%Y-%m'))
     
-    # 查询每个月的订单数量
-    period_stats = db.query(
-        func.date_format(models.LeaseOrder.created_at, '%Y-%m').label('month'),
-        func.count(models.LeaseOrder.order_id).label('count')
-    ).filter(
-        models.LeaseOrder.is_deleted == 0,
-        models.LeaseOrder.created_at >= today - timedelta(days=365)  # 最近一年
-    ).group_by(func.date_format(models.LeaseOrder.created_at, '%Y-%m')).order_by('month').all()
-    
-    # 创建月份到数量的映射
-    stats_dict = {month: count for month, count in period_stats}
+    # 每个月的订单数量（最近一年的每日汇总按月合计）
+    stats_dict = rollups.monthly_totals(db, "orders", analytics.date_window(today, 366))
     
     # 为每个月份填充数据，如果没有数据则为0
     xAxis = months_list
@@ -1142,215 +1508,166 @@ def get_rental_analysis_stats(db: Session):
     )
 
 
+def equipment_rentals_on_day_query(db: Session, equipment_name: str, day: date):
+    """某装备（按名称）在某天创建的订单中的租赁明细数"""
+    return db.query(func.count(models.OrderItem.item_id)).join(
+        models.Equipment,
+        models.OrderItem.equipment_id == models.Equipment.equipment_id
+    ).join(
+        models.LeaseOrder,
+        models.OrderItem.order_id == models.LeaseOrder.order_id
+    ).filter(
+        models.Equipment.equipment_name == equipment_name,
+        models.LeaseOrder.is_deleted == 0,
+        date_ranges.on_day(models.LeaseOrder.created_at, day)
+    )
+
+
 # ========== 多维数据分析统计 CRUD ==========
-def get_multi_dimension_analysis_stats(db: Session):
-    """获取多维数据分析统计数据"""
-    from datetime import timedelta
-    
-    today = date.today()
-    
-    # 1. 数据概览 - 装备入库量、装备租赁量、装备利用率、活跃租户数（最近8天）
-    days_list = []
-    for i in range(7, -1, -1):
-        day_date = today - timedelta(days=i)
-        days_list.append(day_date.strftime('%m.%d'))
-    
-    # 装备入库量（最近8天）
-    inbound_data = []
-    for i in range(7, -1, -1):
-        day_date = today - timedelta(days=i)
-        count = db.query(func.count(models.InboundRecord.inbound_id)).filter(
-            models.InboundRecord.is_deleted == 0,
-            func.date(models.InboundRecord.created_at) == day_date
-        ).scalar() or 0
-        inbound_data.append(count)
-    
-    # 装备租赁量（最近8天）
-    rental_data = []
-    for i in range(7, -1, -1):
-        day_date = today - timedelta(days=i)
-        count = db.query(func.count(models.LeaseOrder.order_id)).filter(
-            models.LeaseOrder.is_deleted == 0,
-            func.date(models.LeaseOrder.created_at) == day_date
-        ).scalar() or 0
-        rental_data.append(count)
-    
-    # 装备利用率（最近8天）- 计算为：在租装备数 / 总装备数 * 100
-    utilization_data = []
-    total_equipment = db.query(func.count(models.Equipment.equipment_id)).filter(
-        models.Equipment.is_deleted == 0
-    ).scalar() or 1  # 避免除零
-    
-    for i in range(7, -1, -1):
-        day_date = today - timedelta(days=i)
-        # 计算该日期的在租装备数（通过订单状态判断）
-        renting_count = db.query(func.count(models.Equipment.equipment_id)).join(
-            models.OrderItem, models.OrderItem.equipment_id == models.Equipment.equipment_id
-        ).join(
-            models.LeaseOrder, models.LeaseOrder.order_id == models.OrderItem.order_id
-        ).filter(
-            models.Equipment.is_deleted == 0,
-            models.LeaseOrder.is_deleted == 0,
-            models.LeaseOrder.start_date <= day_date,
-            or_(
-                models.LeaseOrder.actual_return_date.is_(None),
-                models.LeaseOrder.actual_return_date > day_date
-            )
-        ).scalar() or 0
-        
-        utilization = int((renting_count / total_equipment) * 100) if total_equipment > 0 else 0
-        utilization_data.append(utilization)
-    
-    # 活跃租户数（最近8天）- 有订单的客户数
-    active_customers_data = []
-    for i in range(7, -1, -1):
-        day_date = today - timedelta(days=i)
-        count = db.query(func.count(func.distinct(models.LeaseOrder.customer_id))).filter(
-            models.LeaseOrder.is_deleted == 0,
-            func.date(models.LeaseOrder.created_at) == day_date
-        ).scalar() or 0
-        active_customers_data.append(count)
-    
-    # 计算总数
-    total_inbound = sum(inbound_data)
-    total_rental = sum(rental_data)
+# 多维分析的各个部分（切片）相互独立计算，既可以整体返回，也可以按需单独缓存
+ANALYSIS_SLICES = (
+    "data_overview",
+    "data_chain_growth",
+    "user_actions",
+    "content_type_distribution",
+    "content_publishing_source",
+)
+
+# 表写入后需要失效的分析切片
+ANALYSIS_SLICE_DEPENDENCIES = {
+    # 每日汇总刷新后，读取汇总的切片随之失效
+    "daily_stats": ("data_overview", "data_chain_growth"),
+    "daily_active_customers": ("data_overview", "data_chain_growth"),
+    "lease_orders": ANALYSIS_SLICES,
+    "order_items": ("data_overview", "data_chain_growth", "content_type_distribution"),
+    "inbound_records": ("data_overview", "content_publishing_source"),
+    "equipment": ("data_overview", "content_type_distribution"),
+    "return_records": ("user_actions", "content_publishing_source"),
+    "inspection_records": ("user_actions",),
+}
+
+# 分析快照缓存：key 为 (分析日期, 切片名)
+ANALYSIS_CACHE_TTL = 60
+analysis_cache = TTLCache("analysis_snapshot", ANALYSIS_CACHE_TTL)
+
+
+@on_tables_written
+def _invalidate_analysis_slices(tables):
+    """订单、入库、归还等写入提交后，失效对应的分析切片"""
+    stale = set()
+    for table in tables:
+        stale.update(ANALYSIS_SLICE_DEPENDENCIES.get(table, ()))
+    if stale:
+        analysis_cache.invalidate(lambda key: key[1] in stale)
+
+
+def _analysis_data_overview(db: Session, today: date, days: int = 8) -> dict:
+    """数据概览 - 装备入库量、装备租赁量、装备利用率、活跃租户数（默认最近8天）"""
+    window = analytics.date_window(today, days)
+
+    # 每日汇总：入库单数、订单数、活跃客户数
+    daily_rows = rollups.daily_rows(db, window, ["inbound_count", "orders", "active_customers"])
+
+    # 在租 / 在役设备台数：租赁区间一次取出，NumPy 差分累计得到逐日利用率
+    usage = utilization.utilization(db, window[0], window[-1])
+
+    total_active_customers = rollups.distinct_customers(db)
+
+    inbound_data = analytics.fill_series(window, daily_rows, "inbound_count")
+    rental_data = analytics.fill_series(window, daily_rows, "orders")
+    active_customers_data = analytics.fill_series(window, daily_rows, "active_customers")
+    utilization_data = [int(rate) for rate in usage["rate"]]
+
     avg_utilization = int(sum(utilization_data) / len(utilization_data)) if utilization_data else 0
-    total_active_customers = db.query(func.count(func.distinct(models.LeaseOrder.customer_id))).filter(
-        models.LeaseOrder.is_deleted == 0
-    ).scalar() or 0
-    
-    data_overview = {
-        "xAxis": days_list,
+
+    return {
+        "xAxis": [day.strftime('%m.%d') for day in window],
         "data": [
-            {"name": "装备入库量", "value": inbound_data, "count": total_inbound},
-            {"name": "装备租赁量", "value": rental_data, "count": total_rental},
+            {"name": "装备入库量", "value": inbound_data, "count": sum(inbound_data)},
+            {"name": "装备租赁量", "value": rental_data, "count": sum(rental_data)},
             {"name": "装备利用率", "value": utilization_data, "count": avg_utilization},
             {"name": "活跃租户数", "value": active_customers_data, "count": total_active_customers},
         ]
     }
-    
-    # 2. 数据链增长 - 保留趋势、用户留存、内容消费趋势、内容消费
-    # 保留趋势（订单保留率）
-    retention_trends_count = db.query(func.count(models.LeaseOrder.order_id)).filter(
-        models.LeaseOrder.is_deleted == 0,
-        models.LeaseOrder.status == models.OrderStatus.IN_PROGRESS
-    ).scalar() or 0
-    
-    # 用户留存（活跃客户数）
-    user_retention_count = db.query(func.count(func.distinct(models.LeaseOrder.customer_id))).filter(
+
+
+def retention_intervals_query(db: Session, first_day: date, last_day: date):
+    """[first_day, last_day] 内处于执行中的订单区间，走 (is_deleted, status, created_at) 索引"""
+    return db.query(
+        models.LeaseOrder.created_at,
+        models.LeaseOrder.actual_return_date
+    ).filter(
         models.LeaseOrder.is_deleted == 0,
-        models.LeaseOrder.created_at >= today - timedelta(days=30)
-    ).scalar() or 0
-    
-    # 内容消费趋势（装备使用天数）
-    content_consumption_trends_count = db.query(func.sum(models.OrderItem.rental_days)).filter(
-        models.OrderItem.order_id.in_(
-            db.query(models.LeaseOrder.order_id).filter(
-                models.LeaseOrder.is_deleted == 0
-            )
+        models.LeaseOrder.status == models.OrderStatus.IN_PROGRESS,
+        models.LeaseOrder.created_at < date_ranges.day_start(last_day + timedelta(days=1)),
+        or_(
+            models.LeaseOrder.actual_return_date.is_(None),
+            models.LeaseOrder.actual_return_date > first_day
         )
+    )
+
+
+def _analysis_data_chain_growth(db: Session, today: date, days: int = 12) -> dict:
+    """数据链增长 - 保留趋势、用户留存、内容消费趋势、内容消费（默认最近12天）"""
+    from datetime import timedelta
+
+    window = analytics.date_window(today, days)
+
+    # 每日汇总：活跃客户数、订单金额、租赁天数总和（明细按订单创建日期归属）
+    daily_rows = rollups.daily_rows(db, window, ["active_customers", "order_amount", "rental_days"])
+
+    # 执行中订单区间（订单创建日 ~ 实际归还日）
+    retention_intervals = retention_intervals_query(db, window[0], today).all()
+
+    # 全量汇总：执行中订单数走状态索引，其余取自每日汇总
+    in_progress = db.query(func.count(models.LeaseOrder.order_id)).filter(
+        models.LeaseOrder.is_deleted == 0,
+        models.LeaseOrder.status == models.OrderStatus.IN_PROGRESS
     ).scalar() or 0
-    
-    # 内容消费（总订单金额）
-    content_consumption_count = db.query(func.sum(models.LeaseOrder.total_amount)).filter(
-        models.LeaseOrder.is_deleted == 0
-    ).scalar() or 0
-    
-    # 生成图表数据（最近12天）- 使用真实数据
-    chart_days = []
-    chart_values_retention = []
-    chart_values_user = []
-    chart_values_consumption_trends = []
-    chart_values_consumption = []
-    
-    for i in range(11, -1, -1):
-        day_date = today - timedelta(days=i)
-        chart_days.append(f"{day_date.day}日")
-        
+    recent_customers = rollups.distinct_customers(db, since=today - timedelta(days=30))
+    total_amount = rollups.metric_total(db, "order_amount")
+    total_rental_days = rollups.metric_total(db, "rental_days")
+
+    chart_days = [f"{day.day}日" for day in window]
+    chart_values = {
         # 保留趋势：每日在租订单数
-        daily_retention = db.query(func.count(models.LeaseOrder.order_id)).filter(
-            models.LeaseOrder.is_deleted == 0,
-            models.LeaseOrder.status == models.OrderStatus.IN_PROGRESS,
-            func.date(models.LeaseOrder.created_at) <= day_date,
-            or_(
-                models.LeaseOrder.actual_return_date.is_(None),
-                func.date(models.LeaseOrder.actual_return_date) > day_date
-            )
-        ).scalar() or 0
-        chart_values_retention.append(daily_retention)
-        
+        "retentionTrends": analytics.count_active_per_day(
+            [(analytics.as_date(created), returned) for created, returned in retention_intervals],
+            window
+        ),
         # 用户留存：每日活跃客户数
-        daily_users = db.query(func.count(func.distinct(models.LeaseOrder.customer_id))).filter(
-            models.LeaseOrder.is_deleted == 0,
-            func.date(models.LeaseOrder.created_at) == day_date
-        ).scalar() or 0
-        chart_values_user.append(daily_users)
-        
+        "userRetention": analytics.fill_series(window, daily_rows, "active_customers"),
         # 内容消费趋势：每日租赁天数总和
-        daily_rental_days = db.query(func.sum(models.OrderItem.rental_days)).join(
-            models.LeaseOrder, models.LeaseOrder.order_id == models.OrderItem.order_id
-        ).filter(
-            models.LeaseOrder.is_deleted == 0,
-            func.date(models.LeaseOrder.created_at) == day_date
-        ).scalar() or 0
-        chart_values_consumption_trends.append(int(daily_rental_days or 0))
-        
+        "contentConsumptionTrends": analytics.fill_series(window, daily_rows, "rental_days"),
         # 内容消费：每日订单金额总和
-        daily_amount = db.query(func.sum(models.LeaseOrder.total_amount)).filter(
-            models.LeaseOrder.is_deleted == 0,
-            func.date(models.LeaseOrder.created_at) == day_date
-        ).scalar() or 0
-        chart_values_consumption.append(int(daily_amount or 0))
-    
-    data_chain_growth = {
-        "retentionTrends": {
-            "count": retention_trends_count,
-            "growth": 0.0,
-            "chartData": {
-                "xAxis": chart_days,
-                "data": {
-                    "name": "retentionTrends",
-                    "value": chart_values_retention
-                }
-            }
-        },
-        "userRetention": {
-            "count": user_retention_count,
-            "growth": 0.0,
-            "chartData": {
-                "xAxis": chart_days,
-                "data": {
-                    "name": "userRetention",
-                    "value": chart_values_user
-                }
-            }
-        },
-        "contentConsumptionTrends": {
-            "count": content_consumption_trends_count or 0,
-            "growth": 0.0,
-            "chartData": {
-                "xAxis": chart_days,
-                "data": {
-                    "name": "contentConsumptionTrends",
-                    "value": chart_values_consumption_trends
-                }
-            }
-        },
-        "contentConsumption": {
-            "count": int(content_consumption_count or 0),
+        "contentConsumption": analytics.fill_series(window, daily_rows, "order_amount"),
+    }
+    counts = {
+        "retentionTrends": int(in_progress),
+        "userRetention": recent_customers,
+        "contentConsumptionTrends": total_rental_days,
+        "contentConsumption": int(total_amount or 0),
+    }
+
+    return {
+        quota: {
+            "count": counts[quota],
             "growth": 0.0,
             "chartData": {
                 "xAxis": chart_days,
                 "data": {
-                    "name": "contentConsumption",
-                    "value": chart_values_consumption
+                    "name": quota,
+                    "value": chart_values[quota]
                 }
             }
         }
+        for quota in ("retentionTrends", "userRetention", "contentConsumptionTrends", "contentConsumption")
     }
-    
-    # 3. 用户行为 - 点赞量、评论量、分享量（映射到：订单数、归还数、质检数）
-    user_actions = {
+
+
+def _analysis_user_actions(db: Session, today: date) -> dict:
+    """用户行为 - 点赞量、评论量、分享量（映射到：订单数、归还数、质检数）"""
+    return {
         "data": [
             db.query(func.count(models.LeaseOrder.order_id)).filter(
                 models.LeaseOrder.is_deleted == 0
@@ -1359,29 +1676,32 @@ def get_multi_dimension_analysis_stats(db: Session):
             db.query(func.count(models.InspectionRecord.inspection_id)).scalar() or 0,  # 质检数
         ]
     }
-    
-    # 4. 内容类型分布（雷达图）- 装备类型分布
+
+
+def _analysis_content_type_distribution(db: Session, today: date) -> dict:
+    """内容类型分布（雷达图）- 按装备类型统计租赁次数"""
     equipment_categories = db.query(
         models.Equipment.category,
         func.count(models.Equipment.equipment_id).label('count')
     ).filter(
         models.Equipment.is_deleted == 0
     ).group_by(models.Equipment.category).all()
-    
-    # 按装备类型统计租赁次数
-    category_rental_data = {}
-    for cat, _ in equipment_categories:
-        rental_count = db.query(func.count(models.OrderItem.item_id)).join(
-            models.Equipment, models.Equipment.equipment_id == models.OrderItem.equipment_id
-        ).filter(
-            models.Equipment.category == cat,
-            models.Equipment.is_deleted == 0
-        ).scalar() or 0
-        category_rental_data[cat] = rental_count
-    
+
+    # 各装备类型的租赁次数（一次分组查询）
+    category_rental_counts = dict(db.query(
+        models.Equipment.category,
+        func.count(models.OrderItem.item_id)
+    ).join(
+        models.OrderItem, models.OrderItem.equipment_id == models.Equipment.equipment_id
+    ).filter(
+        models.Equipment.is_deleted == 0
+    ).group_by(models.Equipment.category).all())
+
+    category_rental_data = {cat: category_rental_counts.get(cat, 0) for cat, _ in equipment_categories}
+
     # 获取所有装备类型的最大租赁次数
     max_rental = max([rental_count for rental_count in category_rental_data.values()], default=1)
-    
+
     # 计算合理的max值（向上取整到最近的100或1000）
     if max_rental == 0:
         max_value = 100
@@ -1391,20 +1711,22 @@ def get_multi_dimension_analysis_stats(db: Session):
         max_value = ((max_rental // 100) + 1) * 100  # 向上取整到最近的100
     else:
         max_value = ((max_rental // 1000) + 1) * 1000  # 向上取整到最近的1000
-    
+
     # 最多6个装备类型
     categories_list = list(category_rental_data.keys())[:6]
     indicator = [{"name": cat, "max": max_value} for cat in categories_list]
-    
-    content_type_distribution = {
+
+    return {
         "indicator": indicator,
         "data": [{
             "name": "装备租赁",
             "value": [category_rental_data.get(cat, 0) for cat in categories_list]
         }]
     }
-    
-    # 5. 内容发布来源 - 3个饼图（映射到：装备来源、租赁状态、归还状态）
+
+
+def _analysis_content_publishing_source(db: Session, today: date) -> dict:
+    """内容发布来源 - 3个饼图（映射到：装备来源、租赁状态、归还状态）"""
     # 第一个饼图：装备来源（供应商）
     supplier_stats = db.query(
         models.InboundRecord.supplier,
@@ -1413,10 +1735,10 @@ def get_multi_dimension_analysis_stats(db: Session):
         models.InboundRecord.is_deleted == 0,
         models.InboundRecord.supplier.isnot(None)
     ).group_by(models.InboundRecord.supplier).limit(5).all()
-    
+
     # 确保value是数字而不是数组
     supplier_data = [{"name": name or "未知", "value": cnt} for name, cnt in supplier_stats]
-    
+
     # 第二个饼图：租赁状态分布
     order_status_stats = db.query(
         models.LeaseOrder.status,
@@ -1424,28 +1746,60 @@ def get_multi_dimension_analysis_stats(db: Session):
     ).filter(
         models.LeaseOrder.is_deleted == 0
     ).group_by(models.LeaseOrder.status).all()
-    
+
     status_data = [{"name": str(status.value), "value": cnt} for status, cnt in order_status_stats]
-    
+
     # 第三个饼图：归还状态分布
     return_status_stats = db.query(
         models.ReturnRecord.inspection_status,
         func.count(models.ReturnRecord.return_id).label('count')
     ).group_by(models.ReturnRecord.inspection_status).all()
-    
+
     return_status_data = [{"name": status or "未知", "value": cnt} for status, cnt in return_status_stats]
-    
-    content_publishing_source = {
+
+    return {
         "data": [supplier_data, status_data, return_status_data]
     }
-    
-    return schemas.MultiDimensionAnalysisStats(
-        data_overview=data_overview,
-        data_chain_growth=data_chain_growth,
-        user_actions=user_actions,
-        content_type_distribution=content_type_distribution,
-        content_publishing_source=content_publishing_source
-    )
+
+
+_ANALYSIS_SLICE_BUILDERS = {
+    "data_overview": _analysis_data_overview,
+    "data_chain_growth": _analysis_data_chain_growth,
+    "user_actions": _analysis_user_actions,
+    "content_type_distribution": _analysis_content_type_distribution,
+    "content_publishing_source": _analysis_content_publishing_source,
+}
+
+
+def get_multi_dimension_analysis_stats(db: Session, today: Optional[date] = None):
+    """
+    获取多维数据分析统计数据
+    每个事实表在整个日期窗口内只做一次分组聚合，缺失日期在 Python 中补零，
+    查询次数与窗口天数无关
+    """
+    today = today or date.today()
+    return schemas.MultiDimensionAnalysisStats(**{
+        name: builder(db, today) for name, builder in _ANALYSIS_SLICE_BUILDERS.items()
+    })
+
+
+def get_analysis_slice(db: Session, slice_name: str, today: Optional[date] = None) -> dict:
+    """
+    从分析快照缓存中读取单个切片
+    缓存按 (分析日期, 切片名) 存储，过期或被写入失效后重新计算；
+    并发请求同一切片时只计算一次
+    """
+    today = today or date.today()
+    builder = _ANALYSIS_SLICE_BUILDERS[slice_name]
+    return analysis_cache.get_or_compute((today, slice_name), lambda: builder(db, today))
+
+
+def get_cached_multi_dimension_analysis_stats(db: Session, today: Optional[date] = None):
+    """获取多维数据分析统计数据（经过分析快照缓存）"""
+    today = today or date.today()
+    return schemas.MultiDimensionAnalysisStats(**{
+        name: get_analysis_slice(db, name, today) for name in ANALYSIS_SLICES
+    })
 
 
 # ========== 触发器日志管理 ==========
@@ -1456,9 +1810,15 @@ def get_trigger_logs(
     log_type: Optional[str] = None,
     trigger_name: Optional[str] = None,
     start_date: Optional[str] = None,
-    end_date: Optional[str] = None
+    end_date: Optional[str] = None,
+    cursor: Optional[str] = None,
+    count_mode: str = pagination.COUNT_EXACT
 ):
-    """获取触发器日志列表"""
+    """
+    获取触发器日志列表
+    传入 cursor 时使用游标分页（首页传空字符串），忽略 page，返回 next_cursor
+    count_mode 为总数统计策略（exact/cached/none），见 pagination.py
+    """
     query = db.query(models.TriggerLog).filter(models.TriggerLog.id > 0)
     
     # 筛选条件
@@ -1475,16 +1835,21 @@ def get_trigger_logs(
         query = query.filter(models.TriggerLog.created_at <= end_date)
     
     # 总数
-    total = query.count()
+    total = pagination.count_query(query, ["trigger_logs"], count_mode)
     
     # 分页查询
-    logs = query.order_by(models.TriggerLog.created_at.desc()).offset((page - 1) * page_size).limit(page_size).all()
+    logs, next_cursor, has_more = pagination.paginate(
+        query, models.TriggerLog.created_at, models.TriggerLog.id,
+        skip=(page - 1) * page_size, limit=page_size, cursor=cursor
+    )
     
     return {
         "items": logs,
         "total": total,
         "page": page,
-        "page_size": page_size
+        "page_size": page_size,
+        "next_cursor": next_cursor,
+        "has_more": has_more
     }
 
 
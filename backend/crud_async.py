@@ -0,0 +1,182 @@
+"""
+异步 CRUD（AsyncSession）
+高频只读接口的异步实现：过滤条件、视图 SQL 与行转换复用 crud.py 中的同名逻辑，
+返回结构与同步版本一致
+"""
+import asyncio
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+import capabilities
+import crud
+import models
+import pagination
+import schemas
+import summaries
+
+
+# ========== 设备管理 ==========
+async def get_equipment_list(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 10,
+    keyword: Optional[str] = None,
+    category: Optional[str] = None,
+    status: Optional[str] = None,
+    use_view: bool = False,
+    cursor: Optional[str] = None,
+    count_mode: str = pagination.COUNT_EXACT
+) -> Dict[str, Any]:
+    """获取设备列表（异步），参数与 crud.get_equipment_list 相同"""
+    if use_view:
+        return await get_equipment_list_from_view(db, skip, limit, keyword, category, status, cursor, count_mode)
+
+    statement = select(models.Equipment).where(*crud.equipment_list_filters(keyword, category, status))
+    total = await pagination.count_statement_async(db, statement, ["equipment"], count_mode)
+    items, next_cursor, has_more = await pagination.paginate_async(
+        db, statement, models.Equipment.created_at, models.Equipment.equipment_id,
+        skip=skip, limit=limit, cursor=cursor
+    )
+    return {"total": total, "items": items, "next_cursor": next_cursor, "has_more": has_more}
+
+
+async def get_equipment_list_from_view(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 10,
+    keyword: Optional[str] = None,
+    category: Optional[str] = None,
+    status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    count_mode: str = pagination.COUNT_EXACT
+) -> Dict[str, Any]:
+    """
+    从视图获取设备库存列表（异步）
+    使用视图: v_equipment_inventory，物化表已刷新时改为读取物化表；
+    两者都不可用时使用 ORM 分页，只聚合当前页设备的租赁统计
+    """
+    source = capabilities.read_source(summaries.EQUIPMENT_INVENTORY)
+    if source is None:
+        result = await get_equipment_list(
+            db, skip=skip, limit=limit,
+            keyword=keyword, category=category, status=status,
+            use_view=False,
+            cursor=cursor,
+            count_mode=count_mode
+        )
+        equipment_ids = [equipment.equipment_id for equipment in result["items"]]
+        stats_rows = (
+            (await db.execute(crud.equipment_rental_stats_statement(equipment_ids))).all()
+            if equipment_ids else []
+        )
+        result["items"] = crud.equipment_inventory_items(result["items"], stats_rows)
+        return result
+
+    query, params = crud.equipment_view_query(keyword, category, status, source)
+    total = await pagination.count_sql_async(
+        db, query, params, crud.VIEW_SOURCE_TABLES["v_equipment_inventory"], count_mode
+    )
+    query = pagination.keyset_sql(query, params, "created_at", "equipment_id", skip, limit, cursor)
+    result = await db.execute(text(query), params)
+    items = [crud.equipment_view_item(row) for row in result]
+
+    items, next_cursor, has_more = pagination.trim_page(items, 'created_at', 'equipment_id', limit, cursor)
+    return {"total": total, "items": items, "next_cursor": next_cursor, "has_more": has_more}
+
+
+# ========== 租赁订单 ==========
+async def get_order_list(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 10,
+    status: Optional[str] = None,
+    keyword: Optional[str] = None,
+    use_view: bool = False,
+    cursor: Optional[str] = None,
+    count_mode: str = pagination.COUNT_EXACT
+) -> Dict[str, Any]:
+    """获取订单列表（异步），参数与 crud.get_order_list 相同"""
+    if use_view:
+        return await get_order_list_from_view(db, skip, limit, status, keyword, cursor, count_mode)
+
+    statement = select(models.LeaseOrder).where(*crud.order_list_filters(status, keyword))
+    total = await pagination.count_statement_async(db, statement, ["lease_orders"], count_mode)
+    # 响应包含订单明细：AsyncSession 不能懒加载，整页明细用一次 IN 查询预先加载
+    statement = statement.options(selectinload(models.LeaseOrder.order_items))
+    items, next_cursor, has_more = await pagination.paginate_async(
+        db, statement, models.LeaseOrder.created_at, models.LeaseOrder.order_id,
+        skip=skip, limit=limit, cursor=cursor
+    )
+    return {"total": total, "items": items, "next_cursor": next_cursor, "has_more": has_more}
+
+
+async def get_order_list_from_view(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 10,
+    status: Optional[str] = None,
+    keyword: Optional[str] = None,
+    cursor: Optional[str] = None,
+    count_mode: str = pagination.COUNT_EXACT
+) -> Dict[str, Any]:
+    """
+    从视图获取订单汇总列表（异步）
+    使用视图: v_order_summary，视图不可用时使用 ORM 查询
+    """
+    if not capabilities.view_available("v_order_summary"):
+        return await get_order_list(db, skip, limit, status, keyword, use_view=False, cursor=cursor, count_mode=count_mode)
+    query, params = crud.order_view_query(status, keyword)
+    total = await pagination.count_sql_async(
+        db, query, params, crud.VIEW_SOURCE_TABLES["v_order_summary"], count_mode
+    )
+    query = pagination.keyset_sql(query, params, "created_at", "order_id", skip, limit, cursor)
+    result = await db.execute(text(query), params)
+    items = [crud.order_view_item(row) for row in result]
+
+    items, next_cursor, has_more = pagination.trim_page(items, 'created_at', 'order_id', limit, cursor)
+    return {"total": total, "items": items, "next_cursor": next_cursor, "has_more": has_more}
+
+
+# ========== 工作台统计 ==========
+async def get_stats_counters(db: AsyncSession) -> Optional[Dict[str, Any]]:
+    """读取触发器维护的统计计数（异步），不可用时返回 None"""
+    try:
+        return crud.parse_stats_counters(await db.execute(crud.stats_counters_statement()))
+    except Exception:
+        await db.rollback()
+        return None
+
+
+async def _execute_in_new_session(session_factory: Callable[[], AsyncSession], statement) -> Dict[str, Any]:
+    async with session_factory() as session:
+        return dict((await session.execute(statement)).mappings().one())
+
+
+async def get_dashboard_stats(
+    db: AsyncSession,
+    session_factory: Optional[Callable[[], AsyncSession]] = None
+) -> schemas.DashboardStats:
+    """
+    获取工作台统计数据（异步）
+    优先读取统计计数表，不可用时聚合查询：
+    传入 session_factory 时各表的统计分别从连接池取连接并发执行，
+    接口耗时取决于最慢的一组而不是各组之和；否则在 db 上依次执行
+    """
+    counters = await get_stats_counters(db)
+    if counters is not None:
+        return crud.build_dashboard_stats(counters)
+
+    statements = crud.dashboard_stats_statements().values()
+    values: Dict[str, Any] = {}
+    if session_factory is not None:
+        for group in await asyncio.gather(*[
+            _execute_in_new_session(session_factory, statement) for statement in statements
+        ]):
+            values.update(group)
+    else:
+        for statement in statements:
+            values.update((await db.execute(statement)).mappings().one())
+    return crud.build_dashboard_stats(values)
@@ -1,32 +1,174 @@
-from urllib.parse import quote_plus
-from sqlalchemy import create_engine
+import re
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
+
+import settings
+
+# 数据库连接信息（见 settings.py，可通过环境变量或 .env 配置）
+DATABASE_URL = settings.DATABASE_URL
+READ_REPLICA_URL = settings.READ_REPLICA_URL
+
+
+# ========== 连接池监控 ==========
+class PoolMetrics:
+    """记录从连接池获取连接的次数、等待耗时与超时次数"""
+
+    # 等待耗时分布的区间上限（毫秒）
+    BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000)
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.buckets = [0] * (len(self.BUCKETS_MS) + 1)
+
+    def record(self, wait: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            wait_ms = wait * 1000
+            for idx, bound in enumerate(self.BUCKETS_MS):
+                if wait_ms <= bound:
+                    self.buckets[idx] += 1
+                    break
+            else:
+                self.buckets[-1] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            attempts = self.checkouts + self.timeouts
+            labels = [f"<={b}ms" for b in self.BUCKETS_MS] + [f">{self.BUCKETS_MS[-1]}ms"]
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": round(self.total_wait / attempts * 1000, 3) if attempts else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+                "wait_histogram": dict(zip(labels, self.buckets)),
+            }
+
+
+class PoolMeteringMixin:
+    """记录获取连接耗时的连接池（含等待空闲连接与新建连接的时间）"""
+
+    metrics: PoolMetrics = None
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            conn = super().connect()
+        except PoolTimeoutError:
+            self.metrics.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.metrics.record(time.perf_counter() - start)
+        return conn
+
+
+def metered_pool_class(name: str, base=QueuePool):
+    """为每个引擎生成独立计数的连接池类（连接池重建后计数保留）"""
+    return type(f"Metered{base.__name__}", (PoolMeteringMixin, base), {"metrics": PoolMetrics(name)})
+
+
+def engine_options(name: str, pool_base=QueuePool) -> Dict[str, Any]:
+    """settings 中的连接池配置（同步与异步引擎共用）"""
+    options: Dict[str, Any] = {
+        "poolclass": metered_pool_class(name, pool_base),
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+        "echo": settings.DB_ECHO,
+    }
+    if settings.DB_ISOLATION_LEVEL:
+        options["isolation_level"] = settings.DB_ISOLATION_LEVEL
+    return options
+
+
+# 连接上设置过的用户变量（登记在连接的 info 中），连接归还连接池时清除
+USER_VARIABLES_KEY = "user_variables"
+
+
+def set_user_variable(db: Session, name: str, value: Any):
+    """
+    在会话当前连接上设置 MySQL 用户变量（@name）并登记；用户变量不随事务回滚，
+    调用方未能自行清除（语句出错、连接异常）时，连接归还连接池前由 reset 事件清除
+    """
+    connection = db.connection()
+    connection.info.setdefault(USER_VARIABLES_KEY, set()).add(name)
+    connection.execute(text(f"SET @{name} = :value"), {"value": value})
+
+
+def clear_user_variable(db: Session, name: str):
+    """清除 set_user_variable 设置的用户变量"""
+    connection = db.connection()
+    connection.execute(text(f"SET @{name} = NULL"))
+    connection.info.get(USER_VARIABLES_KEY, set()).discard(name)
+
+
+def apply_session_settings(sync_engine):
+    """为新建连接设置会话参数（语句超时），并在连接归还连接池时清除登记的用户变量"""
+    if settings.DB_STATEMENT_TIMEOUT_MS > 0:
+        @event.listens_for(sync_engine, "connect")
+        def _set_statement_timeout(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f"SET SESSION max_execution_time = {int(settings.DB_STATEMENT_TIMEOUT_MS)}")
+            cursor.close()
 
-# 数据库连接信息
-DB_USER = 'root'
-DB_PASSWORD = '123456'
-DB_HOST = '127.0.0.1'
-DB_PORT = 3306
-DB_NAME = 'port_equipment_db'
+    @event.listens_for(sync_engine, "reset")
+    def _clear_user_variables(dbapi_connection, connection_record, reset_state):
+        names = connection_record.info.pop(USER_VARIABLES_KEY, None)
+        if names:
+            cursor = dbapi_connection.cursor()
+            try:
+                cursor.execute("SET " + ", ".join(f"@{name} = NULL" for name in sorted(names)))
+            finally:
+                cursor.close()
 
-# 对用户名和密码进行 URL 编码，处理特殊字符
-encoded_user = quote_plus(DB_USER)
-encoded_password = quote_plus(DB_PASSWORD)
 
-# 创建数据库连接 URL
-DATABASE_URL = f"mysql+mysqldb://{encoded_user}:{encoded_password}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# 需要输出连接池统计的引擎
+_pool_engines: Dict[str, Any] = {}
+
+
+def register_pool(name: str, target_engine):
+    """登记引擎，使其连接池状态出现在 pool_stats() 中"""
+    _pool_engines[name] = target_engine
+
+
+def _create_engine(url: str, name: str):
+    """按 settings 中的连接池与会话配置创建引擎"""
+    new_engine = create_engine(url, **engine_options(name))
+    apply_session_settings(new_engine)
+    register_pool(name, new_engine)
+    return new_engine
+
 
 # 创建引擎
-engine = create_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,
-    pool_recycle=3600,
-    echo=True  # 开发环境打印SQL，生产环境设为False
-)
+engine = _create_engine(DATABASE_URL, "primary")
+# 只读副本引擎（未配置时为 None）
+read_engine = _create_engine(READ_REPLICA_URL, "replica") if READ_REPLICA_URL else None
 
 # 创建会话
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# 只读会话：绑定只读副本，未配置副本时使用主库；禁止任何写操作
+ReadSessionLocal = sessionmaker(
+    autocommit=False, autoflush=False,
+    bind=read_engine or engine,
+    info={"read_only": True}
+)
 
 # 创建基类
 Base = declarative_base()
@@ -40,3 +182,65 @@ def get_db():
     finally:
         db.close()
 
+
+# 依赖注入：获取只读数据库会话（统计分析与列表查询）
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+# ========== 只读会话保护 ==========
+class ReadOnlySessionError(RuntimeError):
+    """在只读会话上执行了写操作"""
+
+
+_WRITE_SQL = re.compile(
+    r"^\s*(INSERT|UPDATE|DELETE|REPLACE|CREATE|ALTER|DROP|TRUNCATE|CALL|LOCK)\b",
+    re.IGNORECASE
+)
+
+
+@event.listens_for(Session, "before_flush")
+def _reject_read_only_flush(session, flush_context, instances):
+    if session.info.get("read_only") and (session.new or session.dirty or session.deleted):
+        raise ReadOnlySessionError("只读会话不允许写入数据")
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _reject_read_only_statement(orm_execute_state):
+    if not orm_execute_state.session.info.get("read_only"):
+        return
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        raise ReadOnlySessionError("只读会话不允许写入数据")
+    # 原生 SQL（text）按语句开头的关键字判断
+    if not orm_execute_state.is_select and _WRITE_SQL.match(str(orm_execute_state.statement)):
+        raise ReadOnlySessionError("只读会话不允许写入数据")
+
+
+def _pool_status(target_engine) -> Optional[Dict[str, Any]]:
+    if target_engine is None:
+        return None
+    pool = target_engine.pool
+    status = {
+        "pool_size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "timeout": settings.DB_POOL_TIMEOUT,
+    }
+    metrics = getattr(pool, "metrics", None)
+    if metrics is not None:
+        status.update(metrics.snapshot())
+    return status
+
+
+def pool_stats() -> Dict[str, Any]:
+    """各引擎（主库、只读副本、异步引擎）连接池的当前状态与累计等待统计"""
+    stats = {"primary": None, "replica": None}
+    for name, target_engine in list(_pool_engines.items()):
+        stats[name] = _pool_status(getattr(target_engine, "sync_engine", target_engine))
+    return stats
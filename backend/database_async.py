@@ -0,0 +1,50 @@
+"""
+异步数据库访问
+基于 SQLAlchemy AsyncSession 与异步 MySQL 驱动（aiomysql），供高频只读接口使用：
+请求等待数据库期间不占用线程池线程，并发上限由连接池大小（DB_POOL_SIZE + DB_MAX_OVERFLOW）决定
+连接池、语句超时与只读保护沿用 database.py 的配置
+"""
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+import settings
+from database import apply_session_settings, engine_options, register_pool
+
+
+def _create_async_engine(url: str, name: str):
+    """按 settings 中的连接池与会话配置创建异步引擎"""
+    new_engine = create_async_engine(url, **engine_options(name, AsyncAdaptedQueuePool))
+    apply_session_settings(new_engine.sync_engine)
+    register_pool(name, new_engine)
+    return new_engine
+
+
+# 创建异步引擎
+async_engine = _create_async_engine(settings.ASYNC_DATABASE_URL, "async_primary")
+# 只读副本异步引擎（未配置时为 None）
+async_read_engine = (
+    _create_async_engine(settings.ASYNC_READ_REPLICA_URL, "async_replica")
+    if settings.ASYNC_READ_REPLICA_URL else None
+)
+
+# 只读异步会话：绑定只读副本，未配置副本时使用主库；写操作由 database.py 中的只读保护拒绝
+AsyncReadSessionLocal = async_sessionmaker(
+    bind=async_read_engine or async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+    info={"read_only": True}
+)
+
+
+# 依赖注入：获取只读异步数据库会话
+async def get_async_read_db():
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+
+async def dispose_async_engines():
+    """关闭异步引擎的连接池（应用停止时调用）"""
+    await async_engine.dispose()
+    if async_read_engine is not None:
+        await async_read_engine.dispose()
@@ -0,0 +1,57 @@
+"""
+日期区间查询条件
+DATE(col) = :day、DATE_FORMAT(col, '%Y-%m') = :month 这类对列套用函数的条件无法使用索引，
+统一改写为半开区间 col >= 起点 AND col < 终点，可以走 (..., created_at) 复合索引做范围扫描
+"""
+from datetime import date, datetime, timedelta
+from typing import Tuple, Union
+
+from sqlalchemy import and_
+
+
+def day_start(day: date) -> datetime:
+    """日期当天零点"""
+    return datetime.combine(day, datetime.min.time())
+
+
+def day_range(day: date) -> Tuple[datetime, datetime]:
+    """某一天的半开区间 [当天零点, 次日零点)"""
+    return day_start(day), day_start(day + timedelta(days=1))
+
+
+def days_range(first_day: date, last_day: date) -> Tuple[datetime, datetime]:
+    """连续多天（含首尾）的半开区间 [首日零点, 末日次日零点)"""
+    return day_start(first_day), day_start(last_day + timedelta(days=1))
+
+
+def month_key(day: date) -> str:
+    """月份键 YYYY-MM"""
+    return day.strftime('%Y-%m')
+
+
+def month_range(month: Union[date, str]) -> Tuple[datetime, datetime]:
+    """某个月的半开区间 [当月1日零点, 次月1日零点)，month 为 YYYY-MM 或当月任意一天"""
+    if isinstance(month, str):
+        first = datetime.strptime(month, '%Y-%m').date()
+    else:
+        first = month.replace(day=1)
+    next_first = (first + timedelta(days=32)).replace(day=1)
+    return day_start(first), day_start(next_first)
+
+
+def on_day(column, day: date):
+    """替代 func.date(column) == day"""
+    start, end = day_range(day)
+    return and_(column >= start, column < end)
+
+
+def between_days(column, first_day: date, last_day: date):
+    """替代 func.date(column).between(first_day, last_day)"""
+    start, end = days_range(first_day, last_day)
+    return and_(column >= start, column < end)
+
+
+def in_month(column, month: Union[date, str]):
+    """替代 func.date_format(column, '%Y-%m') == month"""
+    start, end = month_range(month)
+    return and_(column >= start, column < end)
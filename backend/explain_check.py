@@ -0,0 +1,122 @@
+"""
+统计查询执行计划检查
+对统计分析使用的日期范围查询执行 EXPLAIN，确认业务大表通过索引做范围查找，而不是全表扫描
+（日期条件写法见 date_ranges.py，索引见 migrations/add_date_range_indexes.sql）
+
+MySQL：EXPLAIN 的 type 为 ALL（全表扫描）或 index（全索引扫描）视为全扫描，
+       预估行数小于 --min-rows 的表不计（数据量很小时优化器本就倾向于直接扫表）
+SQLite：EXPLAIN QUERY PLAN 中的 SCAN、以及只按 is_deleted 定位的 SEARCH 视为全扫描
+
+用法:
+    python explain_check.py                  # 输出每条查询的执行计划，存在全扫描时退出码为 1
+    python explain_check.py --min-rows 0     # 不忽略小表
+"""
+import argparse
+import sys
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Tuple
+
+from sqlalchemy.orm import Session
+
+import analytics
+import crud
+import rollups
+from database import SessionLocal
+
+# 不允许全扫描的业务表（维表如 equipment、customers 数据量小，不检查）
+CHECKED_TABLES = ("lease_orders", "order_items", "inbound_records", "return_records", "billing")
+DEFAULT_MIN_ROWS = 1000
+
+
+def date_range_queries(db: Session, today: date) -> List[Tuple[str, Any]]:
+    """待检查的查询 [(名称, Query)]，与接口、汇总刷新实际执行的查询为同一构造函数"""
+    window = analytics.date_window(today, 30)
+    queries = [
+        (f"rollups.compute_daily[{name}]", query)
+        for name, query in rollups.compute_queries(db, window).items()
+    ]
+    queries += [
+        (f"rollups.changed_days[{name}]", query)
+        for name, query in rollups.changed_days_queries(db, datetime.now() - timedelta(hours=1)).items()
+    ]
+    queries.append((
+        "crud.retention_intervals",
+        crud.retention_intervals_query(db, today - timedelta(days=11), today)
+    ))
+    queries.append((
+        "crud.equipment_rentals_on_day",
+        crud.equipment_rentals_on_day_query(db, "", today - timedelta(days=1))
+    ))
+    return queries
+
+
+def explain(db: Session, query) -> List[Dict[str, Any]]:
+    """执行 EXPLAIN，返回 [{table, access, rows, full_scan}]"""
+    dialect = db.get_bind().dialect
+    sql = str(query.statement.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+    connection = db.connection()
+
+    plan = []
+    if dialect.name == "sqlite":
+        for row in connection.exec_driver_sql("EXPLAIN QUERY PLAN " + sql).mappings():
+            words = row["detail"].split()
+            if len(words) < 2 or words[0] not in ("SCAN", "SEARCH"):
+                continue
+            plan.append({
+                "table": words[1],
+                "access": row["detail"],
+                "rows": None,
+                # 只用软删除标记定位（如日期列被 DATE() 包裹）等同于扫描全部未删除行
+                "full_scan": words[0] == "SCAN" or row["detail"].endswith("(is_deleted=?)"),
+            })
+    else:
+        for row in connection.exec_driver_sql("EXPLAIN " + sql).mappings():
+            access_type = row["type"] or ""
+            plan.append({
+                "table": row["table"],
+                "access": f"{access_type} key={row['key']}",
+                "rows": row["rows"],
+                "full_scan": access_type in ("ALL", "index"),
+            })
+    return plan
+
+
+def full_scans(plan: List[Dict[str, Any]], min_rows: int) -> List[Dict[str, Any]]:
+    """计划中不允许的全扫描"""
+    return [
+        step for step in plan
+        if step["full_scan"] and step["table"] in CHECKED_TABLES
+        and (step["rows"] is None or step["rows"] >= min_rows)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查统计查询的执行计划")
+    parser.add_argument("--min-rows", type=int, default=DEFAULT_MIN_ROWS,
+                        help=f"预估行数低于该值的全扫描不计（仅 MySQL），默认 {DEFAULT_MIN_ROWS}")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    failed = 0
+    try:
+        for name, query in date_range_queries(db, date.today()):
+            plan = explain(db, query)
+            bad = full_scans(plan, args.min_rows)
+            failed += bool(bad)
+            print(f"[{'全扫描' if bad else 'OK'}] {name}")
+            for step in plan:
+                rows = "" if step["rows"] is None else f" rows={step['rows']}"
+                print(f"    {step['table']}: {step['access']}{rows}")
+    finally:
+        db.rollback()
+        db.close()
+
+    if failed:
+        print(f"{failed} 条查询存在全扫描")
+        return 1
+    print("全部查询均通过索引查找")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
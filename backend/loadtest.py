@@ -0,0 +1,91 @@
+"""
+接口压测脚本
+以固定并发持续请求若干接口，输出每秒请求数与延迟分位数，
+用于对比同步/异步实现（分别对两个版本的服务运行本脚本）
+
+用法:
+    python loadtest.py --base-url http://127.0.0.1:8000 --concurrency 100 --duration 20
+    python loadtest.py --path /api/equipment --path /api/orders
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Dict, List
+
+import httpx
+
+# 默认压测的高频只读接口
+DEFAULT_PATHS = [
+    "/api/dashboard/stats",
+    "/api/equipment?page=1&page_size=20",
+    "/api/equipment/inventory?current=1&pageSize=20",
+    "/api/orders?page=1&page_size=20",
+]
+
+
+async def _worker(client: httpx.AsyncClient, path: str, deadline: float, latencies: List[float], errors: Dict[str, int]):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            response = await client.get(path)
+            if response.status_code != 200:
+                errors[str(response.status_code)] = errors.get(str(response.status_code), 0) + 1
+                continue
+        except httpx.HTTPError as e:
+            errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+            continue
+        latencies.append(time.perf_counter() - start)
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+async def run_path(base_url: str, path: str, concurrency: int, duration: float) -> Dict[str, float]:
+    """对单个接口以 concurrency 个并发连接压测 duration 秒"""
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        await client.get(path)  # 预热
+        latencies: List[float] = []
+        errors: Dict[str, int] = {}
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(*[
+            _worker(client, path, deadline, latencies, errors) for _ in range(concurrency)
+        ])
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": sum(errors.values()),
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "mean_ms": statistics.mean(latencies) * 1000 if latencies else 0.0,
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p95_ms": _percentile(latencies, 95) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="接口压测")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--path", action="append", dest="paths", help="压测的接口路径，可重复指定")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=20.0, help="每个接口的压测时长（秒）")
+    args = parser.parse_args()
+
+    print(f"目标: {args.base_url}  并发: {args.concurrency}  时长: {args.duration}s")
+    print(f"{'接口':<50}{'请求数':>8}{'错误':>6}{'RPS':>10}{'P50(ms)':>10}{'P95(ms)':>10}{'P99(ms)':>10}")
+    for path in args.paths or DEFAULT_PATHS:
+        result = await run_path(args.base_url, path, args.concurrency, args.duration)
+        print(f"{path:<50}{result['requests']:>8}{result['errors']:>6}{result['rps']:>10.1f}"
+              f"{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}{result['p99_ms']:>10.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,23 +1,67 @@
-from fastapi import FastAPI, Depends, HTTPException, Query, Body, File, UploadFile, Form
+from fastapi import FastAPI, Depends, HTTPException, Query, Body, File, UploadFile, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from sqlalchemy.orm import Session
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session, selectinload
 from sqlalchemy import func
 from typing import Optional, List
 from datetime import date
+import allocation
+import availability
 import crud
 import models
+import analytics
+import capabilities
+import rollups
 import schemas
-from database import engine, get_db
+import search
+import sequences
+import pagination
+import settings
+import utilization
+from sqlalchemy.ext.asyncio import AsyncSession
+from contextlib import asynccontextmanager
+import asyncio
+import crud_async
+from database import engine, get_db, get_read_db, pool_stats
+from database_async import AsyncReadSessionLocal, get_async_read_db, dispose_async_engines
+from cache import all_cache_stats
+from pagination import InvalidCursor
 
 # 创建数据库表
 models.Base.metadata.create_all(bind=engine)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用启动与停止"""
+    # 探测一次各视图是否可用，选择列表与统计的查询方式（见 capabilities.py）
+    await asyncio.to_thread(capabilities.probe)
+    # 构建设备可用性索引与预订日历，并定期与数据库核对（AVAILABILITY_RECONCILE_SECONDS 为 0 时不核对，见 availability.py）
+    await asyncio.to_thread(availability.index.rebuild)
+    await asyncio.to_thread(availability.bookings.rebuild)
+    availability_reconciler = (
+        asyncio.create_task(availability.reconcile_periodically(settings.AVAILABILITY_RECONCILE_SECONDS))
+        if settings.AVAILABILITY_RECONCILE_SECONDS > 0 else None
+    )
+    # 后台定期增量刷新每日汇总表（ROLLUP_REFRESH_SECONDS 为 0 时不启动）
+    rollup_refresher = (
+        asyncio.create_task(rollups.refresh_periodically(settings.ROLLUP_REFRESH_SECONDS))
+        if settings.ROLLUP_REFRESH_SECONDS > 0 else None
+    )
+    yield
+    if rollup_refresher is not None:
+        rollup_refresher.cancel()
+    if availability_reconciler is not None:
+        availability_reconciler.cancel()
+    await dispose_async_engines()
+
+
 # 创建 FastAPI 应用
 app = FastAPI(
     title="船舶作业装备租赁与港口仓储管理系统 API",
     description="Port Equipment Management System API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # 配置 CORS
@@ -39,6 +83,12 @@ upload_dir.mkdir(exist_ok=True)
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 
 
+@app.exception_handler(InvalidCursor)
+def invalid_cursor_handler(request: Request, exc: InvalidCursor):
+    """分页游标无法解析时返回 400"""
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+
 # ========== 根路由 ==========
 @app.get("/")
 def read_root():
@@ -51,36 +101,23 @@ def read_root():
 
 # ========== 工作台统计 ==========
 @app.get("/api/dashboard/stats", response_model=schemas.DashboardStats, tags=["Dashboard"])
-def get_dashboard_stats(db: Session = Depends(get_db)):
-    """获取工作台统计数据"""
-    return crud.get_dashboard_stats(db)
+async def get_dashboard_stats(db: AsyncSession = Depends(get_async_read_db)):
+    """获取工作台统计数据（异步，各表的统计并发执行）"""
+    session_factory = AsyncReadSessionLocal if settings.DASHBOARD_PARALLEL_QUERIES else None
+    return await crud_async.get_dashboard_stats(db, session_factory)
 
 
 @app.get("/api/content-data", tags=["Dashboard"])
-def get_content_data(db: Session = Depends(get_db)):
-    """获取租赁数据趋势图表数据（最近7天）"""
-    from datetime import timedelta
-    
-    today = date.today()
-    chart_data = []
-    
-    # 统计最近7天的租赁订单数量
-    for i in range(6, -1, -1):
-        day_date = today - timedelta(days=i)
-        
-        # 统计当天创建的租赁订单数量
-        count = db.query(func.count(models.LeaseOrder.order_id)).filter(
-            models.LeaseOrder.is_deleted == 0,
-            func.date(models.LeaseOrder.created_at) == day_date
-        ).scalar() or 0
-        
-        # 格式化日期为 MM-DD
-        date_str = day_date.strftime('%m-%d')
-        
-        chart_data.append({
-            "x": date_str,
-            "y": count
-        })
+def get_content_data(db: Session = Depends(get_read_db)):
+    """获取租赁数据趋势图表数据（最近7天，读取每日汇总）"""
+    window = analytics.date_window(date.today(), 7)
+    rows = rollups.daily_rows(db, window, ["orders"])
+    
+    # 格式化日期为 MM-DD
+    chart_data = [
+        {"x": day_date.strftime('%m-%d'), "y": count}
+        for day_date, count in zip(window, analytics.fill_series(window, rows, "orders"))
+    ]
     
     return {
         "code": 200,
@@ -92,7 +129,7 @@ def get_content_data(db: Session = Depends(get_db)):
 @app.get("/api/popular/list", tags=["Dashboard"])
 def get_popular_list(
     type: Optional[str] = Query(None, description="装备类型过滤"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """获取热门装备列表（按租赁次数统计）"""
     from datetime import timedelta
@@ -148,17 +185,7 @@ def get_popular_list(
     for idx, (equipment_name, equipment_code, category, rental_count) in enumerate(results, start=1):
         # 计算增长率（与前一天对比）
         yesterday = today - timedelta(days=1)
-        yesterday_count = db.query(func.count(models.OrderItem.item_id)).join(
-            models.Equipment,
-            models.OrderItem.equipment_id == models.Equipment.equipment_id
-        ).join(
-            models.LeaseOrder,
-            models.OrderItem.order_id == models.LeaseOrder.order_id
-        ).filter(
-            models.Equipment.equipment_name == equipment_name,
-            models.LeaseOrder.is_deleted == 0,
-            func.date(models.LeaseOrder.created_at) == yesterday
-        ).scalar() or 0
+        yesterday_count = crud.equipment_rentals_on_day_query(db, equipment_name, yesterday).scalar() or 0
         
         # 计算增长率
         if yesterday_count > 0:
@@ -199,34 +226,75 @@ def get_popular_list(
 
 # ========== 租赁分析统计 ==========
 @app.get("/api/rental/analysis", response_model=schemas.RentalAnalysisStats, tags=["Rental"])
-def get_rental_analysis(db: Session = Depends(get_db)):
+def get_rental_analysis(db: Session = Depends(get_read_db)):
     """获取租赁分析统计数据"""
     return crud.get_rental_analysis_stats(db)
 
 
 # ========== 多维数据分析统计 ==========
 @app.get("/api/multi-dimension/analysis", response_model=schemas.MultiDimensionAnalysisStats, tags=["Analysis"])
-def get_multi_dimension_analysis(db: Session = Depends(get_db)):
-    """获取多维数据分析统计数据"""
-    return crud.get_multi_dimension_analysis_stats(db)
+def get_multi_dimension_analysis(db: Session = Depends(get_read_db)):
+    """获取多维数据分析统计数据（经过分析快照缓存）"""
+    return crud.get_cached_multi_dimension_analysis_stats(db)
 
 
 @app.post("/api/data-overview", response_model=schemas.DataOverviewResponse, tags=["Analysis"])
-def get_data_overview(db: Session = Depends(get_db)):
-    """获取数据概览（兼容旧接口）"""
-    stats = crud.get_multi_dimension_analysis_stats(db)
+def get_data_overview(db: Session = Depends(get_read_db)):
+    """获取数据概览（兼容旧接口，只计算概览切片）"""
+    data_overview = crud.get_analysis_slice(db, "data_overview")
     return schemas.DataOverviewResponse(
-        xAxis=stats.data_overview.get("xAxis", []),
-        data=stats.data_overview.get("data", [])
+        xAxis=data_overview.get("xAxis", []),
+        data=data_overview.get("data", [])
     )
 
 
+# 利用率报表的最长窗口（天）
+UTILIZATION_MAX_DAYS = 3660
+
+
+@app.get("/api/analysis/utilization", tags=["Analysis"])
+def get_utilization(
+    startDate: date = Query(..., description="开始日期（含）"),
+    endDate: date = Query(..., description="结束日期（含）"),
+    groupBy: Optional[str] = Query(None, pattern=utilization.GROUP_BY_PATTERN, description="分组：category 装备类型 / location 存放位置"),
+    db: Session = Depends(get_read_db)
+):
+    """
+    [startDate, endDate] 内每天的在租设备台数、在役设备台数与利用率（%），见 utilization.py
+    无论窗口多长都只有两次查询（设备、租赁区间）
+    """
+    if endDate < startDate:
+        raise HTTPException(status_code=400, detail="结束日期不能早于开始日期")
+    if (endDate - startDate).days + 1 > UTILIZATION_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"统计窗口最长 {UTILIZATION_MAX_DAYS} 天")
+    
+    usage = utilization.utilization(db, startDate, endDate, groupBy)
+    
+    def series(item: dict) -> dict:
+        return {
+            "occupied": item["occupied"],
+            "inService": item["in_service"],
+            "rate": item["rate"],
+            "averageRate": round(sum(item["rate"]) / len(item["rate"]), 2),
+        }
+    
+    return {
+        "code": 200,
+        "message": "查询成功",
+        "data": {
+            "xAxis": [day.isoformat() for day in usage["days"]],
+            **series(usage),
+            "groups": [{"name": group["name"], **series(group)} for group in usage["groups"]],
+        }
+    }
+
+
 @app.post("/api/data-chain-growth", response_model=schemas.DataChainGrowthResponse, tags=["Analysis"])
-def get_data_chain_growth(quota: dict, db: Session = Depends(get_db)):
-    """获取数据链增长（兼容旧接口）"""
-    stats = crud.get_multi_dimension_analysis_stats(db)
+def get_data_chain_growth(quota: dict, db: Session = Depends(get_read_db)):
+    """获取数据链增长（兼容旧接口，各指标共享同一份缓存切片）"""
+    data_chain_growth = crud.get_analysis_slice(db, "data_chain_growth")
     quota_name = quota.get("quota", "") if isinstance(quota, dict) else ""
-    growth_data = stats.data_chain_growth.get(quota_name, {})
+    growth_data = data_chain_growth.get(quota_name, {})
     
     if not growth_data:
         # 返回默认数据
@@ -249,45 +317,55 @@ def get_data_chain_growth(quota: dict, db: Session = Depends(get_db)):
 
 # ========== 设备管理 API ==========
 @app.get("/api/equipment", response_model=schemas.PageResponse, tags=["Equipment"])
-def list_equipment(
+async def list_equipment(
     page: int = Query(1, ge=1),
     page_size: int = Query(10, ge=1, le=100),
     keyword: Optional[str] = None,
     category: Optional[str] = None,
     status: Optional[str] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = pagination.CURSOR_QUERY,
+    count_mode: str = pagination.COUNT_MODE_QUERY,
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    """获取设备列表"""
+    """获取设备列表（异步）"""
     skip = (page - 1) * page_size
-    result = crud.get_equipment_list(
+    result = await crud_async.get_equipment_list(
         db, skip=skip, limit=page_size,
-        keyword=keyword, category=category, status=status
+        keyword=keyword, category=category, status=status,
+        cursor=cursor,
+        count_mode=count_mode
     )
     
     return schemas.PageResponse(
         data=[schemas.Equipment.from_orm(item) for item in result["items"]],
         total=result["total"],
         page=page,
-        page_size=page_size
+        page_size=page_size,
+        next_cursor=result["next_cursor"],
+        has_more=result["has_more"]
     )
 
 
 @app.get("/api/equipment/inventory", tags=["Equipment"])
-def list_equipment_inventory(
+async def list_equipment_inventory(
     current: int = Query(1, ge=1),
     pageSize: int = Query(10, ge=1, le=100),
     keyword: Optional[str] = None,
     equipmentType: Optional[str] = None,
     status: Optional[str] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = pagination.CURSOR_QUERY,
+    count_mode: str = pagination.COUNT_MODE_QUERY,
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    """获取设备库存列表（使用视图优化）"""
+    """获取设备库存列表（使用视图优化，异步）"""
     skip = (current - 1) * pageSize
     # 使用视图优化查询，包含租赁统计信息
-    result = crud.get_equipment_list(
+    result = await crud_async.get_equipment_list(
         db, skip=skip, limit=pageSize,
         keyword=keyword, category=equipmentType, status=status,
-        use_view=True  # 启用视图优化
+        use_view=True,  # 启用视图优化
+        cursor=cursor,
+        count_mode=count_mode
     )
     
     # 转换为前端期望的格式
@@ -319,7 +397,137 @@ def list_equipment_inventory(
         "code": 200,
         "message": "success",
         "list": items,
-        "total": result["total"]
+        "total": result["total"],
+        "next_cursor": result["next_cursor"],
+        "has_more": result["has_more"]
+    }
+
+
+@app.get("/api/equipment/availability/summary", tags=["Equipment"])
+def get_equipment_availability_summary(
+    equipmentType: Optional[str] = None,
+    equipmentCode: Optional[str] = None
+):
+    """
+    各装备类型在库 / 已出库 / 维修中 / 已报废的台数，由进程内可用性索引回答，不查询数据库（见 availability.py）
+    传入 equipmentCode 时同时返回该设备的当前状态
+    """
+    items = []
+    for category, counts in availability.index.summary(equipmentType).items():
+        items.append({
+            "equipmentType": category,
+            "availableQuantity": counts[models.EquipmentStatus.IN_STOCK.name],
+            "rentedQuantity": counts[models.EquipmentStatus.OUT.name],
+            "maintenanceQuantity": counts[models.EquipmentStatus.MAINTENANCE.name],
+            "scrappedQuantity": counts[models.EquipmentStatus.SCRAPPED.name],
+            "totalQuantity": sum(counts.values())
+        })
+    
+    data = {"list": items}
+    if equipmentCode:
+        unit = availability.index.lookup(equipmentCode.strip())
+        data["equipment"] = {
+            "id": str(unit["equipment_id"]),
+            "equipmentCode": unit["equipment_code"],
+            "equipmentType": unit["category"],
+            "status": schemas.EQUIPMENT_STATUS_LABELS[models.EquipmentStatus[unit["status"]]],
+            "available": unit["status"] == models.EquipmentStatus.IN_STOCK.name
+        } if unit else None
+    
+    return {
+        "code": 200,
+        "message": "success",
+        "data": data
+    }
+
+
+# 一次可用性查询最多检查的设备台数
+AVAILABILITY_CHECK_LIMIT = 1000
+
+
+@app.get("/api/equipment/availability", tags=["Equipment"])
+def check_equipment_availability(
+    startDate: date = Query(..., description="开始日期（含）"),
+    endDate: date = Query(..., description="结束日期（含）"),
+    equipmentCodes: Optional[str] = Query(None, description="装备编号，多个以逗号分隔"),
+    equipmentType: Optional[str] = Query(None, description="装备类型：检查该类型的全部设备")
+):
+    """
+    检查多台设备在 [startDate, endDate] 内是否可租，由进程内可用性索引与预订日历回答（见 availability.py）
+    不可租的情况：期间已有未取消订单的预订、维修中、已报废，或已出库但没有今天及以后的订单（如手工出库，归还日期未知）
+    """
+    if endDate < startDate:
+        raise HTTPException(status_code=400, detail="结束日期不能早于开始日期")
+    if not equipmentCodes and not equipmentType:
+        raise HTTPException(status_code=400, detail="请指定装备编号或装备类型")
+    
+    equipment_ids = []
+    unknown_codes = []
+    for code in dict.fromkeys(code.strip() for code in (equipmentCodes or "").split(",") if code.strip()):
+        unit = availability.index.lookup(code)
+        if unit:
+            equipment_ids.append(unit["equipment_id"])
+        else:
+            unknown_codes.append(code)
+    if equipmentType:
+        for status in availability.STATUSES:
+            equipment_ids.extend(availability.index.ids(equipmentType, status))
+    equipment_ids = list(dict.fromkeys(equipment_ids))
+    if len(equipment_ids) > AVAILABILITY_CHECK_LIMIT:
+        raise HTTPException(status_code=400, detail=f"单次最多检查 {AVAILABILITY_CHECK_LIMIT} 台设备")
+    
+    today = date.today()
+    units = availability.index.units(equipment_ids)
+    conflicts = availability.bookings.conflicts(units.keys(), startDate, endDate)
+    # 已出库设备是否有今天及以后的订单：下单 / 申请时即分配并标记为出库，订单可能尚未开始；
+    # 没有时归还日期未知
+    booked = availability.bookings.conflicts(
+        [equipment_id for equipment_id, unit in units.items() if unit["status"] == models.EquipmentStatus.OUT.name],
+        today, availability.OPEN_END
+    )
+    
+    items = []
+    for equipment_id, unit in sorted(units.items()):
+        status = unit["status"]
+        unit_bookings = conflicts[equipment_id]
+        reason = None
+        if status == models.EquipmentStatus.MAINTENANCE.name:
+            reason = "维修中"
+        elif status == models.EquipmentStatus.SCRAPPED.name:
+            reason = "已报废"
+        elif unit_bookings:
+            reason = "期间已被预订"
+        elif status == models.EquipmentStatus.OUT.name and not booked.get(equipment_id):
+            reason = "已出库，未关联订单"
+        items.append({
+            "id": str(equipment_id),
+            "equipmentCode": unit["equipment_code"],
+            "equipmentType": unit["category"],
+            "status": schemas.EQUIPMENT_STATUS_LABELS[models.EquipmentStatus[status]],
+            "available": reason is None,
+            "reason": reason,
+            "bookings": [
+                {
+                    "orderId": str(order_id),
+                    "orderCode": order_code,
+                    "startDate": start.strftime("%Y-%m-%d"),
+                    "endDate": end.strftime("%Y-%m-%d") if end != availability.OPEN_END else None
+                }
+                for start, end, order_id, order_code in unit_bookings
+            ]
+        })
+    
+    return {
+        "code": 200,
+        "message": "success",
+        "data": {
+            "startDate": startDate.strftime("%Y-%m-%d"),
+            "endDate": endDate.strftime("%Y-%m-%d"),
+            "list": items,
+            "total": len(items),
+            "availableCount": sum(1 for item in items if item["available"]),
+            "unknownCodes": unknown_codes
+        }
     }
 
 
@@ -332,7 +540,9 @@ def list_equipment_inbound(
     equipmentType: Optional[str] = None,
     supplier: Optional[str] = None,
     status: Optional[str] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = pagination.CURSOR_QUERY,
+    count_mode: str = pagination.COUNT_MODE_QUERY,
+    db: Session = Depends(get_read_db)
 ):
     """获取设备入库记录列表"""
     skip = (current - 1) * pageSize
@@ -340,7 +550,9 @@ def list_equipment_inbound(
         db, skip=skip, limit=pageSize,
         keyword=equipmentCode or equipmentName, 
         category=equipmentType,
-        status=status
+        status=status,
+        cursor=cursor,
+        count_mode=count_mode
     )
     
     # 转换为前端期望的格式
@@ -370,7 +582,9 @@ def list_equipment_inbound(
         "code": 200,
         "message": "success",
         "list": items,
-        "total": result["total"]
+        "total": result["total"],
+        "next_cursor": result["next_cursor"],
+        "has_more": result["has_more"]
     }
 
 
@@ -412,47 +626,27 @@ def create_equipment_inbound(data: dict, db: Session = Depends(get_db)):
     # 使用warehouse或location作为storage_location
     storage_location = warehouse or location
     
-    # 根据quantity创建多个设备记录
-    created_equipment = []
-    for i in range(quantity):
-        # 如果没有提供equipment_code，使用None让crud.create_equipment自动生成
-        # 如果提供了equipment_code且数量大于1，为每个设备生成唯一的编号
-        if equipment_code:
-            if quantity > 1:
-                unique_code = f"{equipment_code}-{i+1:03d}"
-            else:
-                unique_code = equipment_code
-            
-            # 检查设备编号是否已存在
-            existing = db.query(models.Equipment).filter(
-                models.Equipment.equipment_code == unique_code,
-                models.Equipment.is_deleted == 0
-            ).first()
-            
-            if existing:
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"装备编号 {unique_code} 已存在"
-                )
-        else:
-            # 不提供equipment_code，让系统自动生成
-            unique_code = None
-        
-        # 创建EquipmentCreate对象
-        equipment_data = schemas.EquipmentCreate(
-            equipment_code=unique_code,
-            equipment_name=equipment_name,
-            category=category,
-            specifications=specifications,
-            storage_location=storage_location,
-            remarks=final_remarks
-        )
-        
-        result = crud.create_equipment(db, equipment_data)
-        created_equipment.append({
-            "id": result.equipment_id,
-            "equipmentCode": result.equipment_code
-        })
+    # 一次生成全部编号并用一次查询检查唯一性，设备与入库明细在同一事务中批量写入
+    codes = crud.reserve_equipment_codes(db, equipment_code, quantity)
+    if equipment_code:
+        existing_codes = crud.existing_equipment_codes(db, codes)
+        if existing_codes:
+            raise HTTPException(
+                status_code=400, 
+                detail=f"装备编号 {'、'.join(existing_codes[:10])} 已存在"
+            )
+    
+    equipment_data = schemas.EquipmentCreate(
+        equipment_name=equipment_name,
+        category=category,
+        specifications=specifications,
+        storage_location=storage_location,
+        remarks=final_remarks
+    )
+    created_equipment = [
+        {"id": item["equipment_id"], "equipmentCode": item["equipment_code"]}
+        for item in crud.create_equipment_inbound(db, equipment_data, codes, supplier=supplier or None)
+    ]
     
     return {
         "code": 200,
@@ -484,7 +678,9 @@ def list_equipment_outbound(
     equipmentCode: Optional[str] = None,
     rentalOrder: Optional[str] = None,
     status: Optional[str] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = pagination.CURSOR_QUERY,
+    count_mode: str = pagination.COUNT_MODE_QUERY,
+    db: Session = Depends(get_read_db)
 ):
     """获取设备出库记录列表"""
     skip = (current - 1) * pageSize
@@ -496,7 +692,7 @@ def list_equipment_outbound(
     
     # 搜索条件
     if outboundCode:
-        query = query.filter(models.OutboundRecord.outbound_code.contains(outboundCode))
+        query = query.filter(search.code_filter(models.OutboundRecord.outbound_code, outboundCode))
     if status:
         # 将前端的状态值转换为枚举值
         status_map = {
@@ -511,45 +707,34 @@ def list_equipment_outbound(
     if rentalOrder:
         # 使用 outerjoin 以包含所有出库记录，然后过滤匹配订单号的
         query = query.outerjoin(models.LeaseOrder).filter(
-            models.LeaseOrder.order_code.contains(rentalOrder)
+            search.code_filter(models.LeaseOrder.order_code, rentalOrder)
         )
     
-    # 如果提供了装备编号过滤，需要在查询时就过滤
+    # 如果提供了装备编号过滤，使用 EXISTS 半连接在查询时就过滤
     if equipmentCode:
-        # 先找到匹配装备编号的出库明细，获取对应的出库记录ID
-        matching_item_ids = db.query(models.OutboundItem.outbound_id).filter(
-            models.OutboundItem.equipment_code.contains(equipmentCode)
-        ).distinct().all()
-        matching_outbound_ids = [item[0] for item in matching_item_ids]
-        if matching_outbound_ids:
-            query = query.filter(models.OutboundRecord.outbound_id.in_(matching_outbound_ids))
-        else:
-            # 如果没有匹配的记录，返回空列表
-            return {
-                "code": 200,
-                "message": "success",
-                "list": [],
-                "total": 0
-            }
+        query = query.filter(
+            models.OutboundRecord.items.any(models.OutboundItem.equipment_code.contains(equipmentCode))
+        )
     
-    total = query.count()
+    total = pagination.count_query(query, ["outbound_records", "outbound_items", "lease_orders"], count_mode)
     # 按创建时间倒序排列，确保最新的记录在最前面
-    outbound_records = query.order_by(models.OutboundRecord.created_at.desc()).offset(skip).limit(pageSize).all()
+    # 整页的出库明细与关联订单各用一次 IN 查询批量加载，避免逐条查询
+    query = query.options(
+        selectinload(models.OutboundRecord.items),
+        selectinload(models.OutboundRecord.order)
+    )
+    outbound_records, next_cursor, has_more = pagination.paginate(
+        query, models.OutboundRecord.created_at, models.OutboundRecord.outbound_id,
+        skip=skip, limit=pageSize, cursor=cursor
+    )
     
     items = []
     for record in outbound_records:
-        # 获取关联的订单
-        order = None
-        if record.order_id:
-            order = db.query(models.LeaseOrder).filter(
-                    models.LeaseOrder.order_id == record.order_id,
-                    models.LeaseOrder.is_deleted == 0
-            ).first()
+        # 关联的订单（已删除的订单视为无关联）
+        order = record.order if record.order and record.order.is_deleted == 0 else None
         
-        # 获取出库明细
-        outbound_items = db.query(models.OutboundItem).filter(
-            models.OutboundItem.outbound_id == record.outbound_id
-        ).all()
+        # 出库明细
+        outbound_items = list(record.items)
         
         # 如果提供了装备编号过滤，只返回匹配的明细
         if equipmentCode:
@@ -589,10 +774,36 @@ def list_equipment_outbound(
         "code": 200,
         "message": "success",
         "list": items,
-        "total": total
+        "total": total,
+        "next_cursor": next_cursor,
+        "has_more": has_more
     }
 
 
+def _allocated_to_order(db: Session, equipment: models.Equipment, order: Optional[models.LeaseOrder]) -> bool:
+    """设备是否为出库状态且属于该订单（待提货或执行中）的明细"""
+    if order is None or equipment.status != models.EquipmentStatus.OUT:
+        return False
+    if order.status not in (models.OrderStatus.PENDING, models.OrderStatus.IN_PROGRESS):
+        return False
+    return db.query(models.OrderItem.item_id).filter(
+        models.OrderItem.order_id == order.order_id,
+        models.OrderItem.equipment_id == equipment.equipment_id
+    ).first() is not None
+
+
+def _outbound_for_order(db: Session, equipment: models.Equipment, order: models.LeaseOrder) -> bool:
+    """设备是否已有该订单的出库记录（未删除、未取消）"""
+    return db.query(models.OutboundItem.item_id).join(
+        models.OutboundRecord, models.OutboundRecord.outbound_id == models.OutboundItem.outbound_id
+    ).filter(
+        models.OutboundRecord.order_id == order.order_id,
+        models.OutboundRecord.is_deleted == 0,
+        models.OutboundRecord.status != models.OutboundStatus.CANCELLED,
+        models.OutboundItem.equipment_id == equipment.equipment_id
+    ).first() is not None
+
+
 @app.post("/api/equipment/outbound", tags=["Equipment"])
 def create_equipment_outbound(data: dict, db: Session = Depends(get_db)):
     """创建设备出库记录"""
@@ -630,11 +841,8 @@ def create_equipment_outbound(data: dict, db: Session = Depends(get_db)):
     if not equipment:
         raise HTTPException(status_code=404, detail=f"装备编号 {equipment_code} 不存在")
     
-    # 检查设备是否已在库
-    if equipment.status != models.EquipmentStatus.IN_STOCK:
-        raise HTTPException(status_code=400, detail=f"装备 {equipment_code} 当前状态为 {equipment.status.value}，无法出库")
-    
     # 查找关联的订单（如果提供了订单号）
+    order = None
     order_id = None
     if rental_order_code:
         order = db.query(models.LeaseOrder).filter(
@@ -644,22 +852,15 @@ def create_equipment_outbound(data: dict, db: Session = Depends(get_db)):
         if order:
             order_id = order.order_id
     
-    # 生成出库单号
-    max_outbound = db.query(func.max(models.OutboundRecord.outbound_id)).filter(
-        models.OutboundRecord.is_deleted == 0
-    ).scalar()
-    next_id = (max_outbound or 0) + 1
-    outbound_code = f"OUT{datetime.now().strftime('%Y%m%d')}{next_id:06d}"
+    # 检查设备是否可出库：在库，或下单 / 租赁申请时已分配给该订单（分配时已标记为出库，见 allocation.py）
+    if equipment.status != models.EquipmentStatus.IN_STOCK:
+        if not _allocated_to_order(db, equipment, order):
+            raise HTTPException(status_code=400, detail=f"装备 {equipment_code} 当前状态为 {equipment.status.value}，无法出库")
+        if _outbound_for_order(db, equipment, order):
+            raise HTTPException(status_code=400, detail=f"装备 {equipment_code} 已按订单 {order.order_code} 出库")
     
-    # 检查出库单号是否已存在
-    existing = db.query(models.OutboundRecord).filter(
-        models.OutboundRecord.outbound_code == outbound_code,
-        models.OutboundRecord.is_deleted == 0
-    ).first()
-    if existing:
-        from datetime import datetime
-        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-        outbound_code = f"OUT{timestamp}{next_id:04d}"
+    # 生成出库单号
+    outbound_code = sequences.next_code(sequences.OUTBOUND)
     
     # 解析出库时间
     outbound_date = datetime.now()
@@ -807,14 +1008,18 @@ def list_customers(
     page_size: int = Query(10, ge=1, le=100),
     keyword: Optional[str] = None,
     credit_rating: Optional[str] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = pagination.CURSOR_QUERY,
+    count_mode: str = pagination.COUNT_MODE_QUERY,
+    db: Session = Depends(get_read_db)
 ):
     """获取客户列表（使用视图优化，包含租赁统计信息）"""
     skip = (page - 1) * page_size
     # 使用视图优化查询
     result = crud.get_customer_list(
         db, skip=skip, limit=page_size, 
-        keyword=keyword, use_view=True
+        keyword=keyword, use_view=True,
+        cursor=cursor,
+        count_mode=count_mode
     )
     
     # 如果使用视图，返回包含统计信息的字典格式
@@ -823,7 +1028,9 @@ def list_customers(
             "data": result["items"],
             "total": result["total"],
             "page": page,
-            "page_size": page_size
+            "page_size": page_size,
+            "next_cursor": result["next_cursor"],
+            "has_more": result["has_more"]
         }
     else:
         # 兼容原有格式
@@ -831,7 +1038,9 @@ def list_customers(
             data=[schemas.Customer.from_orm(item) for item in result["items"]],
             total=result["total"],
             page=page,
-            page_size=page_size
+            page_size=page_size,
+            next_cursor=result["next_cursor"],
+            has_more=result["has_more"]
         )
 
 
@@ -843,20 +1052,24 @@ def create_customer(customer: schemas.CustomerCreate, db: Session = Depends(get_
 
 # ========== 租赁订单 API ==========
 @app.get("/api/orders", response_model=schemas.PageResponse, tags=["Order"])
-def list_orders(
+async def list_orders(
     page: int = Query(1, ge=1),
     page_size: int = Query(10, ge=1, le=100),
     status: Optional[str] = None,
     keyword: Optional[str] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = pagination.CURSOR_QUERY,
+    count_mode: str = pagination.COUNT_MODE_QUERY,
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    """获取订单列表（使用视图优化，包含客户、账单、归还等关联信息）"""
+    """获取订单列表（使用视图优化，包含客户、账单、归还等关联信息，异步）"""
     skip = (page - 1) * page_size
     # 使用视图优化查询
-    result = crud.get_order_list(
+    result = await crud_async.get_order_list(
         db, skip=skip, limit=page_size,
         status=status, keyword=keyword,
-        use_view=True  # 启用视图优化
+        use_view=True,  # 启用视图优化
+        cursor=cursor,
+        count_mode=count_mode
     )
     
     # 如果使用视图，需要转换为ORM对象格式
@@ -896,7 +1109,9 @@ def list_orders(
             "data": items,
             "total": result["total"],
             "page": page,
-            "page_size": page_size
+            "page_size": page_size,
+            "next_cursor": result["next_cursor"],
+            "has_more": result["has_more"]
         }
     else:
         # 兼容原有格式
@@ -904,7 +1119,9 @@ def list_orders(
             data=[schemas.LeaseOrder.from_orm(item) for item in result["items"]],
             total=result["total"],
             page=page,
-            page_size=page_size
+            page_size=page_size,
+            next_cursor=result["next_cursor"],
+            has_more=result["has_more"]
         )
 
 
@@ -917,10 +1134,50 @@ def get_order(order_id: int, db: Session = Depends(get_db)):
     return order
 
 
+def _allocate_order_units(db: Session, orders: List[schemas.LeaseOrderCreate]):
+    """
+    订单明细指定的设备经 allocation.allocate_batch 分配并标记为出库（与租赁申请一致），须在事务中的其他写入之前调用；
+    设备不存在、不在库（含同一设备在明细中重复出现）时回滚并返回 400，与并发分配冲突时返回 409
+    """
+    items = [item for order in orders for item in order.order_items]
+    requests = allocation.order_requests(db, orders)
+    unknown = [str(request["equipment_id"]) for request in requests if request["category"] is None]
+    if unknown:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"设备 {', '.join(dict.fromkeys(unknown))} 不存在")
+    try:
+        results = allocation.allocate_batch(db, requests)
+    except allocation.AllocationConflict:
+        raise HTTPException(status_code=409, detail="设备正被其他订单分配，请重试")
+    unavailable = [item.equipment_code for item, result in zip(items, results) if not result["equipment"]]
+    if unavailable:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"设备 {', '.join(dict.fromkeys(unavailable))} 当前不在库，无法下单")
+
+
 @app.post("/api/orders", response_model=schemas.LeaseOrder, tags=["Order"])
 def create_order(order: schemas.LeaseOrderCreate, db: Session = Depends(get_db)):
-    """创建租赁订单"""
-    return crud.create_order(db, order)
+    """创建租赁订单，明细中的设备在同一事务中分配并标记为出库"""
+    # 订单编号须在事务中的第一条写入之前分配
+    order_code = sequences.next_code(sequences.ORDER)
+    _allocate_order_units(db, [order])
+    return crud.create_order(db, order, order_code=order_code)
+
+
+@app.post("/api/orders/batch", tags=["Order"])
+def create_orders_batch(batch: schemas.LeaseOrderBatchCreate, db: Session = Depends(get_db)):
+    """
+    批量创建租赁订单（如整船包租），全部订单在一个事务中写入；
+    各订单明细中的设备在同一事务中分配，任一设备不可分配时整批不创建
+    """
+    codes = sequences.next_codes(sequences.ORDER, len(batch.orders))
+    _allocate_order_units(db, batch.orders)
+    created = crud.create_orders_batch(db, batch.orders, codes=codes)
+    return {
+        "code": 200,
+        "message": f"订单创建成功，共 {len(created)} 个",
+        "data": created
+    }
 
 
 @app.put("/api/orders/{order_id}", response_model=schemas.LeaseOrder, tags=["Order"])
@@ -943,20 +1200,26 @@ def list_billing(
     page_size: int = Query(10, ge=1, le=100),
     status: Optional[str] = None,
     keyword: Optional[str] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = pagination.CURSOR_QUERY,
+    count_mode: str = pagination.COUNT_MODE_QUERY,
+    db: Session = Depends(get_read_db)
 ):
     """获取账单列表"""
     skip = (page - 1) * page_size
     result = crud.get_billing_list(
         db, skip=skip, limit=page_size,
-        status=status, keyword=keyword
+        status=status, keyword=keyword,
+        cursor=cursor,
+        count_mode=count_mode
     )
     
     return schemas.PageResponse(
         data=[schemas.Billing.from_orm(item) for item in result["items"]],
         total=result["total"],
         page=page,
-        page_size=page_size
+        page_size=page_size,
+        next_cursor=result["next_cursor"],
+        has_more=result["has_more"]
     )
 
 
@@ -979,6 +1242,48 @@ def update_billing(
     return updated
 
 
+# ========== 搜索 API ==========
+@app.get("/api/search", tags=["Search"])
+def search_all(
+    q: str = Query(..., min_length=1, max_length=100, description="关键词"),
+    types: Optional[str] = Query(None, description="搜索范围，逗号分隔：equipment,customers,orders,billing，默认全部"),
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_read_db)
+):
+    """跨装备、客户、订单、账单的关键词搜索，按相关度排序"""
+    entity_types = [t.strip() for t in types.split(",") if t.strip()] if types else None
+    unknown = [t for t in entity_types or [] if t not in search.SEARCH_ENTITIES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"不支持的搜索范围: {', '.join(unknown)}")
+    items = search.search(db, q, entity_types, limit)
+    return {
+        "code": 200,
+        "message": "success",
+        "data": {
+            "backend": search.current_backend(),
+            "items": items,
+            "total": len(items)
+        }
+    }
+
+
+@app.get("/api/typeahead/{source}", tags=["Search"])
+def typeahead_codes(
+    source: str,
+    q: str = Query(..., min_length=1, max_length=50, description="已输入的编号开头（或名称片段）"),
+    limit: int = Query(10, ge=1, le=search.TYPEAHEAD_MAX_LIMIT),
+    db: Session = Depends(get_read_db)
+):
+    """编号选择器联想：source 为 equipment / order / outbound / return"""
+    if source not in search.TYPEAHEAD_SOURCES:
+        raise HTTPException(status_code=404, detail=f"不支持的联想类型: {source}")
+    return {
+        "code": 200,
+        "message": "success",
+        "data": search.typeahead(db, source, q, limit)
+    }
+
+
 # ========== 租赁申请 API ==========
 @app.get("/api/rental/application", response_model=dict, tags=["Rental"])
 def list_rental_applications(
@@ -987,7 +1292,9 @@ def list_rental_applications(
     applicationCode: Optional[str] = None,
     applicant: Optional[str] = None,
     status: Optional[str] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = pagination.CURSOR_QUERY,
+    count_mode: str = pagination.COUNT_MODE_QUERY,
+    db: Session = Depends(get_read_db)
 ):
     """获取租赁申请列表（实际映射到订单）"""
     skip = (current - 1) * pageSize
@@ -995,7 +1302,7 @@ def list_rental_applications(
     query = db.query(models.LeaseOrder).filter(models.LeaseOrder.is_deleted == 0)
     
     if applicationCode:
-        query = query.filter(models.LeaseOrder.order_code.contains(applicationCode))
+        query = query.filter(search.code_filter(models.LeaseOrder.order_code, applicationCode))
     if applicant:
         query = query.filter(models.LeaseOrder.customer_name.contains(applicant))
     if status:
@@ -1006,14 +1313,21 @@ def list_rental_applications(
         }
         query = query.filter(models.LeaseOrder.status == status_map.get(status, status))
     
-    total = query.count()
-    items_db = query.order_by(models.LeaseOrder.created_at.desc()).offset(skip).limit(pageSize).all()
+    total = pagination.count_query(query, ["lease_orders"], count_mode)
+    items_db, next_cursor, has_more = pagination.paginate(
+        query, models.LeaseOrder.created_at, models.LeaseOrder.order_id,
+        skip=skip, limit=pageSize, cursor=cursor
+    )
+    
+    # 批量加载整页订单的明细
+    order_items_map = crud.prefetch_order_items(db, [order.order_id for order in items_db])
     
     items = []
     for order in items_db:
         # 获取订单中的设备信息
-        equipment_codes = [item.equipment_code for item in order.order_items]
-        equipment_type = order.order_items[0].equipment_name if order.order_items else ""
+        order_items = order_items_map.get(order.order_id, [])
+        equipment_codes = [item.equipment_code for item in order_items]
+        equipment_type = order_items[0].equipment_name if order_items else ""
         
         status_map_reverse = {
             "待提货": "pending",
@@ -1028,7 +1342,7 @@ def list_rental_applications(
             "applicant": order.customer_name,
             "equipmentType": equipment_type,
             "equipmentCode": ", ".join(equipment_codes[:3]),
-            "quantity": len(order.order_items),
+            "quantity": len(order_items),
             "startDate": order.start_date.strftime("%Y-%m-%d"),
             "endDate": order.expected_return_date.strftime("%Y-%m-%d") if order.expected_return_date else "",
             "purpose": order.remarks or "",
@@ -1041,14 +1355,19 @@ def list_rental_applications(
         "code": 200,
         "message": "success",
         "list": items,
-        "total": total
+        "total": total,
+        "next_cursor": next_cursor,
+        "has_more": has_more
     }
 
 
-@app.post("/api/rental/application", tags=["Rental"])
-def create_rental_application(data: dict, db: Session = Depends(get_db)):
-    """创建租赁申请（实际创建订单）"""
-    from datetime import datetime, date
+# 单次批量申请的最大条数
+RENTAL_APPLICATION_BATCH_LIMIT = 200
+
+
+def _parse_rental_application(data: dict) -> dict:
+    """校验并解析租赁申请字段，字段有误时抛出 400"""
+    from datetime import datetime
     
     # 从前端获取数据
     applicant_name = data.get("applicant", "").strip()
@@ -1058,7 +1377,6 @@ def create_rental_application(data: dict, db: Session = Depends(get_db)):
     end_date_str = data.get("endDate")
     purpose = data.get("purpose", "").strip()
     remark = data.get("remark", "").strip()
-    equipment_type = data.get("equipmentType", "").strip()
     
     # 验证必填字段
     if not applicant_name:
@@ -1088,10 +1406,60 @@ def create_rental_application(data: dict, db: Session = Depends(get_db)):
     if start_date >= end_date:
         raise HTTPException(status_code=400, detail="结束日期必须晚于开始日期")
     
-    # 计算租赁天数
-    rental_days = (end_date - start_date).days + 1
+    # 构建备注（包含用途）
+    remarks_parts = []
+    if purpose:
+        remarks_parts.append(f"用途: {purpose}")
+    if remark:
+        remarks_parts.append(f"备注: {remark}")
+    
+    return {
+        "applicant": applicant_name,
+        "equipment_code": equipment_code,
+        "quantity": quantity,
+        "start_date": start_date,
+        "end_date": end_date,
+        # 计算租赁天数
+        "rental_days": (end_date - start_date).days + 1,
+        "remarks": "\n".join(remarks_parts) if remarks_parts else None
+    }
+
+
+def _rental_allocation_request(application: dict, equipment: Optional[models.Equipment]) -> dict:
+    """
+    申请对应的分配请求：数量为 1 时分配申请的装备本身，
+    数量大于 1 时按该装备的类型分配多台在库设备
+    """
+    equipment_code = application["equipment_code"]
+    if not equipment:
+        raise HTTPException(status_code=404, detail=f"装备编号 {equipment_code} 不存在")
+    
+    # 检查设备是否可用
+    if equipment.status != models.EquipmentStatus.IN_STOCK:
+        raise HTTPException(status_code=400, detail=f"装备 {equipment_code} 当前状态为 {equipment.status.value}，无法租赁")
+    
+    quantity = application["quantity"]
+    return {
+        "category": equipment.category,
+        "quantity": quantity,
+        "equipment_id": equipment.equipment_id if quantity == 1 else None,
+        "daily_rate": equipment.daily_rental_rate or 0.0
+    }
+
+
+def _rental_allocation_failure(application: dict, result: dict) -> str:
+    """可分配数量不足时的提示"""
+    if application["quantity"] == 1:
+        return f"装备 {application['equipment_code']} 已被其他申请占用"
+    return f"可用设备数量不足，需要 {result['requested']} 个，但只有 {result['available']} 个"
+
+
+def _find_or_create_customer(db: Session, applicant_name: str, customers: dict) -> models.Customer:
+    """按名称查找客户，不存在时创建；customers 缓存本次请求中已查找的客户"""
+    customer = customers.get(applicant_name)
+    if customer:
+        return customer
     
-    # 查找或创建客户
     customer = db.query(models.Customer).filter(
         models.Customer.customer_name == applicant_name,
         models.Customer.is_deleted == 0
@@ -1106,86 +1474,64 @@ def create_rental_application(data: dict, db: Session = Depends(get_db)):
         db.add(customer)
         db.flush()
     
+    customers[applicant_name] = customer
+    return customer
+
+
+def _rental_order(application: dict, request: dict, result: dict, customer: models.Customer) -> schemas.LeaseOrderCreate:
+    """由申请与分配到的设备构建订单"""
+    order_items = [
+        schemas.OrderItemCreate(
+            equipment_id=eq.equipment_id,
+            equipment_code=eq.equipment_code,
+            equipment_name=eq.equipment_name,
+            daily_rate=eq.daily_rental_rate or request["daily_rate"],
+            rental_days=application["rental_days"]
+        )
+        for eq in result["equipment"]
+    ]
+    return schemas.LeaseOrderCreate(
+        customer_id=customer.customer_id,
+        customer_name=customer.customer_name,
+        start_date=application["start_date"],
+        expected_return_date=application["end_date"],
+        remarks=application["remarks"],
+        order_items=order_items,
+        created_by=application["applicant"]
+    )
+
+
+@app.post("/api/rental/application", tags=["Rental"])
+def create_rental_application(data: dict, db: Session = Depends(get_db)):
+    """
+    创建租赁申请（实际创建订单）
+    设备由 allocation.allocate_batch 在一条 SELECT ... FOR UPDATE SKIP LOCKED 中选出并标记为出库，
+    并发申请不会分到同一台设备
+    """
+    application = _parse_rental_application(data)
+    
     # 查找设备（根据装备编号）
     equipment = db.query(models.Equipment).filter(
-        models.Equipment.equipment_code == equipment_code,
+        models.Equipment.equipment_code == application["equipment_code"],
         models.Equipment.is_deleted == 0
     ).first()
+    request = _rental_allocation_request(application, equipment)
     
-    if not equipment:
-        raise HTTPException(status_code=404, detail=f"装备编号 {equipment_code} 不存在")
-    
-    # 检查设备是否可用
-    if equipment.status != models.EquipmentStatus.IN_STOCK:
-        raise HTTPException(status_code=400, detail=f"装备 {equipment_code} 当前状态为 {equipment.status.value}，无法租赁")
-    
-    # 检查库存数量
-    if quantity > 1:
-        # 如果数量大于1，需要检查是否有足够的设备
-        available_count = db.query(models.Equipment).filter(
-            models.Equipment.equipment_code == equipment_code,
-            models.Equipment.status == models.EquipmentStatus.IN_STOCK,
-            models.Equipment.is_deleted == 0
-        ).count()
-        if available_count < quantity:
-            raise HTTPException(status_code=400, detail=f"装备 {equipment_code} 可用数量不足，当前可用: {available_count}")
-    
-    # 构建订单明细
-    order_items = []
-    daily_rate = equipment.daily_rental_rate or 0.0
-    
-    # 如果数量大于1，需要查找多个相同类型的设备
-    if quantity > 1:
-        # 根据装备类型查找多个可用设备
-        equipment_type = equipment.category
-        available_equipments = db.query(models.Equipment).filter(
-            models.Equipment.category == equipment_type,
-            models.Equipment.status == models.EquipmentStatus.IN_STOCK,
-            models.Equipment.is_deleted == 0
-        ).limit(quantity).all()
-        
-        if len(available_equipments) < quantity:
-            raise HTTPException(status_code=400, detail=f"可用设备数量不足，需要 {quantity} 个，但只有 {len(available_equipments)} 个")
-        
-        for eq in available_equipments:
-            order_items.append(schemas.OrderItemCreate(
-                equipment_id=eq.equipment_id,
-                equipment_code=eq.equipment_code,
-                equipment_name=eq.equipment_name,
-                daily_rate=eq.daily_rental_rate or daily_rate,
-                rental_days=rental_days
-            ))
-    else:
-        # 单个设备
-        order_items.append(schemas.OrderItemCreate(
-            equipment_id=equipment.equipment_id,
-            equipment_code=equipment.equipment_code,
-            equipment_name=equipment.equipment_name,
-            daily_rate=daily_rate,
-            rental_days=rental_days
-        ))
-    
-    # 构建备注（包含用途）
-    remarks_parts = []
-    if purpose:
-        remarks_parts.append(f"用途: {purpose}")
-    if remark:
-        remarks_parts.append(f"备注: {remark}")
-    final_remarks = "\n".join(remarks_parts) if remarks_parts else None
+    # 订单编号须在事务中的第一条写入之前分配
+    order_code = sequences.next_code(sequences.ORDER)
+    try:
+        result = allocation.allocate_batch(db, [request])[0]
+    except allocation.AllocationConflict:
+        raise HTTPException(status_code=409, detail="设备正被其他申请分配，请重试")
+    if not result["equipment"]:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=_rental_allocation_failure(application, result))
     
-    # 创建订单
-    order_data = schemas.LeaseOrderCreate(
-        customer_id=customer.customer_id,
-        customer_name=customer.customer_name,
-        start_date=start_date,
-        expected_return_date=end_date,
-        remarks=final_remarks,
-        order_items=order_items,
-        created_by=applicant_name
-    )
+    customer = _find_or_create_customer(db, application["applicant"], {})
+    order_data = _rental_order(application, request, result, customer)
     
     # 调用CRUD函数创建订单
-    created_order = crud.create_order(db, order_data)
+    created_order = crud.create_order(db, order_data, order_code=order_code)
     
     return {
         "code": 200,
@@ -1197,6 +1543,91 @@ def create_rental_application(data: dict, db: Session = Depends(get_db)):
     }
 
 
+@app.post("/api/rental/application/batch", tags=["Rental"])
+def create_rental_applications_batch(data: dict, db: Session = Depends(get_db)):
+    """
+    批量创建租赁申请（一个事务）
+    请求体 {"applications": [申请, ...]}，每个申请的字段与单个创建相同。
+    各申请的设备在同一事务中依次分配，字段有误或可用设备不足的申请不创建订单、不影响其他申请；
+    返回每个申请的结果，顺序与 applications 一致
+    """
+    applications = data.get("applications") or []
+    if not applications:
+        raise HTTPException(status_code=400, detail="申请列表不能为空")
+    if len(applications) > RENTAL_APPLICATION_BATCH_LIMIT:
+        raise HTTPException(status_code=400, detail=f"单次最多提交 {RENTAL_APPLICATION_BATCH_LIMIT} 个申请")
+    
+    results: List[Optional[dict]] = [None] * len(applications)
+    parsed = []
+    for index, raw in enumerate(applications):
+        try:
+            parsed.append((index, _parse_rental_application(raw)))
+        except HTTPException as e:
+            results[index] = {"index": index, "success": False, "message": e.detail}
+    
+    # 一次查出全部申请的装备
+    equipment_codes = list({application["equipment_code"] for _, application in parsed})
+    equipment_map = {
+        eq.equipment_code: eq
+        for eq in db.query(models.Equipment).filter(
+            models.Equipment.equipment_code.in_(equipment_codes),
+            models.Equipment.is_deleted == 0
+        ).all()
+    } if equipment_codes else {}
+    
+    pending = []
+    for index, application in parsed:
+        try:
+            request = _rental_allocation_request(application, equipment_map.get(application["equipment_code"]))
+        except HTTPException as e:
+            results[index] = {"index": index, "success": False, "message": e.detail}
+            continue
+        pending.append((index, application, request))
+    
+    created = []
+    if pending:
+        # 订单编号须在事务中的第一条写入之前分配（分配失败的申请留下空号）
+        order_codes = sequences.next_codes(sequences.ORDER, len(pending))
+        try:
+            allocations = allocation.allocate_batch(db, [request for _, _, request in pending])
+        except allocation.AllocationConflict:
+            raise HTTPException(status_code=409, detail="设备正被其他申请分配，请重试")
+        
+        customers = {}
+        orders, accepted = [], []
+        for (index, application, request), result, order_code in zip(pending, allocations, order_codes):
+            if not result["equipment"]:
+                results[index] = {"index": index, "success": False, "message": _rental_allocation_failure(application, result)}
+                continue
+            customer = _find_or_create_customer(db, application["applicant"], customers)
+            orders.append(_rental_order(application, request, result, customer))
+            accepted.append((index, order_code, result))
+        
+        if orders:
+            created = crud.create_orders_batch(db, orders, codes=[order_code for _, order_code, _ in accepted])
+        else:
+            db.rollback()
+        for (index, _, result), order in zip(accepted, created):
+            results[index] = {
+                "index": index,
+                "success": True,
+                "id": str(order["order_id"]),
+                "applicationCode": order["order_code"],
+                "equipmentCodes": [eq.equipment_code for eq in result["equipment"]],
+                "totalAmount": order["total_amount"]
+            }
+    
+    return {
+        "code": 200,
+        "message": f"创建 {len(created)} 个申请，失败 {len(applications) - len(created)} 个",
+        "data": {
+            "results": results,
+            "created": len(created),
+            "failed": len(applications) - len(created)
+        }
+    }
+
+
 @app.post("/api/rental/application/{application_id}/approve", tags=["Rental"])
 def approve_rental_application(application_id: str, db: Session = Depends(get_db)):
     """审批通过租赁申请"""
@@ -1216,12 +1647,13 @@ def approve_rental_application(application_id: str, db: Session = Depends(get_db
 
 @app.post("/api/rental/application/{application_id}/reject", tags=["Rental"])
 def reject_rental_application(application_id: str, db: Session = Depends(get_db)):
-    """拒绝租赁申请"""
+    """拒绝租赁申请（申请时分配的设备放回在库）"""
     order = db.query(models.LeaseOrder).filter(
         models.LeaseOrder.order_id == int(application_id)
     ).first()
     
     if order:
+        allocation.release_order(db, order)
         order.status = models.OrderStatus.CANCELLED
         db.commit()
     
@@ -1238,7 +1670,9 @@ def list_rental_voyages(
     pageSize: int = Query(10, ge=1, le=100),
     voyageNumber: Optional[str] = None,
     status: Optional[str] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = pagination.CURSOR_QUERY,
+    count_mode: str = pagination.COUNT_MODE_QUERY,
+    db: Session = Depends(get_read_db)
 ):
     """获取航次列表（映射到租赁订单）"""
     skip = (current - 1) * pageSize
@@ -1257,12 +1691,19 @@ def list_rental_voyages(
         }
         query = query.filter(models.LeaseOrder.status == status_map.get(status, status))
     
-    total = query.count()
-    items_db = query.order_by(models.LeaseOrder.created_at.desc()).offset(skip).limit(pageSize).all()
+    total = pagination.count_query(query, ["lease_orders"], count_mode)
+    items_db, next_cursor, has_more = pagination.paginate(
+        query, models.LeaseOrder.created_at, models.LeaseOrder.order_id,
+        skip=skip, limit=pageSize, cursor=cursor
+    )
+    
+    # 批量加载整页订单的明细
+    order_items_map = crud.prefetch_order_items(db, [order.order_id for order in items_db])
     
     items = []
     for order in items_db:
-        equipment_list = ", ".join([item.equipment_name for item in order.order_items])
+        order_items = order_items_map.get(order.order_id, [])
+        equipment_list = ", ".join([item.equipment_name for item in order_items])
         
         status_map_reverse = {
             "航次执行中": "in-progress",
@@ -1275,7 +1716,7 @@ def list_rental_voyages(
             "rentalOrder": order.order_code,
             "vesselName": order.customer_name,
             "equipmentList": equipment_list,
-            "usageHours": order.order_items[0].rental_days * 24 if order.order_items else 0,
+            "usageHours": order_items[0].rental_days * 24 if order_items else 0,
             "voyageDate": order.start_date.strftime("%Y-%m-%d"),
             "status": status_map_reverse.get(order.status, "in-progress"),
             "remark": order.remarks
@@ -1285,7 +1726,9 @@ def list_rental_voyages(
         "code": 200,
         "message": "success",
         "list": items,
-        "total": total
+        "total": total,
+        "next_cursor": next_cursor,
+        "has_more": has_more
     }
 
 
@@ -1382,7 +1825,9 @@ def list_rental_returns(
     rentalOrder: Optional[str] = None,
     equipmentCode: Optional[str] = None,
     inspectionStatus: Optional[str] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = pagination.CURSOR_QUERY,
+    count_mode: str = pagination.COUNT_MODE_QUERY,
+    db: Session = Depends(get_read_db)
 ):
     """获取归还记录列表"""
     skip = (current - 1) * pageSize
@@ -1390,7 +1835,7 @@ def list_rental_returns(
     query = db.query(models.ReturnRecord)
     
     if returnCode:
-        query = query.filter(models.ReturnRecord.return_code.contains(returnCode))
+        query = query.filter(search.code_filter(models.ReturnRecord.return_code, returnCode))
     if inspectionStatus:
         status_map = {
             "pending": "待质检",
@@ -1402,7 +1847,7 @@ def list_rental_returns(
     # 如果提供了订单号，需要关联查询
     if rentalOrder:
         query = query.join(models.LeaseOrder).filter(
-            models.LeaseOrder.order_code.contains(rentalOrder),
+            search.code_filter(models.LeaseOrder.order_code, rentalOrder),
             models.LeaseOrder.is_deleted == 0
         )
     
@@ -1412,19 +1857,22 @@ def list_rental_returns(
             models.ReturnItem.equipment_code.contains(equipmentCode)
         )
     
-    total = query.count()
-    items_db = query.order_by(models.ReturnRecord.created_at.desc()).offset(skip).limit(pageSize).all()
+    total = pagination.count_query(query, ["return_records", "lease_orders", "return_items"], count_mode)
+    items_db, next_cursor, has_more = pagination.paginate(
+        query, models.ReturnRecord.created_at, models.ReturnRecord.return_id,
+        skip=skip, limit=pageSize, cursor=cursor
+    )
+    
+    # 批量加载整页的关联订单与归还明细
+    orders = crud.prefetch_orders(db, [ret.order_id for ret in items_db], include_deleted=True)
+    return_items_map = crud.prefetch_return_items(db, [ret.return_id for ret in items_db])
     
     items = []
     for ret in items_db:
-        order = db.query(models.LeaseOrder).filter(
-            models.LeaseOrder.order_id == ret.order_id
-        ).first()
+        order = orders.get(ret.order_id)
         
         # 获取归还明细
-        return_items = db.query(models.ReturnItem).filter(
-            models.ReturnItem.return_id == ret.return_id
-        ).all()
+        return_items = return_items_map.get(ret.return_id, [])
         
         status_map_reverse = {
             "待质检": "pending",
@@ -1478,7 +1926,9 @@ def list_rental_returns(
         "code": 200,
         "message": "success",
         "list": items,
-        "total": total
+        "total": total,
+        "next_cursor": next_cursor,
+        "has_more": has_more
     }
 
 
@@ -1701,7 +2151,9 @@ def list_settlement_fees(
     rentalOrder: Optional[str] = None,
     applicant: Optional[str] = None,
     status: Optional[str] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = pagination.CURSOR_QUERY,
+    count_mode: str = pagination.COUNT_MODE_QUERY,
+    db: Session = Depends(get_read_db)
 ):
     """获取费用结算列表（映射到账单）"""
     skip = (current - 1) * pageSize
@@ -1709,7 +2161,7 @@ def list_settlement_fees(
     query = db.query(models.Billing).filter(models.Billing.is_deleted == 0)
     
     if settlementCode:
-        query = query.filter(models.Billing.bill_code.contains(settlementCode))
+        query = query.filter(search.code_filter(models.Billing.bill_code, settlementCode))
     if applicant:
         query = query.filter(models.Billing.customer_name.contains(applicant))
     if status:
@@ -1723,23 +2175,28 @@ def list_settlement_fees(
     # 如果提供了订单号，需要关联查询
     if rentalOrder:
         query = query.join(models.LeaseOrder).filter(
-            models.LeaseOrder.order_code.contains(rentalOrder),
+            search.code_filter(models.LeaseOrder.order_code, rentalOrder),
             models.LeaseOrder.is_deleted == 0
         )
     
-    total = query.count()
-    items_db = query.order_by(models.Billing.created_at.desc()).offset(skip).limit(pageSize).all()
+    total = pagination.count_query(query, ["billing", "lease_orders"], count_mode)
+    items_db, next_cursor, has_more = pagination.paginate(
+        query, models.Billing.created_at, models.Billing.bill_id,
+        skip=skip, limit=pageSize, cursor=cursor
+    )
+    
+    # 批量加载整页的关联订单及其明细
+    orders = crud.prefetch_orders(db, [bill.order_id for bill in items_db])
+    order_items_map = crud.prefetch_order_items(db, orders.keys())
     
     items = []
     for bill in items_db:
-        order = db.query(models.LeaseOrder).filter(
-            models.LeaseOrder.order_id == bill.order_id,
-            models.LeaseOrder.is_deleted == 0
-        ).first()
+        order = orders.get(bill.order_id)
         
         rental_days = 0
-        if order and order.order_items:
-            rental_days = order.order_items[0].rental_days
+        order_items = order_items_map.get(bill.order_id, []) if order else []
+        if order_items:
+            rental_days = order_items[0].rental_days
         
         status_map_reverse = {
             "待确认": "pending",
@@ -1779,7 +2236,9 @@ def list_settlement_fees(
         "code": 200,
         "message": "success",
         "list": items,
-        "total": total
+        "total": total,
+        "next_cursor": next_cursor,
+        "has_more": has_more
     }
 
 
@@ -1867,21 +2326,8 @@ def create_settlement_fee(data: dict, db: Session = Depends(get_db)):
     }
     payment_method = payment_method_map.get(payment_method_str, models.PaymentMethod.TRANSFER)
     
-    # 生成账单编号
-    max_bill = db.query(func.max(models.Billing.bill_id)).filter(
-        models.Billing.is_deleted == 0
-    ).scalar()
-    next_id = (max_bill or 0) + 1
-    bill_code = f"BILL{datetime.now().strftime('%Y%m%d')}{next_id:06d}"
-    
-    # 检查账单编号是否已存在
-    existing_code = db.query(models.Billing).filter(
-        models.Billing.bill_code == bill_code,
-        models.Billing.is_deleted == 0
-    ).first()
-    if existing_code:
-        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-        bill_code = f"BILL{timestamp}{next_id:04d}"
+    # 生成账单编号（连续编号，随本事务提交）
+    bill_code = sequences.next_code(sequences.BILL, db)
     
     # 计算总金额（如果前端没有提供，则根据各项费用计算）
     if total_amount == 0:
@@ -2234,7 +2680,9 @@ def list_trigger_logs(
     trigger_name: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = pagination.CURSOR_QUERY,
+    count_mode: str = pagination.COUNT_MODE_QUERY,
+    db: Session = Depends(get_read_db)
 ):
     """获取触发器日志列表"""
     return crud.get_trigger_logs(
@@ -2244,7 +2692,9 @@ def list_trigger_logs(
         log_type=log_type,
         trigger_name=trigger_name,
         start_date=start_date,
-        end_date=end_date
+        end_date=end_date,
+        cursor=cursor,
+        count_mode=count_mode
     )
 
 
@@ -2263,11 +2713,71 @@ def create_trigger_log(log_data: schemas.TriggerLogCreate, db: Session = Depends
     return crud.create_trigger_log(db, log_data)
 
 
+# ========== 缓存统计 ==========
+@app.get("/api/cache/stats", tags=["System"])
+def get_cache_stats():
+    """获取进程内缓存的命中/未命中统计"""
+    return {
+        "code": 200,
+        "message": "success",
+        "data": all_cache_stats()
+    }
+
+
+@app.get("/api/system/pool", tags=["System"])
+def get_pool_stats():
+    """获取数据库连接池状态与获取连接的等待统计（用于调整连接池大小）"""
+    return {
+        "code": 200,
+        "message": "success",
+        "data": pool_stats()
+    }
+
+
+@app.get("/api/system/availability", tags=["System"])
+def get_availability_freshness():
+    """
+    设备可用性索引的新鲜度：构建 / 核对时间、增量更新次数、是否过期、最近一次核对的偏差台数；
+    bookings 为预订日历的构建时间、待刷新订单数与增量刷新次数
+    """
+    return {
+        "code": 200,
+        "message": "success",
+        "data": {**availability.index.freshness(), "bookings": availability.bookings.freshness()}
+    }
+
+
+@app.post("/api/system/availability/reconcile", tags=["System"])
+def reconcile_availability():
+    """立即与数据库核对设备可用性索引并重建预订日历（批量导入或手工修改设备、订单后调用），返回修正的设备台数"""
+    drift = availability.index.reconcile()
+    availability.bookings.rebuild()
+    return {
+        "code": 200,
+        "message": "success",
+        "data": {"drift": drift, **availability.index.freshness(), "bookings": availability.bookings.freshness()}
+    }
+
+
+@app.post("/api/system/capabilities/refresh", tags=["System"])
+def refresh_capabilities():
+    """重新探测视图与物化表，更新列表与统计的查询方式（新建或修复视图后调用）"""
+    return {
+        "code": 200,
+        "message": "success",
+        "data": capabilities.probe()
+    }
+
+
 # ========== 健康检查 ==========
 @app.get("/health", tags=["System"])
 def health_check():
-    """健康检查"""
-    return {"status": "healthy", "service": "Port Equipment Management System"}
+    """健康检查（capabilities 为各查询当前使用的方式与不可用的视图）"""
+    return {
+        "status": "healthy",
+        "service": "Port Equipment Management System",
+        "capabilities": capabilities.snapshot()
+    }
 
 
 if __name__ == "__main__":
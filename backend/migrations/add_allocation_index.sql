@@ -0,0 +1,12 @@
+-- ============================================================
+-- 设备分配索引（见 allocation.py）
+-- 租赁申请按类型分配在库设备：
+--   SELECT ... WHERE is_deleted = 0 AND category = ? AND status = ?
+--   ORDER BY equipment_id LIMIT N FOR UPDATE SKIP LOCKED
+-- 没有该索引时 InnoDB 需扫描并锁定整张设备表的记录，并发申请互相阻塞；
+-- 等值列在前、主键在后的复合索引按主键顺序读取，只锁定选中的 N 行
+-- ============================================================
+
+USE port_equipment_db;
+
+ALTER TABLE equipment ADD INDEX idx_equipment_allocation (is_deleted, category, status, equipment_id);
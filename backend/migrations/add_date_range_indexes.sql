@@ -0,0 +1,20 @@
+-- ============================================================
+-- 日期范围查询复合索引
+-- 统计查询的日期条件统一写成半开区间 created_at >= ? AND created_at < ?
+-- （见 date_ranges.py），等值列在前、日期列在后的复合索引可以直接做范围扫描：
+--   (is_deleted, created_at, 主键)          已由 add_keyset_indexes.sql 创建
+--   (is_deleted, status, created_at, 主键)  按状态 + 日期范围查询、按状态筛选的列表分页
+--   return_records (return_date)            归还记录按归还日期统计
+--   order_items (order_id)                  按订单取明细；MySQL 已为外键隐式建有同列索引，
+--                                           显式创建后由该索引替代，便于在执行计划中识别
+--
+-- 执行后可运行 python explain_check.py 确认统计查询不再全表扫描
+-- ============================================================
+
+USE port_equipment_db;
+
+ALTER TABLE equipment ADD INDEX idx_equipment_status_keyset (is_deleted, status, created_at, equipment_id);
+ALTER TABLE lease_orders ADD INDEX idx_lease_orders_status_keyset (is_deleted, status, created_at, order_id);
+ALTER TABLE billing ADD INDEX idx_billing_status_keyset (is_deleted, status, created_at, bill_id);
+ALTER TABLE return_records ADD INDEX idx_return_records_return_date (return_date);
+ALTER TABLE order_items ADD INDEX idx_order_items_order_id (order_id);
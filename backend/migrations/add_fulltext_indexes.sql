@@ -0,0 +1,29 @@
+-- ============================================================
+-- 关键词搜索全文索引（ngram 分词）
+-- 列表接口的 keyword 与 /api/search 在 SEARCH_BACKEND=fulltext 时改用
+-- MATCH(列) AGAINST ('"关键词"' IN BOOLEAN MODE)，不再以 LIKE '%关键词%' 全表扫描
+--
+-- 说明：
+-- 1. 每个匹配列单独建索引，MATCH 可以按接口需要任意组合列（见 search.py）
+-- 2. ngram_token_size 使用默认值 2（只读参数，需在 my.cnf 中配置并重启），
+--    与 search.NGRAM_SIZE 保持一致；单个字符的关键词由应用回退为 LIKE
+-- 3. ngram 分词会丢弃包含停用词的词元，默认英文停用词表会导致含 a、i 等字母的编号无法命中，
+--    建索引前在本会话关闭停用词
+-- ============================================================
+
+USE port_equipment_db;
+
+SET SESSION innodb_ft_enable_stopword = 0;
+
+ALTER TABLE equipment ADD FULLTEXT INDEX ft_equipment_code (equipment_code) WITH PARSER ngram;
+ALTER TABLE equipment ADD FULLTEXT INDEX ft_equipment_name (equipment_name) WITH PARSER ngram;
+
+ALTER TABLE customers ADD FULLTEXT INDEX ft_customers_name (customer_name) WITH PARSER ngram;
+ALTER TABLE customers ADD FULLTEXT INDEX ft_customers_contact (contact_person) WITH PARSER ngram;
+
+ALTER TABLE lease_orders ADD FULLTEXT INDEX ft_lease_orders_code (order_code) WITH PARSER ngram;
+ALTER TABLE lease_orders ADD FULLTEXT INDEX ft_lease_orders_customer (customer_name) WITH PARSER ngram;
+ALTER TABLE lease_orders ADD FULLTEXT INDEX ft_lease_orders_voyage (voyage_no) WITH PARSER ngram;
+
+ALTER TABLE billing ADD FULLTEXT INDEX ft_billing_code (bill_code) WITH PARSER ngram;
+ALTER TABLE billing ADD FULLTEXT INDEX ft_billing_customer (customer_name) WITH PARSER ngram;
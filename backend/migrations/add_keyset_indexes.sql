@@ -0,0 +1,17 @@
+-- ============================================================
+-- 列表分页复合索引
+-- 列表按 created_at DESC, 主键 DESC 排序，游标分页使用
+-- WHERE (created_at, 主键) < (?, ?) 定位下一页，
+-- 以下索引让排序与定位都走索引，不再随页码加深而变慢
+-- ============================================================
+
+USE port_equipment_db;
+
+ALTER TABLE equipment ADD INDEX idx_equipment_keyset (is_deleted, created_at, equipment_id);
+ALTER TABLE customers ADD INDEX idx_customers_keyset (is_deleted, created_at, customer_id);
+ALTER TABLE lease_orders ADD INDEX idx_lease_orders_keyset (is_deleted, created_at, order_id);
+ALTER TABLE billing ADD INDEX idx_billing_keyset (is_deleted, created_at, bill_id);
+ALTER TABLE return_records ADD INDEX idx_return_records_keyset (created_at, return_id);
+ALTER TABLE trigger_logs ADD INDEX idx_trigger_logs_keyset (created_at, id);
+ALTER TABLE inbound_records ADD INDEX idx_inbound_records_keyset (is_deleted, created_at, inbound_id);
+ALTER TABLE outbound_records ADD INDEX idx_outbound_records_keyset (is_deleted, created_at, outbound_id);
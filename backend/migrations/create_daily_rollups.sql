@@ -0,0 +1,40 @@
+-- ============================================================
+-- 每日汇总表
+-- 统计分析接口的按日 / 按月序列改为读取 daily_stats，
+-- 不再对业务表执行 DATE(created_at) 分组扫描
+--
+-- 执行后运行回填，之后由服务内的后台任务增量刷新：
+--     python rollups.py backfill
+-- ============================================================
+
+USE port_equipment_db;
+
+CREATE TABLE IF NOT EXISTS daily_stats (
+    stat_date DATE NOT NULL PRIMARY KEY COMMENT '统计日期',
+    orders INT NOT NULL DEFAULT 0 COMMENT '当日创建的订单数',
+    order_items INT NOT NULL DEFAULT 0 COMMENT '当日订单的明细数',
+    rental_days INT NOT NULL DEFAULT 0 COMMENT '当日订单明细的租赁天数之和',
+    order_amount DOUBLE NOT NULL DEFAULT 0 COMMENT '当日订单金额之和',
+    active_customers INT NOT NULL DEFAULT 0 COMMENT '当日下单的客户数（去重）',
+    inbound_count INT NOT NULL DEFAULT 0 COMMENT '当日入库单数',
+    return_count INT NOT NULL DEFAULT 0 COMMENT '当日归还记录数（按归还日期）',
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='每日汇总';
+
+CREATE TABLE IF NOT EXISTS daily_active_customers (
+    stat_date DATE NOT NULL,
+    customer_id INT NOT NULL,
+    PRIMARY KEY (stat_date, customer_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='每日下单客户';
+
+CREATE TABLE IF NOT EXISTS rollup_watermarks (
+    name VARCHAR(64) NOT NULL PRIMARY KEY,
+    watermark DATETIME NOT NULL COMMENT '上次刷新开始的时间',
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='汇总表刷新水位';
+
+-- 增量刷新按修改时间查找需要重算的日期
+ALTER TABLE lease_orders ADD INDEX idx_lease_orders_updated_at (updated_at);
+ALTER TABLE order_items ADD INDEX idx_order_items_created_at (created_at);
+ALTER TABLE inbound_records ADD INDEX idx_inbound_records_updated_at (updated_at);
+ALTER TABLE return_records ADD INDEX idx_return_records_updated_at (updated_at);
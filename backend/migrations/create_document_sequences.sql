@@ -0,0 +1,35 @@
+-- ============================================================
+-- 单据编号序列（见 sequences.py）
+-- 设备、入库单、出库单、订单、账单、归还单的编号统一从本表分配序号，每种单据一行，
+-- 不再使用 max(id)+1 加重复检查或精确到秒的时间戳，并发写入不会在编号唯一索引上冲突
+-- 序列从业务表当前最大ID + 1 开始，新编号不会与旧编号重复；
+-- 未执行本脚本时，服务在首次取号时按同样规则自动初始化
+-- ============================================================
+
+USE port_equipment_db;
+
+CREATE TABLE IF NOT EXISTS document_sequences (
+    name VARCHAR(50) NOT NULL PRIMARY KEY COMMENT '序列名（单据类型）',
+    next_value BIGINT NOT NULL DEFAULT 1 COMMENT '下一个未分配的序号',
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='单据编号序列';
+
+INSERT IGNORE INTO document_sequences (name, next_value)
+SELECT 'equipment', COALESCE(MAX(equipment_id), 0) + 1 FROM equipment;
+
+INSERT IGNORE INTO document_sequences (name, next_value)
+SELECT 'inbound', COALESCE(MAX(inbound_id), 0) + 1 FROM inbound_records;
+
+INSERT IGNORE INTO document_sequences (name, next_value)
+SELECT 'outbound', COALESCE(MAX(outbound_id), 0) + 1 FROM outbound_records;
+
+INSERT IGNORE INTO document_sequences (name, next_value)
+SELECT 'order', COALESCE(MAX(order_id), 0) + 1 FROM lease_orders;
+
+INSERT IGNORE INTO document_sequences (name, next_value)
+SELECT 'bill', COALESCE(MAX(bill_id), 0) + 1 FROM billing;
+
+INSERT IGNORE INTO document_sequences (name, next_value)
+SELECT 'return', COALESCE(MAX(return_id), 0) + 1 FROM return_records;
+
+SELECT name, next_value FROM document_sequences;
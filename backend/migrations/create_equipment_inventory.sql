@@ -0,0 +1,188 @@
+-- ============================================================
+-- 设备库存物化表（修复版 - 不使用DELIMITER）
+-- 设备库存列表不再读取 v_equipment_inventory（每次请求对全部 order_items
+-- 关联 lease_orders 分组聚合，统计总数时再聚合一次），而是读取 equipment_inventory：
+-- 每台设备一行，由以下触发器在写入时增量维护
+--   设备新增 / 状态变化        更新该设备的在库、出库、维修数量
+--   订单明细新增 / 修改 / 删除  重算所涉及设备的租赁次数、天数、收入
+--   订单删除标记变化            重算该订单所有明细设备的租赁统计
+-- 租赁次数按订单去重（COUNT DISTINCT），无法按增量累加，触发器只重算受影响设备的行，
+-- 走 order_items 的 equipment_id 索引
+--
+-- 状态列存储的是枚举名称（IN_STOCK、OUT、MAINTENANCE，与 ORM 一致）
+-- 执行后运行一次全量刷新，刷新完成后设备库存列表才会改为读取物化表：
+--     python summaries.py refresh
+-- 与视图核对: python summaries.py verify
+-- 需要 MySQL 5.7.2 及以上（同一表同一时机允许多个触发器）
+-- ============================================================
+
+USE port_equipment_db;
+
+CREATE TABLE IF NOT EXISTS equipment_inventory (
+    equipment_id INT NOT NULL PRIMARY KEY COMMENT '设备ID',
+    available_quantity INT NOT NULL DEFAULT 0 COMMENT '在库数量',
+    rented_quantity INT NOT NULL DEFAULT 0 COMMENT '出库数量',
+    maintenance_quantity INT NOT NULL DEFAULT 0 COMMENT '维修数量',
+    rental_count INT NOT NULL DEFAULT 0 COMMENT '租赁次数（未删除订单数，去重）',
+    total_rental_days INT NOT NULL DEFAULT 0 COMMENT '累计租赁天数',
+    total_revenue DOUBLE NOT NULL DEFAULT 0 COMMENT '累计租赁收入',
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='设备库存统计';
+
+-- 刷新状态记录在 rollup_watermarks（与每日汇总共用，见 create_daily_rollups.sql）
+CREATE TABLE IF NOT EXISTS rollup_watermarks (
+    name VARCHAR(64) NOT NULL PRIMARY KEY,
+    watermark DATETIME NOT NULL COMMENT '上次刷新开始的时间',
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='汇总表刷新水位';
+
+DROP TRIGGER IF EXISTS trg_inventory_equipment_insert;
+DROP TRIGGER IF EXISTS trg_inventory_equipment_update;
+DROP TRIGGER IF EXISTS trg_inventory_equipment_delete;
+DROP TRIGGER IF EXISTS trg_inventory_item_insert;
+DROP TRIGGER IF EXISTS trg_inventory_item_update;
+DROP TRIGGER IF EXISTS trg_inventory_item_delete;
+DROP TRIGGER IF EXISTS trg_inventory_order_update;
+
+-- ============================================================
+-- 1. 设备：在库 / 出库 / 维修数量
+-- 订单、出入库、质检触发器对设备状态的修改同样会触发这里
+-- ============================================================
+CREATE TRIGGER trg_inventory_equipment_insert
+AFTER INSERT ON equipment
+FOR EACH ROW
+BEGIN
+    INSERT INTO equipment_inventory (equipment_id, available_quantity, rented_quantity, maintenance_quantity)
+    VALUES (
+        NEW.equipment_id,
+        NEW.status <=> 'IN_STOCK',
+        NEW.status <=> 'OUT',
+        NEW.status <=> 'MAINTENANCE'
+    )
+    ON DUPLICATE KEY UPDATE
+        available_quantity = VALUES(available_quantity),
+        rented_quantity = VALUES(rented_quantity),
+        maintenance_quantity = VALUES(maintenance_quantity);
+END;
+
+CREATE TRIGGER trg_inventory_equipment_update
+AFTER UPDATE ON equipment
+FOR EACH ROW
+BEGIN
+    IF NOT (OLD.status <=> NEW.status) THEN
+        UPDATE equipment_inventory
+        SET available_quantity = (NEW.status <=> 'IN_STOCK'),
+            rented_quantity = (NEW.status <=> 'OUT'),
+            maintenance_quantity = (NEW.status <=> 'MAINTENANCE')
+        WHERE equipment_id = NEW.equipment_id;
+    END IF;
+END;
+
+CREATE TRIGGER trg_inventory_equipment_delete
+AFTER DELETE ON equipment
+FOR EACH ROW
+BEGIN
+    DELETE FROM equipment_inventory WHERE equipment_id = OLD.equipment_id;
+END;
+
+-- ============================================================
+-- 2. 订单明细：重算所涉及设备的租赁统计
+-- ============================================================
+-- 批量创建订单时（@order_items_batch 非空）跳过，由订单行更新按订单重算（见触发器 3）
+CREATE TRIGGER trg_inventory_item_insert
+AFTER INSERT ON order_items
+FOR EACH ROW
+BEGIN
+    IF @order_items_batch IS NULL THEN
+        UPDATE equipment_inventory ei
+        LEFT JOIN (
+            SELECT oi.equipment_id,
+                   COUNT(DISTINCT oi.order_id) AS rental_count,
+                   SUM(oi.rental_days) AS total_rental_days,
+                   SUM(oi.subtotal) AS total_revenue
+            FROM order_items oi
+            JOIN lease_orders lo ON oi.order_id = lo.order_id
+            WHERE oi.equipment_id = NEW.equipment_id AND lo.is_deleted = 0
+            GROUP BY oi.equipment_id
+        ) s ON s.equipment_id = ei.equipment_id
+        SET ei.rental_count = COALESCE(s.rental_count, 0),
+            ei.total_rental_days = COALESCE(s.total_rental_days, 0),
+            ei.total_revenue = COALESCE(s.total_revenue, 0)
+        WHERE ei.equipment_id = NEW.equipment_id;
+    END IF;
+END;
+
+CREATE TRIGGER trg_inventory_item_update
+AFTER UPDATE ON order_items
+FOR EACH ROW
+BEGIN
+    IF NOT (OLD.equipment_id <=> NEW.equipment_id AND OLD.order_id <=> NEW.order_id
+            AND OLD.rental_days <=> NEW.rental_days AND OLD.subtotal <=> NEW.subtotal) THEN
+        UPDATE equipment_inventory ei
+        LEFT JOIN (
+            SELECT oi.equipment_id,
+                   COUNT(DISTINCT oi.order_id) AS rental_count,
+                   SUM(oi.rental_days) AS total_rental_days,
+                   SUM(oi.subtotal) AS total_revenue
+            FROM order_items oi
+            JOIN lease_orders lo ON oi.order_id = lo.order_id
+            WHERE oi.equipment_id IN (OLD.equipment_id, NEW.equipment_id) AND lo.is_deleted = 0
+            GROUP BY oi.equipment_id
+        ) s ON s.equipment_id = ei.equipment_id
+        SET ei.rental_count = COALESCE(s.rental_count, 0),
+            ei.total_rental_days = COALESCE(s.total_rental_days, 0),
+            ei.total_revenue = COALESCE(s.total_revenue, 0)
+        WHERE ei.equipment_id IN (OLD.equipment_id, NEW.equipment_id);
+    END IF;
+END;
+
+CREATE TRIGGER trg_inventory_item_delete
+AFTER DELETE ON order_items
+FOR EACH ROW
+BEGIN
+    UPDATE equipment_inventory ei
+    LEFT JOIN (
+        SELECT oi.equipment_id,
+               COUNT(DISTINCT oi.order_id) AS rental_count,
+               SUM(oi.rental_days) AS total_rental_days,
+               SUM(oi.subtotal) AS total_revenue
+        FROM order_items oi
+        JOIN lease_orders lo ON oi.order_id = lo.order_id
+        WHERE oi.equipment_id = OLD.equipment_id AND lo.is_deleted = 0
+        GROUP BY oi.equipment_id
+    ) s ON s.equipment_id = ei.equipment_id
+    SET ei.rental_count = COALESCE(s.rental_count, 0),
+        ei.total_rental_days = COALESCE(s.total_rental_days, 0),
+        ei.total_revenue = COALESCE(s.total_revenue, 0)
+    WHERE ei.equipment_id = OLD.equipment_id;
+END;
+
+-- ============================================================
+-- 3. 订单删除标记变化：重算该订单所有明细设备的租赁统计
+-- 批量创建订单时明细插入后的订单行更新同样在这里按订单重算一次
+-- ============================================================
+CREATE TRIGGER trg_inventory_order_update
+AFTER UPDATE ON lease_orders
+FOR EACH ROW
+BEGIN
+    IF NOT (OLD.is_deleted <=> NEW.is_deleted) OR @order_items_batch IS NOT NULL THEN
+        UPDATE equipment_inventory ei
+        JOIN (
+            SELECT DISTINCT equipment_id FROM order_items WHERE order_id = NEW.order_id
+        ) changed ON changed.equipment_id = ei.equipment_id
+        LEFT JOIN (
+            SELECT oi.equipment_id,
+                   COUNT(DISTINCT oi.order_id) AS rental_count,
+                   SUM(oi.rental_days) AS total_rental_days,
+                   SUM(oi.subtotal) AS total_revenue
+            FROM order_items oi
+            JOIN lease_orders lo ON oi.order_id = lo.order_id
+            WHERE lo.is_deleted = 0
+              AND oi.equipment_id IN (SELECT equipment_id FROM order_items WHERE order_id = NEW.order_id)
+            GROUP BY oi.equipment_id
+        ) s ON s.equipment_id = ei.equipment_id
+        SET ei.rental_count = COALESCE(s.rental_count, 0),
+            ei.total_rental_days = COALESCE(s.total_rental_days, 0),
+            ei.total_revenue = COALESCE(s.total_revenue, 0);
+    END IF;
+END;
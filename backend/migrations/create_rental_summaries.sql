@@ -0,0 +1,257 @@
+-- ============================================================
+-- 客户租赁统计与账单明细统计物化表（修复版 - 不使用DELIMITER）
+-- 客户列表不再读取 v_customer_rental_stats（按 total_rental_amount 排序时
+-- 需要先对全部客户的订单、账单、明细分组聚合才能返回第一页），
+-- 财务列表不再读取 v_billing_summary 中对全部 order_items 的分组子查询：
+--   customer_rental_stats  每个客户一行，(total_rental_amount, customer_id) 索引按排序键直接取页
+--   billing_summary        每张账单一行，保存所属订单的明细数与租赁天数；
+--                          财务列表按 billing 的 (is_deleted, [status,] created_at, bill_id) 索引取页
+-- 两张表由以下触发器在写入时增量维护，只重算受影响的客户 / 订单：
+--   客户新增 / 删除                      新增 / 删除统计行
+--   订单新增 / 修改 / 删除               重算订单所属客户（客户变更时新旧客户都重算）
+--   账单、订单明细新增 / 修改 / 删除     重算所属订单的账单明细统计与客户统计
+--
+-- 状态列存储的是枚举名称（COMPLETED、PENDING 等，与 ORM 一致）
+-- 执行后运行一次全量刷新，刷新完成后客户 / 财务列表才会改为读取物化表：
+--     python summaries.py refresh
+-- 与视图核对: python summaries.py verify
+-- 需要 MySQL 5.7.2 及以上（同一表同一时机允许多个触发器）
+-- ============================================================
+
+USE port_equipment_db;
+
+CREATE TABLE IF NOT EXISTS customer_rental_stats (
+    customer_id INT NOT NULL PRIMARY KEY COMMENT '客户ID',
+    total_orders INT NOT NULL DEFAULT 0 COMMENT '订单数（未删除）',
+    completed_orders INT NOT NULL DEFAULT 0 COMMENT '已完结订单数',
+    in_progress_orders INT NOT NULL DEFAULT 0 COMMENT '航次执行中订单数',
+    pending_orders INT NOT NULL DEFAULT 0 COMMENT '待提货订单数',
+    total_rental_amount DOUBLE NOT NULL DEFAULT 0 COMMENT '订单金额合计',
+    paid_amount DOUBLE NOT NULL DEFAULT 0 COMMENT '已支付金额合计',
+    pending_amount DOUBLE NOT NULL DEFAULT 0 COMMENT '待确认 / 已确认账单金额合计',
+    total_equipment_count INT NOT NULL DEFAULT 0 COMMENT '订单明细数合计',
+    last_order_date DATETIME NULL COMMENT '最近下单时间',
+    last_order_code VARCHAR(50) NULL COMMENT '最大订单编号',
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX idx_customer_rental_stats_amount (total_rental_amount, customer_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='客户租赁统计';
+
+CREATE TABLE IF NOT EXISTS billing_summary (
+    bill_id INT NOT NULL PRIMARY KEY COMMENT '账单ID',
+    order_id INT NOT NULL COMMENT '所属订单ID',
+    equipment_count INT NOT NULL DEFAULT 0 COMMENT '订单明细数',
+    total_rental_days INT NOT NULL DEFAULT 0 COMMENT '订单明细租赁天数合计',
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX ix_billing_summary_order_id (order_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='账单明细统计';
+
+-- 刷新状态记录在 rollup_watermarks（与每日汇总共用，见 create_daily_rollups.sql）
+CREATE TABLE IF NOT EXISTS rollup_watermarks (
+    name VARCHAR(64) NOT NULL PRIMARY KEY,
+    watermark DATETIME NOT NULL COMMENT '上次刷新开始的时间',
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='汇总表刷新水位';
+
+DROP TRIGGER IF EXISTS trg_summary_customer_insert;
+DROP TRIGGER IF EXISTS trg_summary_customer_delete;
+DROP TRIGGER IF EXISTS trg_summary_order_insert;
+DROP TRIGGER IF EXISTS trg_summary_order_update;
+DROP TRIGGER IF EXISTS trg_summary_order_delete;
+DROP TRIGGER IF EXISTS trg_summary_billing_insert;
+DROP TRIGGER IF EXISTS trg_summary_billing_update;
+DROP TRIGGER IF EXISTS trg_summary_billing_delete;
+DROP TRIGGER IF EXISTS trg_summary_item_insert;
+DROP TRIGGER IF EXISTS trg_summary_item_update;
+DROP TRIGGER IF EXISTS trg_summary_item_delete;
+DROP PROCEDURE IF EXISTS sp_refresh_customer_rental_stats;
+DROP PROCEDURE IF EXISTS sp_refresh_order_summaries;
+
+-- ============================================================
+-- 1. 重算过程
+-- 口径与 v_customer_rental_stats / v_billing_summary 一致，只聚合指定客户 / 订单的行
+-- ============================================================
+CREATE PROCEDURE sp_refresh_customer_rental_stats(IN p_customer_id INT)
+BEGIN
+    UPDATE customer_rental_stats s
+    LEFT JOIN (
+        SELECT
+            lo.customer_id,
+            COUNT(DISTINCT lo.order_id) AS total_orders,
+            SUM(CASE WHEN lo.status = 'COMPLETED' THEN 1 ELSE 0 END) AS completed_orders,
+            SUM(CASE WHEN lo.status = 'IN_PROGRESS' THEN 1 ELSE 0 END) AS in_progress_orders,
+            SUM(CASE WHEN lo.status = 'PENDING' THEN 1 ELSE 0 END) AS pending_orders,
+            SUM(lo.total_amount) AS total_rental_amount,
+            SUM(COALESCE(b.paid_amount, 0)) AS paid_amount,
+            SUM(CASE
+                WHEN b.status IN ('PENDING', 'CONFIRMED') THEN COALESCE(b.total_amount, 0)
+                ELSE 0
+            END) AS pending_amount,
+            SUM(oi_stats.equipment_count) AS total_equipment_count,
+            MAX(lo.created_at) AS last_order_date,
+            MAX(lo.order_code) AS last_order_code
+        FROM lease_orders lo
+        LEFT JOIN billing b ON lo.order_id = b.order_id AND b.is_deleted = 0
+        LEFT JOIN (
+            SELECT oi.order_id, COUNT(*) AS equipment_count
+            FROM order_items oi
+            JOIN lease_orders o ON oi.order_id = o.order_id
+            WHERE o.customer_id = p_customer_id
+            GROUP BY oi.order_id
+        ) oi_stats ON lo.order_id = oi_stats.order_id
+        WHERE lo.is_deleted = 0 AND lo.customer_id = p_customer_id
+        GROUP BY lo.customer_id
+    ) t ON t.customer_id = s.customer_id
+    SET s.total_orders = COALESCE(t.total_orders, 0),
+        s.completed_orders = COALESCE(t.completed_orders, 0),
+        s.in_progress_orders = COALESCE(t.in_progress_orders, 0),
+        s.pending_orders = COALESCE(t.pending_orders, 0),
+        s.total_rental_amount = COALESCE(t.total_rental_amount, 0),
+        s.paid_amount = COALESCE(t.paid_amount, 0),
+        s.pending_amount = COALESCE(t.pending_amount, 0),
+        s.total_equipment_count = COALESCE(t.total_equipment_count, 0),
+        s.last_order_date = t.last_order_date,
+        s.last_order_code = t.last_order_code
+    WHERE s.customer_id = p_customer_id;
+END;
+
+-- 订单的明细、账单变化：重算该订单全部账单的明细统计，以及订单所属客户的统计
+CREATE PROCEDURE sp_refresh_order_summaries(IN p_order_id INT)
+BEGIN
+    DECLARE v_customer_id INT DEFAULT NULL;
+
+    UPDATE billing_summary bs
+    LEFT JOIN (
+        SELECT order_id, COUNT(*) AS equipment_count, SUM(rental_days) AS total_rental_days
+        FROM order_items
+        WHERE order_id = p_order_id
+        GROUP BY order_id
+    ) item_stats ON item_stats.order_id = bs.order_id
+    SET bs.equipment_count = COALESCE(item_stats.equipment_count, 0),
+        bs.total_rental_days = COALESCE(item_stats.total_rental_days, 0)
+    WHERE bs.order_id = p_order_id;
+
+    SELECT customer_id INTO v_customer_id FROM lease_orders WHERE order_id = p_order_id;
+    IF v_customer_id IS NOT NULL THEN
+        CALL sp_refresh_customer_rental_stats(v_customer_id);
+    END IF;
+END;
+
+-- ============================================================
+-- 2. 客户：新增 / 删除统计行（新客户没有订单，统计为 0）
+-- ============================================================
+CREATE TRIGGER trg_summary_customer_insert
+AFTER INSERT ON customers
+FOR EACH ROW
+BEGIN
+    INSERT INTO customer_rental_stats (customer_id) VALUES (NEW.customer_id)
+    ON DUPLICATE KEY UPDATE customer_id = customer_id;
+END;
+
+CREATE TRIGGER trg_summary_customer_delete
+AFTER DELETE ON customers
+FOR EACH ROW
+BEGIN
+    DELETE FROM customer_rental_stats WHERE customer_id = OLD.customer_id;
+END;
+
+-- ============================================================
+-- 3. 订单：重算所属客户
+-- 订单明细触发器对订单金额的修改同样会触发这里
+-- ============================================================
+CREATE TRIGGER trg_summary_order_insert
+AFTER INSERT ON lease_orders
+FOR EACH ROW
+BEGIN
+    CALL sp_refresh_customer_rental_stats(NEW.customer_id);
+END;
+
+CREATE TRIGGER trg_summary_order_update
+AFTER UPDATE ON lease_orders
+FOR EACH ROW
+BEGIN
+    IF @order_items_batch IS NOT NULL THEN
+        -- 批量创建订单：补做明细插入时跳过的重算（含所属客户）
+        CALL sp_refresh_order_summaries(NEW.order_id);
+    ELSEIF NOT (OLD.customer_id <=> NEW.customer_id AND OLD.status <=> NEW.status
+            AND OLD.total_amount <=> NEW.total_amount AND OLD.is_deleted <=> NEW.is_deleted
+            AND OLD.order_code <=> NEW.order_code AND OLD.created_at <=> NEW.created_at) THEN
+        CALL sp_refresh_customer_rental_stats(NEW.customer_id);
+        IF NOT (OLD.customer_id <=> NEW.customer_id) THEN
+            CALL sp_refresh_customer_rental_stats(OLD.customer_id);
+        END IF;
+    END IF;
+END;
+
+CREATE TRIGGER trg_summary_order_delete
+AFTER DELETE ON lease_orders
+FOR EACH ROW
+BEGIN
+    CALL sp_refresh_customer_rental_stats(OLD.customer_id);
+END;
+
+-- ============================================================
+-- 4. 账单：维护账单明细统计行，重算所属订单的客户
+-- ============================================================
+CREATE TRIGGER trg_summary_billing_insert
+AFTER INSERT ON billing
+FOR EACH ROW
+BEGIN
+    INSERT INTO billing_summary (bill_id, order_id) VALUES (NEW.bill_id, NEW.order_id)
+    ON DUPLICATE KEY UPDATE order_id = VALUES(order_id);
+    CALL sp_refresh_order_summaries(NEW.order_id);
+END;
+
+CREATE TRIGGER trg_summary_billing_update
+AFTER UPDATE ON billing
+FOR EACH ROW
+BEGIN
+    IF NOT (OLD.order_id <=> NEW.order_id) THEN
+        UPDATE billing_summary SET order_id = NEW.order_id WHERE bill_id = NEW.bill_id;
+        CALL sp_refresh_order_summaries(OLD.order_id);
+    END IF;
+    IF NOT (OLD.order_id <=> NEW.order_id AND OLD.status <=> NEW.status
+            AND OLD.total_amount <=> NEW.total_amount AND OLD.paid_amount <=> NEW.paid_amount
+            AND OLD.is_deleted <=> NEW.is_deleted) THEN
+        CALL sp_refresh_order_summaries(NEW.order_id);
+    END IF;
+END;
+
+CREATE TRIGGER trg_summary_billing_delete
+AFTER DELETE ON billing
+FOR EACH ROW
+BEGIN
+    DELETE FROM billing_summary WHERE bill_id = OLD.bill_id;
+    CALL sp_refresh_order_summaries(OLD.order_id);
+END;
+
+-- ============================================================
+-- 5. 订单明细：重算所属订单的账单明细统计与客户统计
+-- ============================================================
+CREATE TRIGGER trg_summary_item_insert
+AFTER INSERT ON order_items
+FOR EACH ROW
+BEGIN
+    -- 批量创建订单时跳过，由订单行更新按订单重算（见触发器 3）
+    IF @order_items_batch IS NULL THEN
+        CALL sp_refresh_order_summaries(NEW.order_id);
+    END IF;
+END;
+
+CREATE TRIGGER trg_summary_item_update
+AFTER UPDATE ON order_items
+FOR EACH ROW
+BEGIN
+    IF NOT (OLD.order_id <=> NEW.order_id AND OLD.rental_days <=> NEW.rental_days) THEN
+        CALL sp_refresh_order_summaries(NEW.order_id);
+        IF NOT (OLD.order_id <=> NEW.order_id) THEN
+            CALL sp_refresh_order_summaries(OLD.order_id);
+        END IF;
+    END IF;
+END;
+
+CREATE TRIGGER trg_summary_item_delete
+AFTER DELETE ON order_items
+FOR EACH ROW
+BEGIN
+    CALL sp_refresh_order_summaries(OLD.order_id);
+END;
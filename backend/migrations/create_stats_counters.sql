@@ -0,0 +1,272 @@
+-- ============================================================
+-- 工作台统计计数表（修复版 - 不使用DELIMITER）
+-- 工作台与租赁分析的总数不再每次扫描 equipment / lease_orders /
+-- billing / return_records，而是由以下触发器在每次写入时按增量维护，
+-- 读取时按统计项对 stats_counters 的槽位行求和（SUM ... GROUP BY name）
+--
+-- 每个统计项分散为 64 个槽位行 (name, slot)，触发器只更新
+-- slot = CONNECTION_ID() % 64 的行：InnoDB 的行锁持有到事务提交，
+-- 若所有写入都更新同一行，设备、订单、账单、归还的写入事务会互相等待，
+-- 且各表触发器锁定计数行的先后顺序不同（如分配设备先改设备再建订单），
+-- 并发事务之间可能死锁。连接 ID 递增分配，连接池中的连接通常落在不同槽位，
+-- 不同连接上的事务不再争用同一计数行
+--
+-- 状态列存储的是枚举名称（IN_STOCK、PAID 等，与 ORM 一致）；
+-- 触发器中使用 <=> 比较，is_deleted 为 NULL 时增量为 0 而不是 NULL
+-- 槽位数须与 crud.STATS_COUNTER_SLOTS 一致；触发器只更新已存在的槽位行，
+-- 计数出现偏差或缺少槽位行时运行: python stats_counters.py （重算并修正）
+-- 需要 MySQL 5.7.2 及以上（同一表同一时机允许多个触发器）
+-- ============================================================
+
+USE port_equipment_db;
+
+-- 计数可由业务表重算（见文末初始值），旧版单行结构直接重建
+DROP TABLE IF EXISTS stats_counters;
+CREATE TABLE stats_counters (
+    name VARCHAR(64) NOT NULL COMMENT '统计项名称',
+    slot SMALLINT UNSIGNED NOT NULL DEFAULT 0 COMMENT '槽位（CONNECTION_ID() % 64）',
+    value DOUBLE NOT NULL DEFAULT 0 COMMENT '槽位值，统计项的值为各槽位之和',
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (name, slot)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='工作台统计计数（分槽位）';
+
+DROP TRIGGER IF EXISTS trg_stats_equipment_insert;
+DROP TRIGGER IF EXISTS trg_stats_equipment_update;
+DROP TRIGGER IF EXISTS trg_stats_equipment_delete;
+DROP TRIGGER IF EXISTS trg_stats_order_insert;
+DROP TRIGGER IF EXISTS trg_stats_order_update;
+DROP TRIGGER IF EXISTS trg_stats_order_delete;
+DROP TRIGGER IF EXISTS trg_stats_billing_insert;
+DROP TRIGGER IF EXISTS trg_stats_billing_update;
+DROP TRIGGER IF EXISTS trg_stats_billing_delete;
+DROP TRIGGER IF EXISTS trg_stats_return_insert;
+DROP TRIGGER IF EXISTS trg_stats_return_update;
+DROP TRIGGER IF EXISTS trg_stats_return_delete;
+
+-- ============================================================
+-- 1. 设备：total_equipment / in_stock / out_stock / maintenance
+-- 订单、出入库、质检触发器对设备状态的修改同样会触发这里
+-- ============================================================
+CREATE TRIGGER trg_stats_equipment_insert
+AFTER INSERT ON equipment
+FOR EACH ROW
+BEGIN
+    UPDATE stats_counters
+    SET value = value + CASE name
+        WHEN 'total_equipment' THEN (NEW.is_deleted <=> 0)
+        WHEN 'in_stock' THEN (NEW.is_deleted <=> 0 AND NEW.status <=> 'IN_STOCK')
+        WHEN 'out_stock' THEN (NEW.is_deleted <=> 0 AND NEW.status <=> 'OUT')
+        WHEN 'maintenance' THEN (NEW.is_deleted <=> 0 AND NEW.status <=> 'MAINTENANCE')
+    END
+    WHERE name IN ('total_equipment', 'in_stock', 'out_stock', 'maintenance')
+      AND slot = CONNECTION_ID() % 64;
+END;
+
+CREATE TRIGGER trg_stats_equipment_update
+AFTER UPDATE ON equipment
+FOR EACH ROW
+BEGIN
+    IF NOT (OLD.status <=> NEW.status AND OLD.is_deleted <=> NEW.is_deleted) THEN
+        UPDATE stats_counters
+        SET value = value + CASE name
+            WHEN 'total_equipment' THEN (NEW.is_deleted <=> 0) - (OLD.is_deleted <=> 0)
+            WHEN 'in_stock' THEN (NEW.is_deleted <=> 0 AND NEW.status <=> 'IN_STOCK')
+                               - (OLD.is_deleted <=> 0 AND OLD.status <=> 'IN_STOCK')
+            WHEN 'out_stock' THEN (NEW.is_deleted <=> 0 AND NEW.status <=> 'OUT')
+                                - (OLD.is_deleted <=> 0 AND OLD.status <=> 'OUT')
+            WHEN 'maintenance' THEN (NEW.is_deleted <=> 0 AND NEW.status <=> 'MAINTENANCE')
+                                  - (OLD.is_deleted <=> 0 AND OLD.status <=> 'MAINTENANCE')
+        END
+        WHERE name IN ('total_equipment', 'in_stock', 'out_stock', 'maintenance')
+          AND slot = CONNECTION_ID() % 64;
+    END IF;
+END;
+
+CREATE TRIGGER trg_stats_equipment_delete
+AFTER DELETE ON equipment
+FOR EACH ROW
+BEGIN
+    UPDATE stats_counters
+    SET value = value - CASE name
+        WHEN 'total_equipment' THEN (OLD.is_deleted <=> 0)
+        WHEN 'in_stock' THEN (OLD.is_deleted <=> 0 AND OLD.status <=> 'IN_STOCK')
+        WHEN 'out_stock' THEN (OLD.is_deleted <=> 0 AND OLD.status <=> 'OUT')
+        WHEN 'maintenance' THEN (OLD.is_deleted <=> 0 AND OLD.status <=> 'MAINTENANCE')
+    END
+    WHERE name IN ('total_equipment', 'in_stock', 'out_stock', 'maintenance')
+      AND slot = CONNECTION_ID() % 64;
+END;
+
+-- ============================================================
+-- 2. 租赁订单：total_orders / pending_checkout / in_progress_orders
+-- ============================================================
+CREATE TRIGGER trg_stats_order_insert
+AFTER INSERT ON lease_orders
+FOR EACH ROW
+BEGIN
+    UPDATE stats_counters
+    SET value = value + CASE name
+        WHEN 'total_orders' THEN (NEW.is_deleted <=> 0)
+        WHEN 'pending_checkout' THEN (NEW.is_deleted <=> 0 AND NEW.status <=> 'PENDING')
+        WHEN 'in_progress_orders' THEN (NEW.is_deleted <=> 0 AND NEW.status <=> 'IN_PROGRESS')
+    END
+    WHERE name IN ('total_orders', 'pending_checkout', 'in_progress_orders')
+      AND slot = CONNECTION_ID() % 64;
+END;
+
+CREATE TRIGGER trg_stats_order_update
+AFTER UPDATE ON lease_orders
+FOR EACH ROW
+BEGIN
+    IF NOT (OLD.status <=> NEW.status AND OLD.is_deleted <=> NEW.is_deleted) THEN
+        UPDATE stats_counters
+        SET value = value + CASE name
+            WHEN 'total_orders' THEN (NEW.is_deleted <=> 0) - (OLD.is_deleted <=> 0)
+            WHEN 'pending_checkout' THEN (NEW.is_deleted <=> 0 AND NEW.status <=> 'PENDING')
+                                       - (OLD.is_deleted <=> 0 AND OLD.status <=> 'PENDING')
+            WHEN 'in_progress_orders' THEN (NEW.is_deleted <=> 0 AND NEW.status <=> 'IN_PROGRESS')
+                                         - (OLD.is_deleted <=> 0 AND OLD.status <=> 'IN_PROGRESS')
+        END
+        WHERE name IN ('total_orders', 'pending_checkout', 'in_progress_orders')
+          AND slot = CONNECTION_ID() % 64;
+    END IF;
+END;
+
+CREATE TRIGGER trg_stats_order_delete
+AFTER DELETE ON lease_orders
+FOR EACH ROW
+BEGIN
+    UPDATE stats_counters
+    SET value = value - CASE name
+        WHEN 'total_orders' THEN (OLD.is_deleted <=> 0)
+        WHEN 'pending_checkout' THEN (OLD.is_deleted <=> 0 AND OLD.status <=> 'PENDING')
+        WHEN 'in_progress_orders' THEN (OLD.is_deleted <=> 0 AND OLD.status <=> 'IN_PROGRESS')
+    END
+    WHERE name IN ('total_orders', 'pending_checkout', 'in_progress_orders')
+      AND slot = CONNECTION_ID() % 64;
+END;
+
+-- ============================================================
+-- 3. 账单：total_revenue / pending_amount / overdue_bills
+-- total_amount 由 trg_billing_before_* 计算，AFTER 触发器读到的是最终值
+-- ============================================================
+CREATE TRIGGER trg_stats_billing_insert
+AFTER INSERT ON billing
+FOR EACH ROW
+BEGIN
+    UPDATE stats_counters
+    SET value = value + CASE name
+        WHEN 'total_revenue' THEN (NEW.is_deleted <=> 0 AND NEW.status <=> 'PAID') * COALESCE(NEW.total_amount, 0)
+        WHEN 'pending_amount' THEN (NEW.is_deleted <=> 0 AND NEW.status IN ('PENDING', 'CONFIRMED')) * COALESCE(NEW.total_amount, 0)
+        WHEN 'overdue_bills' THEN (NEW.is_deleted <=> 0 AND NEW.status <=> 'OVERDUE')
+    END
+    WHERE name IN ('total_revenue', 'pending_amount', 'overdue_bills')
+      AND slot = CONNECTION_ID() % 64;
+END;
+
+CREATE TRIGGER trg_stats_billing_update
+AFTER UPDATE ON billing
+FOR EACH ROW
+BEGIN
+    IF NOT (OLD.status <=> NEW.status AND OLD.is_deleted <=> NEW.is_deleted
+            AND OLD.total_amount <=> NEW.total_amount) THEN
+        UPDATE stats_counters
+        SET value = value + CASE name
+            WHEN 'total_revenue' THEN
+                (NEW.is_deleted <=> 0 AND NEW.status <=> 'PAID') * COALESCE(NEW.total_amount, 0)
+              - (OLD.is_deleted <=> 0 AND OLD.status <=> 'PAID') * COALESCE(OLD.total_amount, 0)
+            WHEN 'pending_amount' THEN
+                (NEW.is_deleted <=> 0 AND NEW.status IN ('PENDING', 'CONFIRMED')) * COALESCE(NEW.total_amount, 0)
+              - (OLD.is_deleted <=> 0 AND OLD.status IN ('PENDING', 'CONFIRMED')) * COALESCE(OLD.total_amount, 0)
+            WHEN 'overdue_bills' THEN (NEW.is_deleted <=> 0 AND NEW.status <=> 'OVERDUE')
+                                    - (OLD.is_deleted <=> 0 AND OLD.status <=> 'OVERDUE')
+        END
+        WHERE name IN ('total_revenue', 'pending_amount', 'overdue_bills')
+          AND slot = CONNECTION_ID() % 64;
+    END IF;
+END;
+
+CREATE TRIGGER trg_stats_billing_delete
+AFTER DELETE ON billing
+FOR EACH ROW
+BEGIN
+    UPDATE stats_counters
+    SET value = value - CASE name
+        WHEN 'total_revenue' THEN (OLD.is_deleted <=> 0 AND OLD.status <=> 'PAID') * COALESCE(OLD.total_amount, 0)
+        WHEN 'pending_amount' THEN (OLD.is_deleted <=> 0 AND OLD.status IN ('PENDING', 'CONFIRMED')) * COALESCE(OLD.total_amount, 0)
+        WHEN 'overdue_bills' THEN (OLD.is_deleted <=> 0 AND OLD.status <=> 'OVERDUE')
+    END
+    WHERE name IN ('total_revenue', 'pending_amount', 'overdue_bills')
+      AND slot = CONNECTION_ID() % 64;
+END;
+
+-- ============================================================
+-- 4. 归还记录：total_returned / pending_inspection
+-- ============================================================
+CREATE TRIGGER trg_stats_return_insert
+AFTER INSERT ON return_records
+FOR EACH ROW
+BEGIN
+    UPDATE stats_counters
+    SET value = value + CASE name
+        WHEN 'total_returned' THEN 1
+        WHEN 'pending_inspection' THEN (NEW.inspection_status <=> '待质检')
+    END
+    WHERE name IN ('total_returned', 'pending_inspection')
+      AND slot = CONNECTION_ID() % 64;
+END;
+
+CREATE TRIGGER trg_stats_return_update
+AFTER UPDATE ON return_records
+FOR EACH ROW
+BEGIN
+    IF NOT (OLD.inspection_status <=> NEW.inspection_status) THEN
+        UPDATE stats_counters
+        SET value = value + (NEW.inspection_status <=> '待质检') - (OLD.inspection_status <=> '待质检')
+        WHERE name = 'pending_inspection'
+          AND slot = CONNECTION_ID() % 64;
+    END IF;
+END;
+
+CREATE TRIGGER trg_stats_return_delete
+AFTER DELETE ON return_records
+FOR EACH ROW
+BEGIN
+    UPDATE stats_counters
+    SET value = value - CASE name
+        WHEN 'total_returned' THEN 1
+        WHEN 'pending_inspection' THEN (OLD.inspection_status <=> '待质检')
+    END
+    WHERE name IN ('total_returned', 'pending_inspection')
+      AND slot = CONNECTION_ID() % 64;
+END;
+
+-- ============================================================
+-- 初始值（由当前数据计算）：槽位 0 为当前值，其余槽位为 0
+-- ============================================================
+INSERT INTO stats_counters (name, slot, value)
+SELECT counters.name, slots.slot, IF(slots.slot = 0, counters.value, 0)
+FROM (
+    SELECT 'total_equipment' AS name, COUNT(*) AS value FROM equipment WHERE is_deleted = 0
+    UNION ALL SELECT 'in_stock', COUNT(*) FROM equipment WHERE is_deleted = 0 AND status = 'IN_STOCK'
+    UNION ALL SELECT 'out_stock', COUNT(*) FROM equipment WHERE is_deleted = 0 AND status = 'OUT'
+    UNION ALL SELECT 'maintenance', COUNT(*) FROM equipment WHERE is_deleted = 0 AND status = 'MAINTENANCE'
+    UNION ALL SELECT 'total_orders', COUNT(*) FROM lease_orders WHERE is_deleted = 0
+    UNION ALL SELECT 'pending_checkout', COUNT(*) FROM lease_orders WHERE is_deleted = 0 AND status = 'PENDING'
+    UNION ALL SELECT 'in_progress_orders', COUNT(*) FROM lease_orders WHERE is_deleted = 0 AND status = 'IN_PROGRESS'
+    UNION ALL SELECT 'total_revenue', COALESCE(SUM(total_amount), 0) FROM billing WHERE is_deleted = 0 AND status = 'PAID'
+    UNION ALL SELECT 'pending_amount', COALESCE(SUM(total_amount), 0) FROM billing WHERE is_deleted = 0 AND status IN ('PENDING', 'CONFIRMED')
+    UNION ALL SELECT 'overdue_bills', COUNT(*) FROM billing WHERE is_deleted = 0 AND status = 'OVERDUE'
+    UNION ALL SELECT 'total_returned', COUNT(*) FROM return_records
+    UNION ALL SELECT 'pending_inspection', COUNT(*) FROM return_records WHERE inspection_status = '待质检'
+) AS counters
+CROSS JOIN (
+    -- 槽位 0 ~ 63
+    SELECT high.d * 8 + low.d AS slot
+    FROM (SELECT 0 AS d UNION ALL SELECT 1 UNION ALL SELECT 2 UNION ALL SELECT 3
+          UNION ALL SELECT 4 UNION ALL SELECT 5 UNION ALL SELECT 6 UNION ALL SELECT 7) AS high
+    CROSS JOIN (SELECT 0 AS d UNION ALL SELECT 1 UNION ALL SELECT 2 UNION ALL SELECT 3
+          UNION ALL SELECT 4 UNION ALL SELECT 5 UNION ALL SELECT 6 UNION ALL SELECT 7) AS low
+) AS slots;
+
+SELECT name, SUM(value) AS value, COUNT(*) AS slots FROM stats_counters GROUP BY name ORDER BY name;
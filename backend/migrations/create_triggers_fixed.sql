@@ -10,6 +10,7 @@ DROP TRIGGER IF EXISTS trg_order_item_insert;
 DROP TRIGGER IF EXISTS trg_order_item_update;
 DROP TRIGGER IF EXISTS trg_order_item_delete;
 DROP TRIGGER IF EXISTS trg_order_created;
+DROP TRIGGER IF EXISTS trg_order_items_batch;
 DROP TRIGGER IF EXISTS trg_return_record_created;
 DROP TRIGGER IF EXISTS trg_inspection_record_created;
 DROP TRIGGER IF EXISTS trg_billing_before_insert;
@@ -22,22 +23,26 @@ DROP TRIGGER IF EXISTS trg_inbound_record_created;
 -- ============================================================
 -- 1. 订单明细插入触发器 - 自动更新订单总金额
 -- ============================================================
+-- 批量创建订单（crud.create_orders_batch）时会话变量 @order_items_batch 非空，
+-- 逐行的金额重算与日志跳过，改由写入方更新一次订单行，见触发器 4.1
 CREATE TRIGGER trg_order_item_insert
 AFTER INSERT ON order_items
 FOR EACH ROW
 BEGIN
-    UPDATE lease_orders
-    SET total_amount = (
-        SELECT COALESCE(SUM(subtotal), 0)
-        FROM order_items
-        WHERE order_id = NEW.order_id
-    ),
-    updated_at = NOW()
-    WHERE order_id = NEW.order_id;
-    
-    INSERT INTO trigger_logs (log_type, trigger_name, operation, table_name, record_id, description)
-    VALUES ('success', '订单金额触发器', 'INSERT', 'order_items', NEW.item_id, 
-            CONCAT('订单明细插入，订单ID: ', NEW.order_id, '，设备: ', COALESCE(NEW.equipment_name, ''), '，小计: ¥', NEW.subtotal));
+    IF @order_items_batch IS NULL THEN
+        UPDATE lease_orders
+        SET total_amount = (
+            SELECT COALESCE(SUM(subtotal), 0)
+            FROM order_items
+            WHERE order_id = NEW.order_id
+        ),
+        updated_at = NOW()
+        WHERE order_id = NEW.order_id;
+        
+        INSERT INTO trigger_logs (log_type, trigger_name, operation, table_name, record_id, description)
+        VALUES ('success', '订单金额触发器', 'INSERT', 'order_items', NEW.item_id, 
+                CONCAT('订单明细插入，订单ID: ', NEW.order_id, '，设备: ', COALESCE(NEW.equipment_name, ''), '，小计: ¥', NEW.subtotal));
+    END IF;
 END;
 
 -- ============================================================
@@ -102,6 +107,24 @@ BEGIN
             CONCAT('订单创建，订单号: ', NEW.order_code, '，客户: ', NEW.customer_name, '，总金额: ¥', COALESCE(NEW.total_amount, 0)));
 END;
 
+-- ============================================================
+-- 4.1 订单明细批量插入完成 - 每个订单记录一次日志
+-- 批量创建订单时明细插入后按订单更新一次 total_amount（金额由写入方计算），
+-- 代替 trg_order_item_insert 逐行的重算与日志
+-- ============================================================
+CREATE TRIGGER trg_order_items_batch
+AFTER UPDATE ON lease_orders
+FOR EACH ROW
+BEGIN
+    IF @order_items_batch IS NOT NULL THEN
+        INSERT INTO trigger_logs (log_type, trigger_name, operation, table_name, record_id, description)
+        SELECT 'success', '订单金额触发器', 'INSERT', 'order_items', NEW.order_id,
+               CONCAT('订单明细批量插入，订单ID: ', NEW.order_id, '，明细 ', COUNT(*), ' 条，合计: ¥', NEW.total_amount)
+        FROM order_items
+        WHERE order_id = NEW.order_id;
+    END IF;
+END;
+
 -- ============================================================
 -- 5. 归还记录创建触发器 - 记录归还操作
 -- ============================================================
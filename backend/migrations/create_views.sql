@@ -28,17 +28,17 @@ SELECT
     e.specifications,
     e.created_at,
     e.updated_at,
-    -- 统计信息
+    -- 统计信息（状态列存储的是枚举名称，与 ORM 一致）
     CASE 
-        WHEN e.status = '在库' THEN 1 
+        WHEN e.status = 'IN_STOCK' THEN 1 
         ELSE 0 
     END AS available_quantity,
     CASE 
-        WHEN e.status = '已出库' THEN 1 
+        WHEN e.status = 'OUT' THEN 1 
         ELSE 0 
     END AS rented_quantity,
     CASE 
-        WHEN e.status = '维修中' THEN 1 
+        WHEN e.status = 'MAINTENANCE' THEN 1 
         ELSE 0 
     END AS maintenance_quantity,
     -- 租赁统计
@@ -128,7 +128,7 @@ SELECT
     c.address,
     c.credit_rating,
     c.created_at,
-    -- 订单统计
+    -- 订单统计（状态列存储的是枚举名称，与 ORM 一致）
     COALESCE(order_stats.total_orders, 0) AS total_orders,
     COALESCE(order_stats.completed_orders, 0) AS completed_orders,
     COALESCE(order_stats.in_progress_orders, 0) AS in_progress_orders,
@@ -147,13 +147,13 @@ LEFT JOIN (
     SELECT 
         lo.customer_id,
         COUNT(DISTINCT lo.order_id) AS total_orders,
-        SUM(CASE WHEN lo.status = '已完结' THEN 1 ELSE 0 END) AS completed_orders,
-        SUM(CASE WHEN lo.status = '航次执行中' THEN 1 ELSE 0 END) AS in_progress_orders,
-        SUM(CASE WHEN lo.status = '待提货' THEN 1 ELSE 0 END) AS pending_orders,
+        SUM(CASE WHEN lo.status = 'COMPLETED' THEN 1 ELSE 0 END) AS completed_orders,
+        SUM(CASE WHEN lo.status = 'IN_PROGRESS' THEN 1 ELSE 0 END) AS in_progress_orders,
+        SUM(CASE WHEN lo.status = 'PENDING' THEN 1 ELSE 0 END) AS pending_orders,
         SUM(lo.total_amount) AS total_amount,
         SUM(COALESCE(b.paid_amount, 0)) AS paid_amount,
         SUM(CASE 
-            WHEN b.status IN ('待确认', '已确认') THEN COALESCE(b.total_amount, 0) 
+            WHEN b.status IN ('PENDING', 'CONFIRMED') THEN COALESCE(b.total_amount, 0) 
             ELSE 0 
         END) AS pending_amount,
         SUM(oi_stats.equipment_count) AS total_equipment_count,
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, ForeignKey, Enum, Date, text
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, Text, ForeignKey, Enum, Date, Index, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
@@ -74,6 +74,14 @@ class PaymentMethod(str, enum.Enum):
 # 设备表
 class Equipment(Base):
     __tablename__ = "equipment"
+    __table_args__ = (
+        # 列表分页：ORDER BY created_at DESC, 主键 DESC（游标分页）
+        Index("idx_equipment_keyset", "is_deleted", "created_at", "equipment_id"),
+        # 按状态筛选的列表分页
+        Index("idx_equipment_status_keyset", "is_deleted", "status", "created_at", "equipment_id"),
+        # 按类型分配在库设备：SELECT ... FOR UPDATE SKIP LOCKED 按主键顺序只扫描、锁定选中的行（见 allocation.py）
+        Index("idx_equipment_allocation", "is_deleted", "category", "status", "equipment_id"),
+    )
 
     equipment_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     equipment_code = Column(String(50), unique=True, nullable=False, index=True)
@@ -106,6 +114,10 @@ class Equipment(Base):
 # 客户表
 class Customer(Base):
     __tablename__ = "customers"
+    __table_args__ = (
+        # 列表分页：ORDER BY created_at DESC, 主键 DESC（游标分页）
+        Index("idx_customers_keyset", "is_deleted", "created_at", "customer_id"),
+    )
 
     customer_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     customer_name = Column(String(200), nullable=False, unique=True)
@@ -124,6 +136,14 @@ class Customer(Base):
 # 租赁订单表
 class LeaseOrder(Base):
     __tablename__ = "lease_orders"
+    __table_args__ = (
+        # 列表分页：ORDER BY created_at DESC, 主键 DESC（游标分页）
+        Index("idx_lease_orders_keyset", "is_deleted", "created_at", "order_id"),
+        # 按状态筛选的列表分页、执行中订单的创建日期范围查询
+        Index("idx_lease_orders_status_keyset", "is_deleted", "status", "created_at", "order_id"),
+        # 每日汇总增量刷新：查找水位之后修改过的订单
+        Index("idx_lease_orders_updated_at", "updated_at"),
+    )
 
     order_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     order_code = Column(String(50), unique=True, nullable=False, index=True)
@@ -150,6 +170,12 @@ class LeaseOrder(Base):
 # 订单明细表
 class OrderItem(Base):
     __tablename__ = "order_items"
+    __table_args__ = (
+        # 每日汇总增量刷新：查找水位之后新增的明细
+        Index("idx_order_items_created_at", "created_at"),
+        # 按订单关联明细（日期范围统计先按订单创建日期定位订单，再按订单号取明细）
+        Index("idx_order_items_order_id", "order_id"),
+    )
 
     item_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     order_id = Column(Integer, ForeignKey("lease_orders.order_id"), nullable=False)
@@ -169,6 +195,12 @@ class OrderItem(Base):
 # 账单表
 class Billing(Base):
     __tablename__ = "billing"
+    __table_args__ = (
+        # 列表分页：ORDER BY created_at DESC, 主键 DESC（游标分页）
+        Index("idx_billing_keyset", "is_deleted", "created_at", "bill_id"),
+        # 按状态筛选的列表分页
+        Index("idx_billing_status_keyset", "is_deleted", "status", "created_at", "bill_id"),
+    )
 
     bill_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     bill_code = Column(String(50), unique=True, nullable=False, index=True)
@@ -198,6 +230,14 @@ class Billing(Base):
 # 归还记录表
 class ReturnRecord(Base):
     __tablename__ = "return_records"
+    __table_args__ = (
+        # 列表分页：ORDER BY created_at DESC, 主键 DESC（游标分页）
+        Index("idx_return_records_keyset", "created_at", "return_id"),
+        # 每日汇总增量刷新：查找水位之后修改过的归还记录
+        Index("idx_return_records_updated_at", "updated_at"),
+        # 按归还日期的日期范围统计
+        Index("idx_return_records_return_date", "return_date"),
+    )
 
     return_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     return_code = Column(String(50), unique=True, nullable=False, index=True)
@@ -282,6 +322,10 @@ class OperationLog(Base):
 
 class TriggerLog(Base):
     __tablename__ = "trigger_logs"
+    __table_args__ = (
+        # 列表分页：ORDER BY created_at DESC, 主键 DESC（游标分页）
+        Index("idx_trigger_logs_keyset", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     log_type = Column(String(20), nullable=False, index=True)  # success, info, warning, error
@@ -293,6 +337,107 @@ class TriggerLog(Base):
     created_at = Column(DateTime, default=datetime.now, nullable=False, index=True)
 
 
+class StatsCounter(Base):
+    """
+    工作台统计计数，由数据库触发器增量维护（见 migrations/create_stats_counters.sql）
+    每个统计项分散为多个槽位行，触发器只更新当前连接对应的槽位，读取时按统计项求和
+    """
+    __tablename__ = "stats_counters"
+
+    name = Column(String(64), primary_key=True)  # 统计项名称
+    slot = Column(Integer, primary_key=True, default=0)  # 槽位（CONNECTION_ID() % 槽位数）
+    value = Column(Float(53), nullable=False, default=0)  # 当前值
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, nullable=False)
+
+
+class DailyStats(Base):
+    """每日汇总：按业务日期汇总的订单、明细、金额、入库与归还数量（见 rollups.py）"""
+    __tablename__ = "daily_stats"
+
+    stat_date = Column(Date, primary_key=True)  # 统计日期
+    orders = Column(Integer, nullable=False, default=0)  # 当日创建的订单数
+    order_items = Column(Integer, nullable=False, default=0)  # 当日订单的明细数
+    rental_days = Column(Integer, nullable=False, default=0)  # 当日订单明细的租赁天数之和
+    order_amount = Column(Float(53), nullable=False, default=0)  # 当日订单金额之和
+    active_customers = Column(Integer, nullable=False, default=0)  # 当日下单的客户数（去重）
+    inbound_count = Column(Integer, nullable=False, default=0)  # 当日入库单数
+    return_count = Column(Integer, nullable=False, default=0)  # 当日归还记录数（按归还日期）
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, nullable=False)
+
+
+class DailyActiveCustomer(Base):
+    """每日下单客户明细，用于跨日期区间的去重客户数"""
+    __tablename__ = "daily_active_customers"
+
+    stat_date = Column(Date, primary_key=True)
+    customer_id = Column(Integer, primary_key=True)
+
+
+class RollupWatermark(Base):
+    """汇总表增量刷新的水位（上次刷新开始的时间）"""
+    __tablename__ = "rollup_watermarks"
+
+    name = Column(String(64), primary_key=True)
+    watermark = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, nullable=False)
+
+
+class EquipmentInventory(Base):
+    """设备库存统计（v_equipment_inventory 的物化表），由数据库触发器增量维护（见 summaries.py）"""
+    __tablename__ = "equipment_inventory"
+
+    equipment_id = Column(Integer, primary_key=True, autoincrement=False)
+    available_quantity = Column(Integer, nullable=False, default=0)  # 在库数量
+    rented_quantity = Column(Integer, nullable=False, default=0)  # 出库数量
+    maintenance_quantity = Column(Integer, nullable=False, default=0)  # 维修数量
+    rental_count = Column(Integer, nullable=False, default=0)  # 租赁次数（未删除订单数，去重）
+    total_rental_days = Column(Integer, nullable=False, default=0)  # 累计租赁天数
+    total_revenue = Column(Float(53), nullable=False, default=0)  # 累计租赁收入
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, nullable=False)
+
+
+class CustomerRentalStats(Base):
+    """客户租赁统计（v_customer_rental_stats 的物化表），由数据库触发器增量维护（见 summaries.py）"""
+    __tablename__ = "customer_rental_stats"
+    __table_args__ = (
+        # 客户列表：ORDER BY total_rental_amount DESC, customer_id DESC（游标分页）
+        Index("idx_customer_rental_stats_amount", "total_rental_amount", "customer_id"),
+    )
+
+    customer_id = Column(Integer, primary_key=True, autoincrement=False)
+    total_orders = Column(Integer, nullable=False, default=0)  # 订单数（未删除）
+    completed_orders = Column(Integer, nullable=False, default=0)  # 已完结订单数
+    in_progress_orders = Column(Integer, nullable=False, default=0)  # 航次执行中订单数
+    pending_orders = Column(Integer, nullable=False, default=0)  # 待提货订单数
+    total_rental_amount = Column(Float(53), nullable=False, default=0)  # 订单金额合计
+    paid_amount = Column(Float(53), nullable=False, default=0)  # 已支付金额合计
+    pending_amount = Column(Float(53), nullable=False, default=0)  # 待确认 / 已确认账单金额合计
+    total_equipment_count = Column(Integer, nullable=False, default=0)  # 订单明细数合计
+    last_order_date = Column(DateTime)  # 最近下单时间
+    last_order_code = Column(String(50))  # 最大订单编号
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, nullable=False)
+
+
+class BillingSummary(Base):
+    """账单所属订单的明细统计（v_billing_summary 的物化部分），由数据库触发器增量维护（见 summaries.py）"""
+    __tablename__ = "billing_summary"
+
+    bill_id = Column(Integer, primary_key=True, autoincrement=False)
+    order_id = Column(Integer, nullable=False, index=True)  # 所属订单（订单明细变化时按此查找）
+    equipment_count = Column(Integer, nullable=False, default=0)  # 订单明细数
+    total_rental_days = Column(Integer, nullable=False, default=0)  # 订单明细租赁天数合计
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, nullable=False)
+
+
+class DocumentSequence(Base):
+    """单据编号序列（见 sequences.py），每种单据一行"""
+    __tablename__ = "document_sequences"
+
+    name = Column(String(50), primary_key=True)
+    next_value = Column(BigInteger, nullable=False, default=1)  # 下一个未分配的序号
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, nullable=False)
+
+
 # ============================================================
 # 新增业务表
 # ============================================================
@@ -319,6 +464,12 @@ class Supplier(Base):
 # 入库记录主表
 class InboundRecord(Base):
     __tablename__ = "inbound_records"
+    __table_args__ = (
+        # 列表分页：ORDER BY created_at DESC, 主键 DESC（游标分页）
+        Index("idx_inbound_records_keyset", "is_deleted", "created_at", "inbound_id"),
+        # 每日汇总增量刷新：查找水位之后修改过的入库单
+        Index("idx_inbound_records_updated_at", "updated_at"),
+    )
 
     inbound_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     inbound_code = Column(String(50), unique=True, nullable=False, index=True)
@@ -363,6 +514,10 @@ class InboundItem(Base):
 # 出库记录主表
 class OutboundRecord(Base):
     __tablename__ = "outbound_records"
+    __table_args__ = (
+        # 列表分页：ORDER BY created_at DESC, 主键 DESC（游标分页）
+        Index("idx_outbound_records_keyset", "is_deleted", "created_at", "outbound_id"),
+    )
 
     outbound_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     outbound_code = Column(String(50), unique=True, nullable=False, index=True)
@@ -380,6 +535,7 @@ class OutboundRecord(Base):
 
     # 关系
     items = relationship("OutboundItem", back_populates="outbound_record", cascade="all, delete-orphan")
+    order = relationship("LeaseOrder")
 
 
 # 出库明细表
@@ -0,0 +1,284 @@
+"""
+分页工具
+支持两种分页方式：
+- OFFSET 分页（默认）：ORDER BY ... OFFSET :skip LIMIT :limit
+- 游标（keyset）分页：以上一页最后一行的 (排序值, 主键) 作为游标，
+  使用 WHERE (排序值, 主键) < (:v, :id) 直接定位到下一页，
+  配合 (排序列, 主键) 复合索引，翻到多深的页代价都相同
+
+总数统计支持三种策略（count_mode）：
+- exact: 每次请求执行 COUNT(*)（默认）
+- cached: 按 (依赖表, 查询签名) 缓存总数，依赖表被写入后失效
+- none: 不统计总数，total 返回 None，由 has_more 判断是否还有下一页
+"""
+import base64
+import json
+from datetime import datetime, date
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from fastapi import Query
+from sqlalchemy import func, select, text, tuple_
+from sqlalchemy.orm import Session
+
+from cache import TTLCache, on_tables_written
+
+
+class InvalidCursor(ValueError):
+    """游标格式错误"""
+
+
+def encode_cursor(sort_value: Any, row_id: int) -> str:
+    """将 (排序值, 主键) 编码为不透明的游标字符串"""
+    if isinstance(sort_value, datetime):
+        payload = {"t": "dt", "v": sort_value.isoformat()}
+    elif isinstance(sort_value, date):
+        payload = {"t": "d", "v": sort_value.isoformat()}
+    else:
+        payload = {"t": "v", "v": sort_value}
+    payload["id"] = row_id
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, int]:
+    """解析游标字符串，返回 (排序值, 主键)"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        value = payload["v"]
+        if payload["t"] == "dt":
+            value = datetime.fromisoformat(value)
+        elif payload["t"] == "d":
+            value = date.fromisoformat(value)
+        return value, int(payload["id"])
+    except Exception:
+        raise InvalidCursor(f"无效的分页游标: {cursor}")
+
+
+def is_cursor_mode(cursor: Optional[str]) -> bool:
+    """传入 cursor 参数（首页传空字符串）即启用游标分页"""
+    return cursor is not None
+
+
+def paginate(
+    query,
+    sort_column,
+    id_column,
+    skip: int = 0,
+    limit: int = 10,
+    cursor: Optional[str] = None
+) -> Tuple[List[Any], Optional[str], bool]:
+    """
+    对 ORM 查询按 (sort_column DESC, id_column DESC) 分页
+    返回 (当前页数据, 下一页游标, 是否还有下一页)；多取一行用于判断 has_more，
+    OFFSET 模式下游标恒为 None
+    """
+    query = query.order_by(sort_column.desc(), id_column.desc())
+    if is_cursor_mode(cursor):
+        if cursor:
+            sort_value, last_id = decode_cursor(cursor)
+            query = query.filter(tuple_(sort_column, id_column) < tuple_(sort_value, last_id))
+    else:
+        query = query.offset(skip)
+
+    rows = query.limit(limit + 1).all()
+    return trim_page(rows, sort_column.key, id_column.key, limit, cursor)
+
+
+def keyset_sql(
+    sql: str,
+    params: Dict[str, Any],
+    sort_column: str,
+    id_column: str,
+    skip: int = 0,
+    limit: int = 10,
+    cursor: Optional[str] = None
+) -> str:
+    """
+    为原生 SQL（视图查询）追加排序与分页子句，参数写入 params
+    sql 需要以 WHERE 条件结尾，便于继续追加 AND 条件
+    """
+    if is_cursor_mode(cursor):
+        if cursor:
+            sort_value, last_id = decode_cursor(cursor)
+            sql += f" AND ({sort_column}, {id_column}) < (:cursor_value, :cursor_id)"
+            params['cursor_value'] = sort_value
+            params['cursor_id'] = last_id
+        sql += f" ORDER BY {sort_column} DESC, {id_column} DESC LIMIT :limit"
+    else:
+        sql += f" ORDER BY {sort_column} DESC, {id_column} DESC LIMIT :limit OFFSET :skip"
+        params['skip'] = skip
+    # 多取一行用于判断是否还有下一页
+    params['limit'] = limit + 1
+    return sql
+
+
+def trim_page(
+    rows: List[Any],
+    sort_key: str,
+    id_key: str,
+    limit: int,
+    cursor: Optional[str] = None
+) -> Tuple[List[Any], Optional[str], bool]:
+    """
+    去掉多取的一行，返回 (当前页数据, 下一页游标, 是否还有下一页)
+    rows 中的元素可以是字典或带属性的行对象
+    """
+    items = rows[:limit]
+    has_more = len(rows) > limit
+    next_cursor = None
+    if has_more and items and is_cursor_mode(cursor):
+        last = items[-1]
+        get = last.get if isinstance(last, dict) else lambda k: getattr(last, k)
+        next_cursor = encode_cursor(get(sort_key), get(id_key))
+    return items, next_cursor, has_more
+
+
+# ========== 总数统计策略 ==========
+COUNT_EXACT = "exact"
+COUNT_CACHED = "cached"
+COUNT_NONE = "none"
+COUNT_MODES = (COUNT_EXACT, COUNT_CACHED, COUNT_NONE)
+COUNT_MODE_PATTERN = "^(exact|cached|none)$"
+
+# 列表接口共用的查询参数：cursor: Optional[str] = CURSOR_QUERY, count_mode: str = COUNT_MODE_QUERY
+CURSOR_QUERY = Query(None, description="游标分页：首页传空字符串，之后传上一页返回的 next_cursor")
+COUNT_MODE_QUERY = Query(
+    COUNT_EXACT, pattern=COUNT_MODE_PATTERN,
+    description="总数统计：exact 精确 / cached 缓存 / none 不统计（仅返回 has_more）"
+)
+
+# 缓存总数的有效期（秒）：兜底绕过 ORM 的写入（如手工执行的 SQL）
+COUNT_CACHE_TTL = 30
+count_cache = TTLCache("page_totals", COUNT_CACHE_TTL)
+
+
+@on_tables_written
+def _invalidate_counts(tables):
+    """依赖表被写入后，删除相关的缓存总数"""
+    count_cache.invalidate(lambda key: not key[0].isdisjoint(tables))
+
+
+def _freeze(value: Any) -> Any:
+    """将查询参数转换为可哈希的值"""
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+def count_rows(
+    compute: Callable[[], int],
+    tables: Iterable[str],
+    signature: Hashable,
+    mode: str = COUNT_EXACT
+) -> Optional[int]:
+    """
+    按统计策略获取总数
+    - tables: 结果依赖的表，任一表被写入后 cached 模式的缓存失效
+    - signature: 查询签名（SQL + 参数），相同签名共享缓存
+    """
+    if mode == COUNT_NONE:
+        return None
+    if mode == COUNT_CACHED:
+        return count_cache.get_or_compute((frozenset(tables), signature), compute)
+    return compute()
+
+
+def count_query(query, tables: Iterable[str], mode: str = COUNT_EXACT) -> Optional[int]:
+    """统计 ORM 查询的总数"""
+    if mode == COUNT_NONE:
+        return None
+    compiled = query.statement.compile()
+    signature = (str(compiled), _freeze(compiled.params))
+    return count_rows(query.count, tables, signature, mode)
+
+
+def wrap_count_sql(sql: str) -> str:
+    """将查询包装为子查询统计行数，不依赖原查询的 SELECT 列表"""
+    return f"SELECT COUNT(*) FROM ({sql}) AS count_source"
+
+
+def count_sql(
+    db: Session,
+    sql: str,
+    params: Dict[str, Any],
+    tables: Iterable[str],
+    mode: str = COUNT_EXACT
+) -> Optional[int]:
+    """统计原生 SQL（不含 ORDER BY / LIMIT 的 SELECT 语句）的总数"""
+    if mode == COUNT_NONE:
+        return None
+    count_sql_text = wrap_count_sql(sql)
+    params = dict(params)
+    return count_rows(
+        lambda: db.execute(text(count_sql_text), params).scalar(),
+        tables, (count_sql_text, _freeze(params)), mode
+    )
+
+
+# ========== 异步查询（AsyncSession） ==========
+async def paginate_async(
+    session,
+    statement,
+    sort_column,
+    id_column,
+    skip: int = 0,
+    limit: int = 10,
+    cursor: Optional[str] = None
+) -> Tuple[List[Any], Optional[str], bool]:
+    """paginate 的异步版本，statement 为 select(Model) 语句"""
+    statement = statement.order_by(sort_column.desc(), id_column.desc())
+    if is_cursor_mode(cursor):
+        if cursor:
+            sort_value, last_id = decode_cursor(cursor)
+            statement = statement.where(tuple_(sort_column, id_column) < tuple_(sort_value, last_id))
+    else:
+        statement = statement.offset(skip)
+
+    result = await session.execute(statement.limit(limit + 1))
+    return trim_page(list(result.scalars().all()), sort_column.key, id_column.key, limit, cursor)
+
+
+async def _count_rows_async(compute, tables: Iterable[str], signature: Hashable, mode: str) -> Optional[int]:
+    """count_rows 的异步版本，cached 模式同样经单飞计算，并发未命中时只统计一次"""
+    if mode == COUNT_NONE:
+        return None
+    if mode != COUNT_CACHED:
+        return await compute()
+    return await count_cache.get_or_compute_async((frozenset(tables), signature), compute)
+
+
+async def count_statement_async(session, statement, tables: Iterable[str], mode: str = COUNT_EXACT) -> Optional[int]:
+    """统计 select 语句的总数（异步）"""
+    if mode == COUNT_NONE:
+        return None
+    compiled = statement.compile()
+    signature = (str(compiled), _freeze(compiled.params))
+
+    async def compute():
+        result = await session.execute(select(func.count()).select_from(statement.subquery()))
+        return result.scalar()
+
+    return await _count_rows_async(compute, tables, signature, mode)
+
+
+async def count_sql_async(
+    session,
+    sql: str,
+    params: Dict[str, Any],
+    tables: Iterable[str],
+    mode: str = COUNT_EXACT
+) -> Optional[int]:
+    """统计原生 SQL 的总数（异步）"""
+    if mode == COUNT_NONE:
+        return None
+    count_sql_text = wrap_count_sql(sql)
+    params = dict(params)
+
+    async def compute():
+        result = await session.execute(text(count_sql_text), params)
+        return result.scalar()
+
+    return await _count_rows_async(compute, tables, (count_sql_text, _freeze(params)), mode)
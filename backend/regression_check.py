@@ -0,0 +1,274 @@
+"""
+接口回归检查
+在临时 SQLite 数据库中建表并写入少量样例数据，通过 TestClient 调用接口，检查：
+    outbound-queries   出库记录列表每页执行的 SQL 语句数固定，与每页条数、是否按装备编号过滤无关
+                       （出库明细与关联订单整页批量加载，不逐条查询）
+    orders-without-views
+                       v_order_summary 不可用时订单列表（异步 ORM 查询）正常返回，含订单明细
+    analysis-queries   多维分析的数据概览、数据链增长执行的 SQL 语句数与日期窗口长度无关
+                       （每个事实表整个窗口一次分组聚合，业务表实时聚合与每日汇总两种来源）
+    date-range-plans   统计分析、汇总刷新的日期范围查询在业务大表上不做全扫描（explain_check.py，不忽略小表）
+不连接 .env 中配置的数据库，检查结束后删除临时数据库
+
+用法:
+    python regression_check.py                       # 执行全部检查，存在失败时退出码为 1
+    python regression_check.py outbound-queries      # 只执行指定检查
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List
+
+# 须在导入 settings / database 之前设置：已存在的环境变量优先于 .env
+_workdir = tempfile.mkdtemp(prefix="regression_check_")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_workdir, "check.db")
+for _name in ("READ_REPLICA_URL", "ASYNC_DATABASE_URL", "ASYNC_READ_REPLICA_URL"):
+    os.environ[_name] = ""
+# 不启动后台刷新 / 核对任务
+os.environ["ROLLUP_REFRESH_SECONDS"] = "0"
+os.environ["AVAILABILITY_RECONCILE_SECONDS"] = "0"
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+import capabilities
+import database
+import models
+
+OUTBOUND_PAGE_SIZES = (5, 10, 20)
+ANALYSIS_WINDOWS = (8, 30, 365)
+OUTBOUND_RECORDS = 30
+EQUIPMENT_UNITS = 40
+
+
+def create_schema():
+    """建表；SQLite 不支持 ON UPDATE，去掉设备更新时间的服务器默认值（ORM 写入时由 default / onupdate 赋值）"""
+    models.Equipment.__table__.c.updated_at.server_default = None
+    models.Base.metadata.create_all(bind=database.engine)
+
+
+def seed():
+    """样例数据：设备、客户、订单（每单 2 台），每条出库记录 3 条明细并关联订单"""
+    db = database.SessionLocal()
+    try:
+        today = date.today()
+        customer = models.Customer(customer_name="回归检查客户")
+        units = [
+            models.Equipment(
+                equipment_code=f"CHK-EQ-{i:03d}",
+                equipment_name=f"检查设备{i}",
+                category="检查类型",
+                daily_rental_rate=100.0
+            )
+            for i in range(EQUIPMENT_UNITS)
+        ]
+        db.add(customer)
+        db.add_all(units)
+        db.flush()
+
+        orders = []
+        for i in range(OUTBOUND_RECORDS):
+            order = models.LeaseOrder(
+                order_code=f"CHK-ORD-{i:04d}",
+                customer_id=customer.customer_id,
+                customer_name=customer.customer_name,
+                start_date=today - timedelta(days=i % 7),
+                expected_return_date=today + timedelta(days=7),
+                total_amount=0.0,
+                created_at=datetime.now() - timedelta(minutes=i)
+            )
+            order.order_items = [
+                models.OrderItem(
+                    equipment_id=unit.equipment_id,
+                    equipment_code=unit.equipment_code,
+                    equipment_name=unit.equipment_name,
+                    daily_rate=unit.daily_rental_rate,
+                    rental_days=7,
+                    subtotal=unit.daily_rental_rate * 7
+                )
+                for unit in (units[i % EQUIPMENT_UNITS], units[(i + 1) % EQUIPMENT_UNITS])
+            ]
+            orders.append(order)
+        db.add_all(orders)
+        db.flush()
+
+        for i, order in enumerate(orders):
+            # 每条记录的第一条明细编号为 CHK-EQ-00x，按 "EQ-00" 过滤时每条记录只保留一条明细
+            picked = (units[i % 10], units[10 + i % 30], units[10 + (i + 1) % 30])
+            db.add(models.OutboundRecord(
+                outbound_code=f"CHK-OUT-{i:04d}",
+                order_id=order.order_id,
+                operator="回归检查",
+                total_quantity=len(picked),
+                created_at=datetime.now() - timedelta(minutes=i),
+                items=[
+                    models.OutboundItem(
+                        equipment_id=unit.equipment_id,
+                        equipment_code=unit.equipment_code,
+                        equipment_name=unit.equipment_name,
+                        quantity=1
+                    )
+                    for unit in picked
+                ]
+            ))
+        db.commit()
+    finally:
+        db.close()
+
+
+class StatementCounter:
+    """统计引擎上执行的 SQL 语句数"""
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._record)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def measure(self, call: Callable[[], object]) -> int:
+        self.count = 0
+        call()
+        return self.count
+
+
+# ========== 检查项 ==========
+def check_outbound_queries(client: TestClient) -> List[str]:
+    """出库记录列表：不同每页条数、有无装备编号过滤时，每页的语句数相同"""
+    counter = StatementCounter(database.engine)
+    failures = []
+    for label, params in (("不过滤", {}), ("按装备编号过滤", {"equipmentCode": "EQ-00"})):
+        counts = {}
+        for page_size in OUTBOUND_PAGE_SIZES:
+            def request():
+                response = client.get("/api/equipment/outbound", params={"pageSize": page_size, **params})
+                if response.status_code != 200:
+                    failures.append(f"{label} pageSize={page_size}: HTTP {response.status_code}")
+                elif len({row["id"] for row in response.json()["list"]}) != page_size:
+                    failures.append(f"{label} pageSize={page_size}: 返回的出库记录数不等于每页条数")
+            counts[page_size] = counter.measure(request)
+        print(f"    {label}: " + ", ".join(f"pageSize={size} -> {n} 条语句" for size, n in counts.items()))
+        if len(set(counts.values())) != 1:
+            failures.append(f"{label}: 每页语句数随每页条数变化 {counts}")
+    return failures
+
+
+def check_orders_without_views(client: TestClient) -> List[str]:
+    """订单列表：视图不可用时改用 ORM 查询，分页与游标分页都返回订单及其明细"""
+    # 临时库中没有视图，启动探测已将其标记为不可用
+    if capabilities.view_available("v_order_summary"):
+        return ["v_order_summary 未被标记为不可用，无法检查 ORM 查询"]
+    failures = []
+    seen = []
+    for label, params in (
+        ("页码分页", {"page": 1, "page_size": 10}),
+        ("游标分页首页", {"cursor": "", "page_size": 3}),
+    ):
+        response = client.get("/api/orders", params=params)
+        if response.status_code != 200:
+            failures.append(f"{label}: HTTP {response.status_code}")
+            continue
+        body = response.json()
+        orders = body["data"]
+        print(f"    {label}: HTTP 200，{len(orders)} 条订单")
+        if len(orders) != params["page_size"]:
+            failures.append(f"{label}: 返回 {len(orders)} 条订单，应为 {params['page_size']} 条")
+        if any(len(order["order_items"]) != 2 for order in orders):
+            failures.append(f"{label}: 订单明细缺失")
+        seen = [order["order_id"] for order in orders]
+        if "cursor" in params and body["next_cursor"]:
+            response = client.get("/api/orders", params={"cursor": body["next_cursor"], "page_size": 3})
+            if response.status_code != 200:
+                failures.append(f"游标分页第二页: HTTP {response.status_code}")
+            elif set(seen) & {order["order_id"] for order in response.json()["data"]}:
+                failures.append("游标分页第二页与首页重复")
+    return failures
+
+
+def check_analysis_queries(client: TestClient) -> List[str]:
+    """多维分析：8 / 30 / 365 天窗口的语句数相同，先从业务表实时聚合，回填每日汇总后再读汇总表"""
+    import crud
+    import rollups
+
+    builders = (("数据概览", crud._analysis_data_overview), ("数据链增长", crud._analysis_data_chain_growth))
+    counter = StatementCounter(database.engine)
+    failures = []
+    today = date.today()
+    db = database.SessionLocal()
+    try:
+        for source in ("业务表", "每日汇总"):
+            if source == "每日汇总":
+                rollups.backfill(db)
+            for label, builder in builders:
+                counts = {days: counter.measure(lambda: builder(db, today, days)) for days in ANALYSIS_WINDOWS}
+                print(f"    {source} {label}: " + ", ".join(f"{days} 天 -> {n} 条语句" for days, n in counts.items()))
+                if len(set(counts.values())) != 1:
+                    failures.append(f"{source} {label}: 语句数随窗口天数变化 {counts}")
+    finally:
+        db.close()
+    return failures
+
+
+def check_date_range_plans(client: TestClient) -> List[str]:
+    """日期范围查询：EXPLAIN QUERY PLAN 中业务大表均按索引范围查找（索引由模型定义建出）"""
+    import explain_check
+
+    failures = []
+    db = database.SessionLocal()
+    try:
+        for name, query in explain_check.date_range_queries(db, date.today()):
+            bad = explain_check.full_scans(explain_check.explain(db, query), min_rows=0)
+            print(f"    {name}: {'全扫描' if bad else 'OK'}")
+            failures += [f"{name}: {step['table']} {step['access']}" for step in bad]
+    finally:
+        db.rollback()
+        db.close()
+    return failures
+
+
+CHECKS: Dict[str, Callable[[TestClient], List[str]]] = {
+    "outbound-queries": check_outbound_queries,
+    "orders-without-views": check_orders_without_views,
+    "analysis-queries": check_analysis_queries,
+    "date-range-plans": check_date_range_plans,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="接口回归检查（临时 SQLite 数据库）")
+    parser.add_argument("checks", nargs="*", help=f"要执行的检查（{' / '.join(CHECKS)}），默认全部")
+    args = parser.parse_args()
+    unknown = [name for name in args.checks if name not in CHECKS]
+    if unknown:
+        parser.error(f"未知的检查: {', '.join(unknown)}")
+
+    failed = 0
+    try:
+        create_schema()
+        seed()
+        # main 导入时会建表，须在去掉 SQLite 不支持的默认值之后导入
+        import main as app_module
+        # 接口异常以 HTTP 500 返回，由检查项报告失败
+        with TestClient(app_module.app, raise_server_exceptions=False) as client:
+            for name in args.checks or CHECKS:
+                failures = CHECKS[name](client)
+                failed += bool(failures)
+                print(f"[{'失败' if failures else 'OK'}] {name}")
+                for failure in failures:
+                    print(f"    {failure}")
+    finally:
+        database.engine.dispose()
+        shutil.rmtree(_workdir, ignore_errors=True)
+
+    if failed:
+        print(f"{failed} 项检查失败")
+        return 1
+    print("全部检查通过")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
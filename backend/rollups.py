@@ -0,0 +1,395 @@
+"""
+每日汇总（rollup）
+将订单、订单明细、租赁天数、订单金额、下单客户、入库单与归还记录按天汇总到
+daily_stats / daily_active_customers，统计分析的按日、按月序列直接按日期读取汇总表，
+不再对业务表做 DATE(created_at) 分组扫描
+
+增量刷新：rollup_watermarks 记录上次刷新开始的时间（水位），每次只查找水位之后新增或修改过的
+业务行，重算这些行所属的日期；服务运行时由后台任务每 ROLLUP_REFRESH_SECONDS 秒刷新一次。
+汇总表尚未回填时，读取函数直接从业务表实时聚合，口径与汇总表一致；是否已回填在服务启动时探测一次，
+回填后由后台刷新（或 POST /api/system/capabilities/refresh 重新探测）切换到汇总表
+
+用法:
+    python rollups.py backfill                                      # 首次回填全部历史
+    python rollups.py backfill --start 2024-01-01 --end 2024-12-31  # 重算指定日期范围
+    python rollups.py refresh                                       # 执行一次增量刷新
+"""
+import argparse
+import asyncio
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+import analytics
+import date_ranges
+import models
+from database import SessionLocal
+
+ROLLUP_NAME = "daily_stats"
+# 增量刷新时回看的时长：覆盖修改时间早于水位、但在上次刷新之后才提交的事务
+REFRESH_OVERLAP = timedelta(minutes=5)
+# 回填时每批重算的天数（每批提交一次）
+BACKFILL_BATCH_DAYS = 31
+
+METRICS = (
+    "orders", "order_items", "rental_days", "order_amount",
+    "active_customers", "inbound_count", "return_count",
+)
+
+# 各指标的业务表来源：同一来源的指标在一次分组聚合中得到
+_SOURCES = (
+    {
+        "date_column": models.LeaseOrder.created_at,
+        "aggregates": {
+            "orders": func.count(models.LeaseOrder.order_id),
+            "order_amount": func.sum(models.LeaseOrder.total_amount),
+            "active_customers": func.count(func.distinct(models.LeaseOrder.customer_id)),
+        },
+        "filters": [models.LeaseOrder.is_deleted == 0],
+    },
+    {
+        # 明细按所属订单的创建日期归属
+        "date_column": models.LeaseOrder.created_at,
+        "aggregates": {
+            "order_items": func.count(models.OrderItem.item_id),
+            "rental_days": func.sum(models.OrderItem.rental_days),
+        },
+        "filters": [models.LeaseOrder.is_deleted == 0],
+        "joins": [(models.LeaseOrder, models.LeaseOrder.order_id == models.OrderItem.order_id)],
+        "source": models.OrderItem,
+    },
+    {
+        "date_column": models.InboundRecord.created_at,
+        "aggregates": {"inbound_count": func.count(models.InboundRecord.inbound_id)},
+        "filters": [models.InboundRecord.is_deleted == 0],
+    },
+    {
+        "date_column": models.ReturnRecord.return_date,
+        "aggregates": {"return_count": func.count(models.ReturnRecord.return_id)},
+    },
+)
+
+
+# ========== 从业务表计算 ==========
+def _source_kwargs(source: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "filters": source.get("filters", ()),
+        "joins": source.get("joins", ()),
+        "source": source.get("source"),
+    }
+
+
+def compute_daily(db: Session, days: List[date], metrics: Iterable[str] = METRICS) -> Dict[date, Dict[str, Any]]:
+    """从业务表实时计算日期窗口内的各项指标，返回结构同 analytics.daily_aggregates"""
+    metrics = set(metrics)
+    result: Dict[date, Dict[str, Any]] = {}
+    for source in _SOURCES:
+        aggregates = {name: expr for name, expr in source["aggregates"].items() if name in metrics}
+        if not aggregates:
+            continue
+        rows = analytics.daily_aggregates(
+            db, source["date_column"], aggregates, days, **_source_kwargs(source)
+        )
+        for day, values in rows.items():
+            result.setdefault(day, {}).update(values)
+    return result
+
+
+def active_customers_query(db: Session, start: date, end: date):
+    day_col = func.date(models.LeaseOrder.created_at)
+    return db.query(day_col, models.LeaseOrder.customer_id).filter(
+        models.LeaseOrder.is_deleted == 0,
+        models.LeaseOrder.customer_id.isnot(None),
+        date_ranges.between_days(models.LeaseOrder.created_at, start, end)
+    ).distinct()
+
+
+def compute_active_customers(db: Session, start: date, end: date) -> Set[Tuple[date, int]]:
+    """[start, end] 内每天下单的客户（去重）"""
+    rows = active_customers_query(db, start, end).all()
+    return {(analytics.as_date(day), customer_id) for day, customer_id in rows}
+
+
+def compute_queries(db: Session, days: List[date]) -> Dict[str, Any]:
+    """回填与实时计算使用的全部业务表查询（不执行），供 explain_check.py 检查执行计划"""
+    queries = {
+        "+".join(source["aggregates"]): analytics.daily_aggregates_query(
+            db, source["date_column"], source["aggregates"], days, **_source_kwargs(source)
+        )
+        for source in _SOURCES
+    }
+    queries["active_customer_ids"] = active_customers_query(db, days[0], days[-1])
+    return queries
+
+
+def _live_total(db: Session, metric: str, since: Optional[date] = None):
+    source = next(s for s in _SOURCES if metric in s["aggregates"])
+    query = db.query(source["aggregates"][metric])
+    if source.get("source") is not None:
+        query = query.select_from(source["source"])
+    for target, onclause in source.get("joins", ()):
+        query = query.join(target, onclause)
+    query = query.filter(*source.get("filters", ()))
+    if since is not None:
+        query = query.filter(source["date_column"] >= date_ranges.day_start(since))
+    return query.scalar() or 0
+
+
+# ========== 写入汇总表 ==========
+def rebuild_days(db: Session, start: date, end: date) -> int:
+    """重算 [start, end] 内每天的汇总（先删后写，不提交），返回有数据的天数"""
+    days = analytics.date_window(end, (end - start).days + 1)
+    rows = compute_daily(db, days)
+    customers = compute_active_customers(db, start, end)
+
+    db.query(models.DailyStats).filter(
+        models.DailyStats.stat_date >= start, models.DailyStats.stat_date <= end
+    ).delete(synchronize_session=False)
+    db.query(models.DailyActiveCustomer).filter(
+        models.DailyActiveCustomer.stat_date >= start, models.DailyActiveCustomer.stat_date <= end
+    ).delete(synchronize_session=False)
+
+    db.add_all([
+        models.DailyStats(stat_date=day, **{name: values.get(name) or 0 for name in METRICS})
+        for day, values in rows.items()
+    ])
+    db.add_all([
+        models.DailyActiveCustomer(stat_date=day, customer_id=customer_id)
+        for day, customer_id in customers
+    ])
+    db.flush()
+    return len(rows)
+
+
+def _day_runs(days: Iterable[date]) -> List[Tuple[date, date]]:
+    """将日期集合合并为连续区间 [(起, 止), ...]"""
+    runs: List[Tuple[date, date]] = []
+    for day in sorted(set(days)):
+        if runs and day == runs[-1][1] + timedelta(days=1):
+            runs[-1] = (runs[-1][0], day)
+        else:
+            runs.append((day, day))
+    return runs
+
+
+def changed_days_queries(db: Session, since: datetime) -> Dict[str, Any]:
+    """查找 since 之后新增或修改过的业务行所属日期的查询（不执行），按业务表命名"""
+    return {
+        "lease_orders": db.query(func.date(models.LeaseOrder.created_at)).filter(
+            models.LeaseOrder.updated_at > since
+        ),
+        "order_items": db.query(func.date(models.LeaseOrder.created_at)).select_from(models.OrderItem).join(
+            models.LeaseOrder, models.LeaseOrder.order_id == models.OrderItem.order_id
+        ).filter(models.OrderItem.created_at > since),
+        "inbound_records": db.query(func.date(models.InboundRecord.created_at)).filter(
+            models.InboundRecord.updated_at > since
+        ),
+        "return_records": db.query(func.date(models.ReturnRecord.return_date)).filter(
+            models.ReturnRecord.updated_at > since
+        ),
+    }
+
+
+def _changed_days(db: Session, since: datetime) -> Set[date]:
+    """since 之后新增或修改过的业务行所属的日期"""
+    days = set()
+    for query in changed_days_queries(db, since).values():
+        for (day,) in query.distinct():
+            if day is not None:
+                days.add(analytics.as_date(day))
+    return days
+
+
+def get_watermark(db: Session) -> Optional[datetime]:
+    """当前水位；汇总表不存在或尚未回填时返回 None"""
+    try:
+        return db.query(models.RollupWatermark.watermark).filter(
+            models.RollupWatermark.name == ROLLUP_NAME
+        ).scalar()
+    except Exception:
+        db.rollback()
+        return None
+
+
+def refresh(db: Session) -> Optional[int]:
+    """
+    增量刷新：重算水位之后有变化的日期并推进水位，返回重算的天数；尚未回填时返回 None
+    锁定水位行，多个进程同时刷新时依次执行
+    """
+    state = db.query(models.RollupWatermark).filter(
+        models.RollupWatermark.name == ROLLUP_NAME
+    ).with_for_update().first()
+    if state is None:
+        db.rollback()
+        return None
+
+    started_at = datetime.now()
+    days = _changed_days(db, state.watermark - REFRESH_OVERLAP)
+    for start, end in _day_runs(days):
+        rebuild_days(db, start, end)
+    state.watermark = started_at
+    db.commit()
+    # 在其他进程中完成回填时，由本进程的后台刷新切换到汇总表
+    mark_ready()
+    return len(days)
+
+
+def backfill(db: Session, start: Optional[date] = None, end: Optional[date] = None) -> int:
+    """
+    重算 [start, end] 内的汇总（默认从最早的业务数据到今天），按批提交，返回有数据的天数
+    首次回填完成后写入水位，之后的增量刷新从本次回填开始的时间算起
+    """
+    started_at = datetime.now()
+    end = end or date.today()
+    if start is None:
+        earliest = [
+            db.query(func.min(models.LeaseOrder.created_at)).scalar(),
+            db.query(func.min(models.InboundRecord.created_at)).scalar(),
+            db.query(func.min(models.ReturnRecord.return_date)).scalar(),
+        ]
+        earliest = [analytics.as_date(value) for value in earliest if value is not None]
+        start = min(earliest) if earliest else end
+
+    written = 0
+    batch_start = start
+    while batch_start <= end:
+        batch_end = min(batch_start + timedelta(days=BACKFILL_BATCH_DAYS - 1), end)
+        written += rebuild_days(db, batch_start, batch_end)
+        db.commit()
+        batch_start = batch_end + timedelta(days=1)
+
+    if get_watermark(db) is None:
+        db.add(models.RollupWatermark(name=ROLLUP_NAME, watermark=started_at))
+        db.commit()
+    mark_ready()
+    return written
+
+
+# ========== 读取 ==========
+# 汇总表是否可用（已回填）：服务启动时探测一次（见 capabilities.probe），不可用的结果同样缓存，
+# 读取时不再逐次查询水位；回填或增量刷新成功后置为可用
+_ready: Optional[bool] = None
+
+
+def probe(db: Session) -> bool:
+    """查询水位判断汇总表是否可用，记录并返回结果"""
+    global _ready
+    _ready = get_watermark(db) is not None
+    return _ready
+
+
+def mark_ready():
+    global _ready
+    _ready = True
+
+
+def known_ready() -> bool:
+    """最近一次探测（或回填 / 刷新）的结果，不查询数据库"""
+    return bool(_ready)
+
+
+def rollups_ready(db: Session) -> bool:
+    """汇总表是否可用（按已记录的结果；未经服务启动流程、尚未探测时先探测一次）"""
+    if _ready is None:
+        probe(db)
+    return _ready
+
+
+def daily_rows(db: Session, days: List[date], metrics: Iterable[str]) -> Dict[date, Dict[str, Any]]:
+    """
+    读取日期窗口（升序）内的指标，返回 {日期: {指标名: 值}}，没有数据的日期不会出现，
+    可直接用 analytics.fill_series 补齐；汇总表不可用时从业务表实时计算
+    """
+    metrics = list(metrics)
+    if not rollups_ready(db):
+        return compute_daily(db, days, metrics)
+    rows = db.query(
+        models.DailyStats.stat_date, *[getattr(models.DailyStats, name) for name in metrics]
+    ).filter(
+        models.DailyStats.stat_date >= days[0],
+        models.DailyStats.stat_date <= days[-1]
+    ).all()
+    return {analytics.as_date(row.stat_date): {name: getattr(row, name) for name in metrics} for row in rows}
+
+
+def monthly_totals(db: Session, metric: str, days: List[date]) -> Dict[str, Any]:
+    """日期窗口内某个可加指标按月（YYYY-MM）的合计"""
+    totals: Dict[str, Any] = {}
+    for day, values in daily_rows(db, days, [metric]).items():
+        month = date_ranges.month_key(day)
+        totals[month] = totals.get(month, 0) + (values[metric] or 0)
+    return totals
+
+
+def metric_total(db: Session, metric: str, since: Optional[date] = None):
+    """某个可加指标（不含 active_customers）自 since 起（默认全部历史）的合计"""
+    if not rollups_ready(db):
+        return _live_total(db, metric, since)
+    query = db.query(func.sum(getattr(models.DailyStats, metric)))
+    if since is not None:
+        query = query.filter(models.DailyStats.stat_date >= since)
+    return query.scalar() or 0
+
+
+def distinct_customers(db: Session, since: Optional[date] = None) -> int:
+    """自 since 起（默认全部历史）下过单的客户数（去重）"""
+    if not rollups_ready(db):
+        query = db.query(func.count(func.distinct(models.LeaseOrder.customer_id))).filter(
+            models.LeaseOrder.is_deleted == 0
+        )
+        if since is not None:
+            query = query.filter(models.LeaseOrder.created_at >= date_ranges.day_start(since))
+        return query.scalar() or 0
+    query = db.query(func.count(func.distinct(models.DailyActiveCustomer.customer_id)))
+    if since is not None:
+        query = query.filter(models.DailyActiveCustomer.stat_date >= since)
+    return query.scalar() or 0
+
+
+# ========== 后台刷新 ==========
+def refresh_once() -> Optional[int]:
+    db = SessionLocal()
+    try:
+        return refresh(db)
+    finally:
+        db.close()
+
+
+async def refresh_periodically(interval: float):
+    """后台任务：每 interval 秒增量刷新一次（同步刷新在线程池中执行）"""
+    while True:
+        try:
+            await asyncio.to_thread(refresh_once)
+        except Exception as e:
+            print(f"每日汇总刷新失败: {e}")
+        await asyncio.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="每日汇总表维护")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    backfill_parser = subparsers.add_parser("backfill", help="回填（重算）指定日期范围的汇总")
+    backfill_parser.add_argument("--start", type=date.fromisoformat, help="起始日期，默认最早的业务数据")
+    backfill_parser.add_argument("--end", type=date.fromisoformat, help="结束日期，默认今天")
+    subparsers.add_parser("refresh", help="执行一次增量刷新")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.command == "backfill":
+            written = backfill(db, args.start, args.end)
+            print(f"回填完成，{written} 天有数据")
+        else:
+            refreshed = refresh(db)
+            if refreshed is None:
+                print("汇总表尚未回填，请先运行: python rollups.py backfill")
+            else:
+                print(f"增量刷新完成，重算 {refreshed} 天")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
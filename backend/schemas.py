@@ -60,6 +60,15 @@ class EquipmentUpdate(BaseModel):
         return v
 
 
+# 设备状态返回给前端的中文显示值
+EQUIPMENT_STATUS_LABELS = {
+    EquipmentStatus.IN_STOCK: "在库",
+    EquipmentStatus.OUT: "已出库",
+    EquipmentStatus.MAINTENANCE: "维修中",
+    EquipmentStatus.SCRAPPED: "已报废",
+}
+
+
 class Equipment(EquipmentBase):
     equipment_id: int
     status: EquipmentStatus
@@ -69,13 +78,7 @@ class Equipment(EquipmentBase):
     @field_serializer('status')
     def serialize_status(self, value: EquipmentStatus) -> str:
         # Convert enum values back to Chinese for frontend compatibility
-        status_mapping = {
-            EquipmentStatus.IN_STOCK: "在库",
-            EquipmentStatus.OUT: "已出库",
-            EquipmentStatus.MAINTENANCE: "维修中",
-            EquipmentStatus.SCRAPPED: "已报废",
-        }
-        return status_mapping.get(value, str(value.value))
+        return EQUIPMENT_STATUS_LABELS.get(value, str(value.value))
 
     class Config:
         from_attributes = True
@@ -150,6 +153,10 @@ class LeaseOrderCreate(LeaseOrderBase):
     created_by: Optional[str] = None
 
 
+class LeaseOrderBatchCreate(BaseModel):
+    orders: List[LeaseOrderCreate] = Field(..., min_length=1, max_length=500)
+
+
 class LeaseOrderUpdate(BaseModel):
     voyage_no: Optional[str] = None
     expected_return_date: Optional[date] = None
@@ -340,9 +347,11 @@ class PageResponse(BaseModel):
     code: int = 200
     message: str = "success"
     data: List = []
-    total: int = 0
+    total: Optional[int] = 0  # count_mode=none 时为 None
     page: int = 1
     page_size: int = 10
+    next_cursor: Optional[str] = None  # 游标分页时的下一页游标
+    has_more: Optional[bool] = None  # 是否还有下一页
 
 
 # 统计数据 Schema
@@ -433,7 +442,9 @@ class TriggerLogResponse(TriggerLogBase):
 
 class TriggerLogListResponse(BaseModel):
     items: List[TriggerLogResponse]
-    total: int
+    total: Optional[int] = None
     page: int
     page_size: int
+    next_cursor: Optional[str] = None
+    has_more: Optional[bool] = None
 
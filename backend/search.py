@@ -0,0 +1,406 @@
+"""
+关键词搜索
+列表接口的 keyword 原先统一用 LIKE '%关键词%' 过滤，前导通配符无法使用索引，每次都全表扫描。
+本模块为装备、客户、订单、账单提供统一的关键词匹配与排名，后端由 SEARCH_BACKEND 配置：
+- like（默认）：LIKE '%关键词%'，与原行为一致
+- fulltext：MySQL FULLTEXT 索引（ngram 分词，见 migrations/add_fulltext_indexes.sql），
+  MATCH ... AGAINST 布尔模式短语查询，排名使用相关度
+- memory：进程内 n-gram 倒排索引，首次查询时从数据库构建，相关表写入后失效重建；
+  不依赖 MySQL，用于 SQLite 开发 / 测试环境
+关键词短于 n-gram 长度时 fulltext 无法匹配，回退为 LIKE
+
+编号前缀：操作员通常输入编号开头（CR-50、ORD-2026）。编号形态的输入（SEARCH_CODE_PREFIX 开启时）
+只在带唯一索引的编号列上做 LIKE '前缀%' 索引范围扫描，其余文本仍按上述后端做包含匹配；
+编号选择器的联想输入见 typeahead()
+"""
+import re
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import or_, select
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.orm import Session
+
+import models
+import settings
+from cache import TTLCache, on_tables_written
+from database import SessionLocal
+
+BACKEND_LIKE = "like"
+BACKEND_FULLTEXT = "fulltext"
+BACKEND_MEMORY = "memory"
+BACKENDS = (BACKEND_LIKE, BACKEND_FULLTEXT, BACKEND_MEMORY)
+
+# 与 MySQL ngram_token_size（默认 2）一致
+NGRAM_SIZE = 2
+# like / memory 后端排名时每类最多取的候选数（在 Python 中打分）
+CANDIDATE_LIMIT = 200
+
+# 可搜索的实体：title / subtitle 为搜索结果的展示列，columns 为匹配列（按权重从高到低）
+SEARCH_ENTITIES: Dict[str, Dict[str, Any]] = {
+    "equipment": {
+        "model": models.Equipment,
+        "columns": (models.Equipment.equipment_code, models.Equipment.equipment_name),
+        "title": models.Equipment.equipment_name,
+        "subtitle": models.Equipment.equipment_code,
+        "filters": [models.Equipment.is_deleted == 0],
+    },
+    "customers": {
+        "model": models.Customer,
+        "columns": (models.Customer.customer_name, models.Customer.contact_person),
+        "title": models.Customer.customer_name,
+        "subtitle": models.Customer.contact_person,
+        "filters": [models.Customer.is_deleted == 0],
+    },
+    "orders": {
+        "model": models.LeaseOrder,
+        "columns": (models.LeaseOrder.order_code, models.LeaseOrder.customer_name, models.LeaseOrder.voyage_no),
+        "title": models.LeaseOrder.order_code,
+        "subtitle": models.LeaseOrder.customer_name,
+        "filters": [models.LeaseOrder.is_deleted == 0],
+    },
+    "billing": {
+        "model": models.Billing,
+        "columns": (models.Billing.bill_code, models.Billing.customer_name),
+        "title": models.Billing.bill_code,
+        "subtitle": models.Billing.customer_name,
+        "filters": [models.Billing.is_deleted == 0],
+    },
+}
+
+
+# 编号形态：至少两个字母开头，后接数字或连字符（CR-50、ORD-2026、EQ0001、OUT2026）
+CODE_PATTERN = re.compile(r"^[A-Za-z]{2,10}[-0-9][A-Za-z0-9-]*$")
+
+# 带唯一索引的编号列（表名.列名）
+CODE_COLUMNS = {
+    "equipment.equipment_code",
+    "lease_orders.order_code",
+    "billing.bill_code",
+    "return_records.return_code",
+    "outbound_records.outbound_code",
+}
+
+
+def current_backend() -> str:
+    """当前配置的搜索后端"""
+    backend = (settings.SEARCH_BACKEND or BACKEND_LIKE).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"SEARCH_BACKEND 取值无效: {settings.SEARCH_BACKEND}（可选 {', '.join(BACKENDS)}）")
+    return backend
+
+
+def _backend_for(keyword: str) -> str:
+    backend = current_backend()
+    if backend == BACKEND_FULLTEXT and len(keyword) < NGRAM_SIZE:
+        return BACKEND_LIKE
+    return backend
+
+
+def _phrase(keyword: str) -> str:
+    """布尔模式短语：ngram 分词后按连续 n-gram 匹配，语义接近包含子串"""
+    return '"' + keyword.replace('"', ' ') + '"'
+
+
+def _primary_key(column):
+    return list(column.table.primary_key.columns)[0]
+
+
+# ========== 编号前缀 ==========
+def code_prefix(value: str) -> Optional[str]:
+    """编号形态的输入返回去除首尾空白后的前缀，否则返回 None（前缀只含字母、数字和连字符，无需转义）"""
+    value = (value or "").strip()
+    return value if CODE_PATTERN.match(value) else None
+
+
+def _code_column(columns):
+    """匹配列中的编号列（SEARCH_CODE_PREFIX 关闭时返回 None）"""
+    if not settings.SEARCH_CODE_PREFIX:
+        return None
+    return next((c for c in columns if f"{c.table.name}.{c.name}" in CODE_COLUMNS), None)
+
+
+def code_filter(column, value: str):
+    """编号字段的过滤条件：编号形态走 LIKE '前缀%'，其余文本按子串匹配"""
+    prefix = code_prefix(value) if _code_column([column]) is not None else None
+    if prefix is not None:
+        return column.like(prefix + "%")
+    return column.contains(value)
+
+
+# ========== 查询条件 ==========
+def keyword_filter(keyword: str, *columns):
+    """
+    ORM 查询的关键词条件：任一列包含关键词（columns 需属于同一张表）
+    关键词为编号形态且 columns 含编号列时，只按编号前缀匹配
+    """
+    code_column = _code_column(columns)
+    prefix = code_prefix(keyword)
+    if code_column is not None and prefix is not None:
+        return code_column.like(prefix + "%")
+    backend = _backend_for(keyword)
+    if backend == BACKEND_FULLTEXT:
+        return or_(*[match(column, against=_phrase(keyword)).in_boolean_mode() for column in columns])
+    if backend == BACKEND_MEMORY:
+        ids = _memory_index(columns[0].table.name).match(keyword, [column.name for column in columns])
+        if ids is not None:
+            return _primary_key(columns[0]).in_(ids)
+    return or_(*[column.contains(keyword) for column in columns])
+
+
+def keyword_sql(keyword: str, columns: Iterable, key: str, param: str = "keyword") -> Tuple[str, Dict[str, Any]]:
+    """
+    原生 SQL（视图查询）的关键词条件，返回 (SQL 片段, 参数)
+    视图中匹配列的列名与表中一致；key 为视图中对应表主键的列名
+    """
+    columns = list(columns)
+    backend = _backend_for(keyword)
+    table = columns[0].table
+    code_column = _code_column(columns)
+    prefix = code_prefix(keyword)
+    if code_column is not None and prefix is not None:
+        pk = _primary_key(columns[0]).name
+        return f"{key} IN (SELECT {pk} FROM {table.name} WHERE {code_column.name} LIKE :{param})", {param: prefix + "%"}
+    if backend == BACKEND_FULLTEXT:
+        matches = " OR ".join(f"MATCH({column.name}) AGAINST (:{param} IN BOOLEAN MODE)" for column in columns)
+        pk = _primary_key(columns[0]).name
+        return f"{key} IN (SELECT {pk} FROM {table.name} WHERE {matches})", {param: _phrase(keyword)}
+    if backend == BACKEND_MEMORY:
+        ids = _memory_index(table.name).match(keyword, [column.name for column in columns])
+        if ids is not None:
+            if not ids:
+                return "1 = 0", {}
+            return f"{key} IN ({', '.join(str(int(i)) for i in sorted(ids))})", {}
+    likes = " OR ".join(f"{column.name} LIKE :{param}" for column in columns)
+    return f"({likes})", {param: f"%{keyword}%"}
+
+
+# ========== 进程内倒排索引 ==========
+class NgramIndex:
+    """单表的 n-gram 倒排索引：{列: {n-gram: 主键集合}}，匹配结果再按子串校验，语义与 LIKE 一致"""
+
+    def __init__(self, table_name: str, columns: Iterable[str]):
+        self.table_name = table_name
+        self.columns = tuple(columns)
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._docs: Optional[Dict[Any, Dict[str, str]]] = None
+        self._postings: Dict[str, Dict[str, Set[Any]]] = {}
+
+    @staticmethod
+    def grams(text: str) -> Set[str]:
+        return {text[i:i + NGRAM_SIZE] for i in range(len(text) - NGRAM_SIZE + 1)}
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._docs = None
+
+    def _build(self) -> Tuple[Dict[Any, Dict[str, str]], Dict[str, Dict[str, Set[Any]]]]:
+        table = models.Base.metadata.tables[self.table_name]
+        pk = list(table.primary_key.columns)[0]
+        db = SessionLocal()
+        try:
+            rows = db.execute(select(pk, *[table.c[name] for name in self.columns])).all()
+        finally:
+            db.close()
+
+        docs: Dict[Any, Dict[str, str]] = {}
+        postings: Dict[str, Dict[str, Set[Any]]] = {name: {} for name in self.columns}
+        for row in rows:
+            key = row[0]
+            doc = {name: (value or "").lower() for name, value in zip(self.columns, row[1:])}
+            docs[key] = doc
+            for name, text in doc.items():
+                for gram in self.grams(text):
+                    postings[name].setdefault(gram, set()).add(key)
+        return docs, postings
+
+    def _snapshot(self):
+        with self._lock:
+            if self._docs is not None:
+                return self._docs, self._postings
+            generation = self._generation
+        docs, postings = self._build()
+        with self._lock:
+            # 构建期间发生写入时本次结果仍可使用，但不保留，下次查询重新构建
+            if generation == self._generation:
+                self._docs, self._postings = docs, postings
+        return docs, postings
+
+    def match(self, keyword: str, columns: Iterable[str]) -> Optional[Set[Any]]:
+        """任一列包含关键词的主键集合；列未建索引时返回 None"""
+        columns = list(columns)
+        if any(name not in self.columns for name in columns):
+            return None
+        docs, postings = self._snapshot()
+        needle = keyword.lower()
+        grams = self.grams(needle)
+        result: Set[Any] = set()
+        for name in columns:
+            if grams:
+                candidates = None
+                for gram in grams:
+                    ids = postings[name].get(gram, set())
+                    candidates = ids if candidates is None else candidates & ids
+                    if not candidates:
+                        break
+            else:
+                candidates = docs.keys()
+            result.update(key for key in candidates or () if needle in docs[key][name])
+        return result
+
+
+_indexes: Dict[str, NgramIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def _memory_index(table_name: str) -> NgramIndex:
+    with _indexes_lock:
+        index = _indexes.get(table_name)
+        if index is None:
+            columns = [
+                column.name
+                for spec in SEARCH_ENTITIES.values() if spec["model"].__tablename__ == table_name
+                for column in spec["columns"]
+            ]
+            index = _indexes[table_name] = NgramIndex(table_name, columns)
+        return index
+
+
+@on_tables_written
+def _invalidate_indexes(tables):
+    for name in tables:
+        index = _indexes.get(name)
+        if index is not None:
+            index.invalidate()
+
+
+# ========== 统一搜索 ==========
+def _text_score(keyword: str, values: List[Optional[str]]) -> float:
+    """like / memory 后端的排名分：完全相同 3、前缀 2、包含 1，按列顺序加权"""
+    needle = keyword.lower()
+    score = 0.0
+    for position, value in enumerate(values):
+        text = (value or "").lower()
+        if text == needle:
+            points = 3
+        elif text.startswith(needle):
+            points = 2
+        elif needle in text:
+            points = 1
+        else:
+            continue
+        score += points / (position + 1)
+    return score
+
+
+def _result(entity: str, spec: Dict[str, Any], row, score: float) -> Dict[str, Any]:
+    return {
+        "type": entity,
+        "id": getattr(row, _primary_key(spec["columns"][0]).key),
+        "title": getattr(row, spec["title"].key),
+        "subtitle": getattr(row, spec["subtitle"].key),
+        "score": round(float(score or 0), 4),
+    }
+
+
+def _search_entity(db: Session, entity: str, keyword: str, limit: int) -> List[Dict[str, Any]]:
+    spec = SEARCH_ENTITIES[entity]
+    model = spec["model"]
+    columns = spec["columns"]
+    filters = [*spec["filters"], keyword_filter(keyword, *columns)]
+
+    if _backend_for(keyword) == BACKEND_FULLTEXT:
+        score = sum(match(column, against=_phrase(keyword)).in_boolean_mode() for column in columns)
+        rows = db.query(model, score.label("score")).filter(*filters).order_by(score.desc()).limit(limit).all()
+        return [_result(entity, spec, row, row_score) for row, row_score in rows]
+
+    rows = db.query(model).filter(*filters).order_by(model.created_at.desc()).limit(CANDIDATE_LIMIT).all()
+    scored = [
+        _result(entity, spec, row, _text_score(keyword, [getattr(row, column.key) for column in columns]))
+        for row in rows
+    ]
+    scored.sort(key=lambda item: item["score"], reverse=True)
+    return scored[:limit]
+
+
+def search(db: Session, keyword: str, types: Optional[Iterable[str]] = None, limit: int = 10) -> List[Dict[str, Any]]:
+    """跨实体搜索，按相关度从高到低返回前 limit 条"""
+    keyword = keyword.strip()
+    if not keyword:
+        return []
+    types = list(types) if types else list(SEARCH_ENTITIES)
+    results: List[Dict[str, Any]] = []
+    for entity in types:
+        results.extend(_search_entity(db, entity, keyword, limit))
+    results.sort(key=lambda item: item["score"], reverse=True)
+    return results[:limit]
+
+
+# ========== 编号联想 ==========
+# 编号选择器（租赁、出库、归还表单）的联想输入：结果条数有上限，按 (来源, 输入, 条数) 缓存，
+# 来源表写入后失效
+TYPEAHEAD_MAX_LIMIT = 20
+TYPEAHEAD_CACHE_TTL = 30
+typeahead_cache = TTLCache("typeahead", TYPEAHEAD_CACHE_TTL)
+
+# entity 为 SEARCH_ENTITIES 中的实体：输入不是编号形态时按该实体的匹配列做包含匹配
+TYPEAHEAD_SOURCES: Dict[str, Dict[str, Any]] = {
+    "equipment": {
+        "code": models.Equipment.equipment_code,
+        "label": models.Equipment.equipment_name,
+        "filters": [models.Equipment.is_deleted == 0],
+        "entity": "equipment",
+    },
+    "order": {
+        "code": models.LeaseOrder.order_code,
+        "label": models.LeaseOrder.customer_name,
+        "filters": [models.LeaseOrder.is_deleted == 0],
+        "entity": "orders",
+    },
+    "outbound": {
+        "code": models.OutboundRecord.outbound_code,
+        "label": models.OutboundRecord.recipient,
+        "filters": [models.OutboundRecord.is_deleted == 0],
+    },
+    "return": {
+        "code": models.ReturnRecord.return_code,
+        "label": models.ReturnRecord.voyage_no,
+        "filters": [],
+    },
+}
+
+
+def _typeahead(db: Session, spec: Dict[str, Any], text: str, limit: int) -> List[Dict[str, Any]]:
+    code = spec["code"]
+    prefix = code_prefix(text)
+    if prefix is not None:
+        condition = code.like(prefix + "%")
+    elif spec.get("entity"):
+        condition = keyword_filter(text, *SEARCH_ENTITIES[spec["entity"]]["columns"])
+    else:
+        condition = code.contains(text)
+    rows = db.query(_primary_key(code), code, spec["label"]).filter(
+        *spec["filters"], condition
+    ).order_by(code).limit(limit).all()
+    return [{"id": row[0], "code": row[1], "label": row[2]} for row in rows]
+
+
+def typeahead(db: Session, source: str, text: str, limit: int = 10) -> List[Dict[str, Any]]:
+    """编号联想：编号形态的输入按编号前缀（走唯一索引，按编号排序），否则按包含匹配"""
+    text = text.strip()
+    if not text:
+        return []
+    limit = min(limit, TYPEAHEAD_MAX_LIMIT)
+    spec = TYPEAHEAD_SOURCES[source]
+    return typeahead_cache.get_or_compute(
+        (source, text, limit), lambda: _typeahead(db, spec, text, limit)
+    )
+
+
+@on_tables_written
+def _invalidate_typeahead(tables):
+    stale = {source for source, spec in TYPEAHEAD_SOURCES.items() if spec["code"].table.name in tables}
+    if stale:
+        typeahead_cache.invalidate(lambda key: key[0] in stale)
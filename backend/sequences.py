@@ -0,0 +1,287 @@
+"""
+单据编号序列
+设备、入库单、出库单、订单、账单、归还单的编号原先各自生成：max(id)+1 后再查一次是否重复，
+或使用精确到秒的时间戳（ORD-%Y%m%d%H%M%S），并发写入时会在唯一索引上冲突或需要额外查询。
+现统一从 document_sequences 表分配序号，每种单据一行，两种分配方式：
+    号段（默认）  在独立的短事务中一次取 block 个序号缓存在进程内，用完再取；
+                  序号唯一且单调递增，服务重启或事务回滚会留下空号，多进程之间不保证按时间先后
+                  block 为 1 时每次都在数据库中取号，序号按分配先后全局递增
+    连续（gapless） 在调用方的事务中取号，行锁持有到提交，回滚时序号一并回退，不留空号；
+                  同一种单据的写入因此串行，只用于要求编号连续的单据（账单）
+序列行不存在时按业务表当前最大ID初始化，新编号不会与旧编号重复
+用法:
+    python sequences.py status                    # 各序列的下一个序号
+    python sequences.py stress --threads 32       # 多线程并发取号，检查是否重复 / 连续
+"""
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy import func, literal, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import models
+import settings
+from cache import notify_tables_written
+from database import SessionLocal, engine
+
+EQUIPMENT = "equipment"
+INBOUND = "inbound"
+OUTBOUND = "outbound"
+ORDER = "order"
+BILL = "bill"
+RETURN = "return"
+
+# 序列名 -> 配置
+#   format  编号格式，value 为序号，date 为取号当天（YYYYMMDD）
+#   seed    (模型, 主键列)，序列行不存在时从该表最大ID + 1 开始
+#   block   号段大小（每次从数据库取的序号个数）
+#   gapless 在调用方事务中连续取号
+SEQUENCES: Dict[str, Dict[str, Any]] = {
+    EQUIPMENT: {
+        "format": "EQ{value:06d}",
+        "seed": (models.Equipment, "equipment_id"),
+        "block": settings.SEQUENCE_BLOCK_SIZE,
+        "gapless": False,
+    },
+    INBOUND: {
+        "format": "IN{date}{value:06d}",
+        "seed": (models.InboundRecord, "inbound_id"),
+        "block": settings.SEQUENCE_BLOCK_SIZE,
+        "gapless": False,
+    },
+    OUTBOUND: {
+        "format": "OUT{date}{value:06d}",
+        "seed": (models.OutboundRecord, "outbound_id"),
+        "block": settings.SEQUENCE_BLOCK_SIZE,
+        "gapless": False,
+    },
+    ORDER: {
+        "format": "ORD-{date}-{value:06d}",
+        "seed": (models.LeaseOrder, "order_id"),
+        "block": settings.SEQUENCE_BLOCK_SIZE,
+        "gapless": False,
+    },
+    BILL: {
+        "format": "BILL{date}{value:06d}",
+        "seed": (models.Billing, "bill_id"),
+        "block": 1,
+        "gapless": True,
+    },
+    RETURN: {
+        "format": "RET-{date}-{value:06d}",
+        "seed": (models.ReturnRecord, "return_id"),
+        "block": settings.SEQUENCE_BLOCK_SIZE,
+        "gapless": False,
+    },
+}
+
+_table = models.DocumentSequence.__table__
+
+# 进程内缓存的号段：{序列名: [下一个序号, 号段结束（不含）]}
+_blocks: Dict[str, List[int]] = {}
+_locks: Dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+# 已确认存在的序列行
+_created: Set[str] = set()
+
+
+def _lock(name: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(name, threading.Lock())
+
+
+def _seed_select(name: str):
+    # 初始序号：业务表最大ID + 1，与插入在同一条语句中计算
+    seed = SEQUENCES[name].get("seed")
+    now = literal(datetime.now())
+    if seed is None:
+        return select(literal(name), literal(1), now)
+    model, column = seed
+    return select(literal(name), func.coalesce(func.max(getattr(model, column)), 0) + 1, now)
+
+
+def _ensure_row(name: str):
+    """序列行不存在时在独立事务中创建（已被其他连接创建时忽略）"""
+    if name in _created:
+        return
+    try:
+        with engine.begin() as conn:
+            conn.execute(_table.insert().from_select(["name", "next_value", "updated_at"], _seed_select(name)))
+    except IntegrityError:
+        pass
+    else:
+        # 绕过会话的写入不会被自动追踪
+        notify_tables_written({_table.name})
+    _created.add(name)
+
+
+def _advance(db, name: str, count: int) -> int:
+    """序号前进 count 并返回本次分配的第一个序号；先 UPDATE 取得行锁再读取，并发取号不会重复"""
+    # 序列行须在取行锁之前创建：调用方事务中 UPDATE 未命中时持有的间隙锁会阻塞另一连接的插入
+    _ensure_row(name)
+    result = db.execute(
+        _table.update()
+        .where(_table.c.name == name)
+        .values(next_value=_table.c.next_value + count, updated_at=datetime.now())
+    )
+    if not result.rowcount:
+        _created.discard(name)
+        raise RuntimeError(f"序列 {name} 不存在")
+    return db.execute(select(_table.c.next_value).where(_table.c.name == name)).scalar_one() - count
+
+
+def _reserve_block(name: str, count: int) -> int:
+    with engine.begin() as conn:
+        first = _advance(conn, name, count)
+    notify_tables_written({_table.name})
+    return first
+
+
+def next_values(name: str, count: int = 1, db: Optional[Session] = None) -> List[int]:
+    """
+    分配 count 个序号
+    连续序列必须传入调用方的会话 db，序号随该事务提交生效；号段序列忽略 db
+    """
+    config = SEQUENCES[name]
+    if count < 1:
+        return []
+    if config["gapless"]:
+        if db is None:
+            raise ValueError(f"序列 {name} 为连续编号，需在调用方事务中取号")
+        first = _advance(db, name, count)
+        return list(range(first, first + count))
+
+    values: List[int] = []
+    with _lock(name):
+        block = _blocks.get(name)
+        if block is not None and block[0] < block[1]:
+            take = min(count, block[1] - block[0])
+            values.extend(range(block[0], block[0] + take))
+            block[0] += take
+        missing = count - len(values)
+        if missing:
+            size = max(config["block"], missing)
+            first = _reserve_block(name, size)
+            values.extend(range(first, first + missing))
+            _blocks[name] = [first + missing, first + size]
+    return values
+
+
+def format_code(name: str, value: int, when: Optional[datetime] = None) -> str:
+    """按序列的编号格式生成编号"""
+    return SEQUENCES[name]["format"].format(value=value, date=(when or datetime.now()).strftime("%Y%m%d"))
+
+
+def next_codes(name: str, count: int, db: Optional[Session] = None) -> List[str]:
+    """分配 count 个编号"""
+    now = datetime.now()
+    return [format_code(name, value, now) for value in next_values(name, count, db)]
+
+
+def next_code(name: str, db: Optional[Session] = None) -> str:
+    """分配一个编号"""
+    return next_codes(name, 1, db)[0]
+
+
+# ========== 命令行 ==========
+def status(db: Session) -> Dict[str, Optional[int]]:
+    """各序列在数据库中的下一个序号（未初始化为 None）"""
+    rows = dict(db.execute(select(_table.c.name, _table.c.next_value)).all())
+    return {name: rows.get(name) for name in SEQUENCES}
+
+
+def stress(threads: int, per_thread: int, gapless: bool) -> Dict[str, Any]:
+    """
+    多线程并发取号：每个线程取 per_thread 次，检查序号是否重复；
+    连续序列每 5 次另取一个号并回滚，检查提交的序号是否连续
+    使用临时序列，结束后删除，不占用业务序列的序号
+    """
+    name = f"_stress_{'gapless' if gapless else 'block'}"
+    SEQUENCES[name] = {
+        "format": "S{value:08d}",
+        "seed": None,
+        "block": 1 if gapless else settings.SEQUENCE_BLOCK_SIZE,
+        "gapless": gapless,
+    }
+
+    def worker(_) -> List[int]:
+        values = []
+        if not gapless:
+            for _ in range(per_thread):
+                values.extend(next_values(name))
+            return values
+        db = SessionLocal()
+        try:
+            for i in range(per_thread):
+                if i % 5 == 4:
+                    # 回滚的取号不占用序号
+                    next_values(name, db=db)
+                    db.rollback()
+                values.extend(next_values(name, db=db))
+                db.commit()
+        finally:
+            db.close()
+        return values
+
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            values = [value for chunk in pool.map(worker, range(threads)) for value in chunk]
+        elapsed = time.perf_counter() - started
+    finally:
+        with engine.begin() as conn:
+            conn.execute(_table.delete().where(_table.c.name == name))
+        notify_tables_written({_table.name})
+        SEQUENCES.pop(name, None)
+        _blocks.pop(name, None)
+        _created.discard(name)
+
+    total = threads * per_thread
+    duplicates = len(values) - len(set(values))
+    result = {
+        "sequence": name,
+        "allocated": len(values),
+        "expected": total,
+        "duplicates": duplicates,
+        "per_second": round(len(values) / elapsed, 1) if elapsed else None,
+    }
+    if gapless:
+        result["contiguous"] = sorted(values) == list(range(1, total + 1))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="单据编号序列")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("status", help="各序列的下一个序号")
+    stress_parser = subparsers.add_parser("stress", help="多线程并发取号，检查是否重复 / 连续")
+    stress_parser.add_argument("--threads", type=int, default=32, help="并发线程数")
+    stress_parser.add_argument("--per-thread", type=int, default=200, help="每个线程的取号次数")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        db = SessionLocal()
+        try:
+            for name, value in status(db).items():
+                print(f"{name}: {value if value is not None else '未初始化'}")
+        finally:
+            db.close()
+        return 0
+
+    exit_code = 0
+    for gapless in (False, True):
+        result = stress(args.threads, args.per_thread, gapless)
+        print(result)
+        if result["duplicates"] or result["allocated"] != result["expected"] or result.get("contiguous") is False:
+            exit_code = 1
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
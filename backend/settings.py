@@ -0,0 +1,101 @@
+"""
+应用配置
+从环境变量读取，启动时自动加载 backend/.env（如存在，参考 .env.example）
+已存在的环境变量优先于 .env 中的值
+"""
+import os
+from typing import Optional
+from urllib.parse import quote_plus
+
+from dotenv import load_dotenv
+
+load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env"))
+
+
+def _get_str(name: str, default: Optional[str] = None) -> Optional[str]:
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    return value.strip()
+
+
+def _get_int(name: str, default: int) -> int:
+    value = _get_str(name)
+    return int(value) if value is not None else default
+
+
+def _get_float(name: str, default: float) -> float:
+    value = _get_str(name)
+    return float(value) if value is not None else default
+
+
+def _get_bool(name: str, default: bool) -> bool:
+    value = _get_str(name)
+    if value is None:
+        return default
+    return value.lower() in ("1", "true", "yes", "on")
+
+
+# ========== 数据库连接 ==========
+DB_USER = _get_str("DB_USER", "root")
+DB_PASSWORD = _get_str("DB_PASSWORD", "123456")
+DB_HOST = _get_str("DB_HOST", "127.0.0.1")
+DB_PORT = _get_int("DB_PORT", 3306)
+DB_NAME = _get_str("DB_NAME", "port_equipment_db")
+
+# 直接提供 DATABASE_URL 时忽略上面的分项配置
+DATABASE_URL = _get_str("DATABASE_URL") or (
+    f"mysql+mysqldb://{quote_plus(DB_USER)}:{quote_plus(DB_PASSWORD)}"
+    f"@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+)
+
+# 只读副本（可选），未配置时读请求使用主库
+READ_REPLICA_URL = _get_str("READ_REPLICA_URL")
+
+
+def _async_url(url: Optional[str]) -> Optional[str]:
+    """将同步驱动的连接串转换为对应的异步驱动（mysqldb/pymysql -> aiomysql，sqlite -> aiosqlite）"""
+    if not url:
+        return url
+    for sync_prefix, async_prefix in (
+        ("mysql+mysqldb://", "mysql+aiomysql://"),
+        ("mysql+pymysql://", "mysql+aiomysql://"),
+        ("mysql://", "mysql+aiomysql://"),
+        ("sqlite://", "sqlite+aiosqlite://"),
+    ):
+        if url.startswith(sync_prefix):
+            return async_prefix + url[len(sync_prefix):]
+    return url
+
+
+# 异步接口使用的连接串，默认由同步连接串换用异步驱动得到
+ASYNC_DATABASE_URL = _get_str("ASYNC_DATABASE_URL") or _async_url(DATABASE_URL)
+ASYNC_READ_REPLICA_URL = _get_str("ASYNC_READ_REPLICA_URL") or _async_url(READ_REPLICA_URL)
+
+# ========== 连接池 ==========
+DB_POOL_SIZE = _get_int("DB_POOL_SIZE", 20)          # 常驻连接数
+DB_MAX_OVERFLOW = _get_int("DB_MAX_OVERFLOW", 30)    # 高峰期允许额外创建的连接数
+DB_POOL_TIMEOUT = _get_float("DB_POOL_TIMEOUT", 10)  # 等待空闲连接的超时时间（秒）
+DB_POOL_RECYCLE = _get_int("DB_POOL_RECYCLE", 3600)  # 连接最长使用时间（秒）
+DB_ECHO = _get_bool("DB_ECHO", False)                # 打印 SQL（仅用于开发调试）
+
+# ========== 会话 ==========
+# 单条 SELECT 的最长执行时间（毫秒，MySQL max_execution_time），0 表示不限制
+DB_STATEMENT_TIMEOUT_MS = _get_int("DB_STATEMENT_TIMEOUT_MS", 0)
+# 事务隔离级别，如 READ COMMITTED / REPEATABLE READ，未配置时使用数据库默认值
+DB_ISOLATION_LEVEL = _get_str("DB_ISOLATION_LEVEL")
+
+# ========== 接口 ==========
+# 工作台统计的各组查询是否在独立连接上并发执行（关闭时在同一会话上依次执行）
+DASHBOARD_PARALLEL_QUERIES = _get_bool("DASHBOARD_PARALLEL_QUERIES", True)
+# 每日汇总表（rollups.py）后台增量刷新间隔（秒），0 表示不在服务内刷新
+ROLLUP_REFRESH_SECONDS = _get_float("ROLLUP_REFRESH_SECONDS", 60)
+# 关键词搜索后端（search.py）：like 为 LIKE 模糊匹配；fulltext 使用 MySQL FULLTEXT ngram 索引
+# （需执行 migrations/add_fulltext_indexes.sql）；memory 使用进程内倒排索引（开发 / 测试环境）
+SEARCH_BACKEND = _get_str("SEARCH_BACKEND", "like")
+# 编号形态的关键词（如 CR-50、ORD-2026）只按编号前缀匹配，走编号列唯一索引的范围扫描
+SEARCH_CODE_PREFIX = _get_bool("SEARCH_CODE_PREFIX", True)
+# 单据编号（sequences.py）每次从数据库取的号段大小，1 表示每次取号都访问数据库
+SEQUENCE_BLOCK_SIZE = _get_int("SEQUENCE_BLOCK_SIZE", 20)
+# 设备可用性索引（availability.py）与数据库的定期核对间隔（秒），0 表示不定期核对
+AVAILABILITY_RECONCILE_SECONDS = _get_float("AVAILABILITY_RECONCILE_SECONDS", 300)
@@ -0,0 +1,108 @@
+"""
+统计计数核对
+stats_counters 表由数据库触发器在写入时增量维护（migrations/create_stats_counters.sql），
+每个统计项分散为多个槽位行，计数值为各槽位之和；
+本脚本从业务表重新计算全部统计项，输出与计数表的偏差并写回正确值（同时补齐缺失的槽位行）
+
+用法:
+    python stats_counters.py           # 重算并修正，输出偏差
+    python stats_counters.py --check   # 只核对不修改，存在偏差时退出码为 1
+"""
+import argparse
+import sys
+from typing import Any, Dict, List
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+import crud
+import models
+from database import SessionLocal
+
+# 金额类统计项允许的浮点误差
+AMOUNT_TOLERANCE = 0.005
+
+
+def compute_counters(db: Session) -> Dict[str, Any]:
+    """从业务表计算全部统计项（与工作台原聚合查询口径一致）"""
+    statements = crud.dashboard_stats_statements()
+    statements["totals"] = select(
+        select(func.count(models.LeaseOrder.order_id)).where(
+            models.LeaseOrder.is_deleted == 0
+        ).scalar_subquery().label("total_orders"),
+        select(func.count(models.ReturnRecord.return_id)).scalar_subquery().label("total_returned"),
+    )
+    values: Dict[str, Any] = {}
+    for statement in statements.values():
+        values.update(db.execute(statement).mappings().one())
+    return {
+        name: float(values[name] or 0) if name in crud.STATS_AMOUNT_COUNTERS else int(values[name] or 0)
+        for name in crud.STATS_COUNTER_NAMES
+    }
+
+
+def reconcile(db: Session, apply: bool = True) -> List[Dict[str, Any]]:
+    """
+    重算统计项并与计数表（各槽位之和）比较，返回存在偏差或缺少槽位行的统计项；
+    apply 为 True 时写回：槽位 0 写入重算结果，其余槽位清零，缺失的槽位行补齐（触发器只更新已存在的行）
+    先锁定全部槽位行再计算：已通过触发器修改计数的事务会先提交，之后的写入要等本次修正提交
+    后再累加增量，重算结果不会覆盖并发写入
+    """
+    stored: Dict[str, Dict[int, models.StatsCounter]] = {}
+    for row in db.query(models.StatsCounter).filter(
+        models.StatsCounter.name.in_(crud.STATS_COUNTER_NAMES)
+    ).with_for_update():
+        stored.setdefault(row.name, {})[row.slot] = row
+    actual = compute_counters(db)
+
+    drift = []
+    for name in crud.STATS_COUNTER_NAMES:
+        slots = stored.get(name, {})
+        current = sum(row.value for row in slots.values()) if slots else None
+        missing = sum(1 for slot in range(crud.STATS_COUNTER_SLOTS) if slot not in slots)
+        tolerance = AMOUNT_TOLERANCE if name in crud.STATS_AMOUNT_COUNTERS else 0
+        if current is None or abs(current - actual[name]) > tolerance or missing:
+            drift.append({"name": name, "stored": current, "actual": actual[name], "missing_slots": missing})
+        if apply:
+            for slot in range(crud.STATS_COUNTER_SLOTS):
+                value = actual[name] if slot == 0 else 0
+                row = slots.get(slot)
+                if row is None:
+                    db.add(models.StatsCounter(name=name, slot=slot, value=value))
+                else:
+                    row.value = value
+
+    if apply:
+        db.commit()
+    else:
+        db.rollback()
+    return drift
+
+
+def main():
+    parser = argparse.ArgumentParser(description="核对并修正工作台统计计数")
+    parser.add_argument("--check", action="store_true", help="只核对，不写回")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        drift = reconcile(db, apply=not args.check)
+    finally:
+        db.close()
+
+    if not drift:
+        print("统计计数与业务数据一致")
+        return 0
+    print(f"{'统计项':<24}{'计数表':>16}{'实际值':>16}{'缺少槽位':>10}")
+    for item in drift:
+        stored = "缺失" if item["stored"] is None else f"{item['stored']:.2f}"
+        print(f"{item['name']:<24}{stored:>16}{item['actual']:>16.2f}{item['missing_slots']:>10}")
+    if args.check:
+        print(f"{len(drift)} 项存在偏差（未修改）")
+        return 1
+    print(f"{len(drift)} 项存在偏差，已修正")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,392 @@
+"""
+物化汇总表
+列表视图（如 v_equipment_inventory）每次请求都要对全部订单明细分组聚合，统计总数时再聚合一次；
+物化表保存聚合结果，由数据库触发器在写入时增量维护，列表读取时按排序索引取当前页，再按主键关联
+    equipment_inventory     设备库存列表（migrations/create_equipment_inventory.sql）
+    customer_rental_stats   客户列表（migrations/create_rental_summaries.sql）
+    billing_summary         财务列表（migrations/create_rental_summaries.sql）
+
+物化表完成首次全量刷新后才会被读取：刷新时在 rollup_watermarks 记录刷新时间，
+尚未刷新（或物化表不存在）时列表仍读取原视图（读取来源的选择见 capabilities.read_source）；
+是否已刷新在服务启动时探测一次，在其他进程中刷新后调用 POST /api/system/capabilities/refresh 切换
+
+用法:
+    python summaries.py refresh                        # 从业务表全量重建全部物化表
+    python summaries.py refresh billing_summary        # 只重建指定的物化表
+    python summaries.py verify                         # 与原视图逐行核对，存在偏差时退出码为 1
+"""
+import argparse
+import sys
+from datetime import datetime
+from typing import Any, Dict, List, Set
+
+from sqlalchemy import and_, case, func, insert, select, text
+from sqlalchemy.orm import Session
+
+import models
+from database import SessionLocal
+
+EQUIPMENT_INVENTORY = "equipment_inventory"
+CUSTOMER_RENTAL_STATS = "customer_rental_stats"
+BILLING_SUMMARY = "billing_summary"
+
+# 金额类列允许的浮点误差
+AMOUNT_TOLERANCE = 0.005
+# 核对时最多输出的偏差行数
+VERIFY_PRINT_LIMIT = 20
+
+
+# ========== 设备库存 ==========
+# 读取来源：列与 v_equipment_inventory 一致，可以直接替换视图名（见 crud.equipment_view_query）
+EQUIPMENT_INVENTORY_SOURCE = """(
+    SELECT
+        e.equipment_id, e.equipment_code, e.equipment_name, e.category, e.status,
+        e.storage_location, e.purchase_price, e.daily_rental_rate, e.supplier, e.manufacturer,
+        e.purchase_date, e.warranty_date, e.last_maintenance_date, e.serial_number,
+        e.specifications, e.created_at, e.updated_at,
+        COALESCE(ei.available_quantity, 0) AS available_quantity,
+        COALESCE(ei.rented_quantity, 0) AS rented_quantity,
+        COALESCE(ei.maintenance_quantity, 0) AS maintenance_quantity,
+        COALESCE(ei.rental_count, 0) AS rental_count,
+        COALESCE(ei.total_rental_days, 0) AS total_rental_days,
+        COALESCE(ei.total_revenue, 0.0) AS total_revenue
+    FROM equipment e
+    LEFT JOIN equipment_inventory ei ON ei.equipment_id = e.equipment_id
+    WHERE e.is_deleted = 0
+) v_equipment_inventory"""
+
+
+def compute_equipment_inventory(db: Session) -> List[Dict[str, Any]]:
+    """从业务表计算每台设备（含已删除设备，与触发器一致）的库存统计，口径与 v_equipment_inventory 一致"""
+    rental_stats = db.query(
+        models.OrderItem.equipment_id.label("equipment_id"),
+        func.count(func.distinct(models.OrderItem.order_id)).label("rental_count"),
+        func.sum(models.OrderItem.rental_days).label("total_rental_days"),
+        func.sum(models.OrderItem.subtotal).label("total_revenue"),
+    ).join(
+        models.LeaseOrder, models.OrderItem.order_id == models.LeaseOrder.order_id
+    ).filter(
+        models.LeaseOrder.is_deleted == 0
+    ).group_by(models.OrderItem.equipment_id).subquery()
+
+    rows = db.query(
+        models.Equipment.equipment_id,
+        models.Equipment.status,
+        rental_stats.c.rental_count,
+        rental_stats.c.total_rental_days,
+        rental_stats.c.total_revenue,
+    ).outerjoin(
+        rental_stats, rental_stats.c.equipment_id == models.Equipment.equipment_id
+    ).all()
+    return [
+        {
+            "equipment_id": row.equipment_id,
+            "available_quantity": int(row.status == models.EquipmentStatus.IN_STOCK),
+            "rented_quantity": int(row.status == models.EquipmentStatus.OUT),
+            "maintenance_quantity": int(row.status == models.EquipmentStatus.MAINTENANCE),
+            "rental_count": int(row.rental_count or 0),
+            "total_rental_days": int(row.total_rental_days or 0),
+            "total_revenue": float(row.total_revenue or 0),
+        }
+        for row in rows
+    ]
+
+
+# ========== 客户租赁统计 ==========
+# 从物化表出发按 (total_rental_amount, customer_id) 索引取页，再按主键关联客户；
+# 每个客户都有一行（全量刷新写入全部客户，新增客户由触发器补行）
+CUSTOMER_RENTAL_STATS_SOURCE = """(
+    SELECT
+        c.customer_id, c.customer_name, c.contact_person, c.phone, c.email, c.address,
+        c.credit_rating, c.created_at,
+        s.total_orders, s.completed_orders, s.in_progress_orders, s.pending_orders,
+        s.total_rental_amount, s.paid_amount, s.pending_amount, s.total_equipment_count,
+        s.last_order_date, s.last_order_code
+    FROM customer_rental_stats s
+    JOIN customers c ON c.customer_id = s.customer_id
+    WHERE c.is_deleted = 0
+) v_customer_rental_stats"""
+
+
+def _order_item_counts(db: Session):
+    """每个订单的明细数与租赁天数（子查询）"""
+    return db.query(
+        models.OrderItem.order_id.label("order_id"),
+        func.count(models.OrderItem.item_id).label("equipment_count"),
+        func.sum(models.OrderItem.rental_days).label("total_rental_days"),
+    ).group_by(models.OrderItem.order_id).subquery()
+
+
+def compute_customer_rental_stats(db: Session) -> List[Dict[str, Any]]:
+    """从业务表计算每个客户（含已删除客户，与触发器一致）的租赁统计，口径与 v_customer_rental_stats 一致"""
+    item_counts = _order_item_counts(db)
+    order_stats = db.query(
+        models.LeaseOrder.customer_id.label("customer_id"),
+        func.count(func.distinct(models.LeaseOrder.order_id)).label("total_orders"),
+        func.sum(case((models.LeaseOrder.status == models.OrderStatus.COMPLETED, 1), else_=0)).label("completed_orders"),
+        func.sum(case((models.LeaseOrder.status == models.OrderStatus.IN_PROGRESS, 1), else_=0)).label("in_progress_orders"),
+        func.sum(case((models.LeaseOrder.status == models.OrderStatus.PENDING, 1), else_=0)).label("pending_orders"),
+        func.sum(models.LeaseOrder.total_amount).label("total_rental_amount"),
+        func.sum(func.coalesce(models.Billing.paid_amount, 0)).label("paid_amount"),
+        func.sum(case(
+            (models.Billing.status.in_([models.BillingStatus.PENDING, models.BillingStatus.CONFIRMED]),
+             func.coalesce(models.Billing.total_amount, 0)),
+            else_=0
+        )).label("pending_amount"),
+        func.sum(item_counts.c.equipment_count).label("total_equipment_count"),
+        func.max(models.LeaseOrder.created_at).label("last_order_date"),
+        func.max(models.LeaseOrder.order_code).label("last_order_code"),
+    ).outerjoin(
+        models.Billing,
+        and_(models.Billing.order_id == models.LeaseOrder.order_id, models.Billing.is_deleted == 0)
+    ).outerjoin(
+        item_counts, item_counts.c.order_id == models.LeaseOrder.order_id
+    ).filter(
+        models.LeaseOrder.is_deleted == 0
+    ).group_by(models.LeaseOrder.customer_id).subquery()
+
+    rows = db.query(
+        models.Customer.customer_id,
+        *[column for column in order_stats.c if column.key != "customer_id"]
+    ).outerjoin(
+        order_stats, order_stats.c.customer_id == models.Customer.customer_id
+    ).all()
+    return [
+        {
+            "customer_id": row.customer_id,
+            "total_orders": int(row.total_orders or 0),
+            "completed_orders": int(row.completed_orders or 0),
+            "in_progress_orders": int(row.in_progress_orders or 0),
+            "pending_orders": int(row.pending_orders or 0),
+            "total_rental_amount": float(row.total_rental_amount or 0),
+            "paid_amount": float(row.paid_amount or 0),
+            "pending_amount": float(row.pending_amount or 0),
+            "total_equipment_count": int(row.total_equipment_count or 0),
+            "last_order_date": row.last_order_date,
+            "last_order_code": row.last_order_code,
+        }
+        for row in rows
+    ]
+
+
+# ========== 账单明细统计 ==========
+# 从账单出发按 billing 的 (is_deleted, [status,] created_at, bill_id) 索引取页，
+# 订单明细统计按主键从物化表关联，不再对全部 order_items 分组
+BILLING_SUMMARY_SOURCE = """(
+    SELECT
+        b.bill_id, b.bill_code, b.order_id, lo.order_code, b.customer_name, c.customer_id,
+        c.contact_person, c.phone AS customer_phone, c.email AS customer_email,
+        b.rental_fee, b.repair_fee, b.other_fee, b.discount, b.total_amount, b.paid_amount,
+        (b.total_amount - COALESCE(b.paid_amount, 0)) AS unpaid_amount,
+        b.status AS billing_status, b.payment_method, b.invoice_no, b.billing_date,
+        b.payment_date, b.remarks, b.created_at, b.updated_at,
+        lo.voyage_no, lo.start_date, lo.expected_return_date, lo.actual_return_date,
+        lo.status AS order_status,
+        COALESCE(bs.equipment_count, 0) AS equipment_count,
+        COALESCE(bs.total_rental_days, 0) AS total_rental_days
+    FROM billing b
+    LEFT JOIN lease_orders lo ON b.order_id = lo.order_id
+    LEFT JOIN customers c ON lo.customer_id = c.customer_id
+    LEFT JOIN billing_summary bs ON bs.bill_id = b.bill_id
+    WHERE b.is_deleted = 0
+) v_billing_summary"""
+
+
+def compute_billing_summary(db: Session) -> List[Dict[str, Any]]:
+    """从业务表计算每张账单（含已删除账单，与触发器一致）所属订单的明细统计，口径与 v_billing_summary 一致"""
+    item_counts = _order_item_counts(db)
+    rows = db.query(
+        models.Billing.bill_id, models.Billing.order_id,
+        item_counts.c.equipment_count, item_counts.c.total_rental_days,
+    ).outerjoin(
+        item_counts, item_counts.c.order_id == models.Billing.order_id
+    ).all()
+    return [
+        {
+            "bill_id": row.bill_id,
+            "order_id": row.order_id,
+            "equipment_count": int(row.equipment_count or 0),
+            "total_rental_days": int(row.total_rental_days or 0),
+        }
+        for row in rows
+    ]
+
+
+# 物化表定义：model 物化表，key 主键列，columns 核对的列，amounts 其中的金额列，
+# view 原视图，source 物化表的读取来源，compute 从业务表计算全部行
+SUMMARIES: Dict[str, Dict[str, Any]] = {
+    EQUIPMENT_INVENTORY: {
+        "model": models.EquipmentInventory,
+        "key": "equipment_id",
+        "columns": (
+            "available_quantity", "rented_quantity", "maintenance_quantity",
+            "rental_count", "total_rental_days", "total_revenue",
+        ),
+        "amounts": ("total_revenue",),
+        "view": "v_equipment_inventory",
+        "source": EQUIPMENT_INVENTORY_SOURCE,
+        "compute": compute_equipment_inventory,
+    },
+    CUSTOMER_RENTAL_STATS: {
+        "model": models.CustomerRentalStats,
+        "key": "customer_id",
+        "columns": (
+            "total_orders", "completed_orders", "in_progress_orders", "pending_orders",
+            "total_rental_amount", "paid_amount", "pending_amount", "total_equipment_count",
+            "last_order_date", "last_order_code",
+        ),
+        "amounts": ("total_rental_amount", "paid_amount", "pending_amount"),
+        "view": "v_customer_rental_stats",
+        "source": CUSTOMER_RENTAL_STATS_SOURCE,
+        "compute": compute_customer_rental_stats,
+    },
+    BILLING_SUMMARY: {
+        "model": models.BillingSummary,
+        "key": "bill_id",
+        "columns": ("equipment_count", "total_rental_days"),
+        "amounts": (),
+        "view": "v_billing_summary",
+        "source": BILLING_SUMMARY_SOURCE,
+        "compute": compute_billing_summary,
+    },
+}
+
+
+# ========== 刷新与核对 ==========
+def refresh(db: Session, name: str) -> int:
+    """
+    从业务表全量重建物化表并标记为可读，返回写入的行数
+    先删除（锁定）全部行再计算：已通过触发器修改物化表的事务会先提交并计入本次计算，
+    之后的写入要等本次重建提交后再由触发器按业务表重算，不会被重建结果覆盖
+    """
+    summary = SUMMARIES[name]
+    started_at = datetime.now()
+    db.query(summary["model"]).delete(synchronize_session=False)
+    rows = summary["compute"](db)
+    if rows:
+        db.execute(insert(summary["model"]), rows)
+
+    state = db.get(models.RollupWatermark, name)
+    if state is None:
+        db.add(models.RollupWatermark(name=name, watermark=started_at))
+    else:
+        state.watermark = started_at
+    db.commit()
+    _ready.add(name)
+    return len(rows)
+
+
+def _same(stored: Any, actual: Any, tolerance: float) -> bool:
+    if stored is None or actual is None:
+        return stored is None and actual is None
+    if isinstance(stored, datetime) and isinstance(actual, str):
+        # SQLite 视图返回的日期时间为字符串
+        actual = datetime.fromisoformat(actual)
+    if isinstance(stored, (int, float)) and not isinstance(stored, bool):
+        return abs(float(stored) - float(actual)) <= tolerance
+    return stored == actual
+
+
+def verify(db: Session, name: str) -> List[Dict[str, Any]]:
+    """
+    将物化表与原视图逐行比较，返回存在偏差的 {主键, 列, 物化表值, 视图值}；
+    物化表缺少整行时列为 None
+    """
+    summary = SUMMARIES[name]
+    key, columns, model = summary["key"], summary["columns"], summary["model"]
+    expected = db.execute(
+        text(f"SELECT {key}, {', '.join(columns)} FROM {summary['view']}")
+    ).mappings().all()
+    stored = {getattr(row, key): row for row in db.query(model)}
+
+    drift = []
+    for row in expected:
+        current = stored.get(row[key])
+        if current is None:
+            drift.append({"key": row[key], "column": None, "stored": None, "actual": None})
+            continue
+        for column in columns:
+            tolerance = AMOUNT_TOLERANCE if column in summary["amounts"] else 0
+            if not _same(getattr(current, column), row[column], tolerance):
+                drift.append({
+                    "key": row[key], "column": column,
+                    "stored": getattr(current, column), "actual": row[column],
+                })
+    db.rollback()
+    return drift
+
+
+def _format(value: Any) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return str(value)
+
+
+# ========== 读取 ==========
+# 可读（已完成首次全量刷新）的物化表：服务启动时探测一次（见 capabilities.probe），不可读的结果同样以
+# 不在集合中表示，列表请求不再查询 rollup_watermarks；全量刷新后置为可读，其他进程刷新后调用
+# POST /api/system/capabilities/refresh 重新探测
+_ready: Set[str] = set()
+
+
+def probe(db: Session, name: str) -> bool:
+    """查询物化表是否已完成首次全量刷新，记录并返回结果（物化表不存在时为不可读）"""
+    try:
+        found = db.execute(
+            select(models.RollupWatermark.name).where(models.RollupWatermark.name == name)
+        ).scalar()
+    except Exception:
+        db.rollback()
+        found = None
+    if found is None:
+        _ready.discard(name)
+    else:
+        _ready.add(name)
+    return found is not None
+
+
+def known_ready(name: str) -> bool:
+    """物化表是否可读（按最近一次探测或刷新的结果，不查询数据库）"""
+    return name in _ready
+
+
+def main():
+    parser = argparse.ArgumentParser(description="物化汇总表维护")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for command, help_text in (("refresh", "从业务表全量重建物化表"), ("verify", "与原视图逐行核对")):
+        subparser = subparsers.add_parser(command, help=help_text)
+        subparser.add_argument("names", nargs="*", choices=list(SUMMARIES), help="物化表名称，默认全部")
+    args = parser.parse_args()
+    names = args.names or list(SUMMARIES)
+
+    db = SessionLocal()
+    exit_code = 0
+    try:
+        for name in names:
+            if args.command == "refresh":
+                written = refresh(db, name)
+                print(f"{name}: 重建完成，写入 {written} 行")
+                continue
+            drift = verify(db, name)
+            if not drift:
+                print(f"{name}: 与视图 {SUMMARIES[name]['view']} 一致")
+                continue
+            exit_code = 1
+            print(f"{name}: {len(drift)} 处与视图 {SUMMARIES[name]['view']} 不一致")
+            print(f"{'主键':<16}{'列':<24}{'物化表':>24}{'视图':>24}")
+            for item in drift[:VERIFY_PRINT_LIMIT]:
+                if item["column"] is None:
+                    print(f"{str(item['key']):<16}{'（整行缺失）':<24}")
+                    continue
+                print(f"{str(item['key']):<16}{item['column']:<24}{_format(item['stored']):>24}{_format(item['actual']):>24}")
+            if len(drift) > VERIFY_PRINT_LIMIT:
+                print(f"……其余 {len(drift) - VERIFY_PRINT_LIMIT} 处未列出")
+    finally:
+        db.close()
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
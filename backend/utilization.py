@@ -0,0 +1,177 @@
+"""
+设备利用率
+多维分析的"装备利用率"原先取出窗口内的订单明细区间后逐区间、逐日循环计数（O(区间数 × 天数)），
+分母为全部未删除设备（含已报废），同一台设备在重叠的多个订单中会被重复计数。
+本模块一次查询取出窗口内的租赁区间，在 NumPy 中：
+- 按设备排序后用分组累计最大值合并重叠区间，每台设备每天最多计一次
+- 差分数组 + 前缀和（sweep line）得到每天在租的设备台数
+- 分母为当天已入库（created_at）且未报废的设备台数，同样差分累计
+查询次数与窗口长度无关（设备一次、租赁区间一次），可按装备类型或存放位置分组
+在租的判定：订单未删除、未取消，开始日 <= d <= 归还日，归还日当天计为在租（与预订日历 availability.py 的约定相同）。
+归还日取实际归还日；未归还的订单一直在租；已完结但未填实际归还日的订单按预计归还日计，两者都未填写时只计开始日
+"""
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+import models
+
+# 分组方式 -> 设备列
+GROUP_COLUMNS = {
+    "category": models.Equipment.category,
+    "location": models.Equipment.storage_location,
+}
+GROUP_BY_PATTERN = "^(category|location)$"
+# 未填写存放位置的设备所在分组
+UNASSIGNED = "未指定"
+
+
+def _last_rental_day(status, start_date: date, expected_return_date: Optional[date], actual_return_date: Optional[date]) -> Optional[date]:
+    """在租的最后一天（含）：实际归还日；已完结未填时取预计归还日，都未填写时为开始日；未归还为 None（一直在租）"""
+    if actual_return_date:
+        return actual_return_date
+    if status == models.OrderStatus.COMPLETED:
+        return expected_return_date or start_date
+    return None
+
+
+def _day_offsets(values: List[Optional[date]], first_day: date, days: int, missing: int) -> np.ndarray:
+    """日期相对 first_day 的天数，截断到 [0, days]；空值为 missing（按日序号换算，比逐个转换 datetime64 快一个数量级）"""
+    origin = first_day.toordinal()
+    offsets = np.fromiter(
+        (missing if value is None else value.toordinal() - origin for value in values),
+        dtype=np.int64, count=len(values)
+    )
+    return np.clip(offsets, 0, days)
+
+
+def _merge_intervals(unit_index: np.ndarray, starts: np.ndarray, ends: np.ndarray, days: int):
+    """
+    合并同一设备的重叠 / 相接区间，返回合并后的 (设备序号, 开始, 结束)
+    各设备的区间平移到互不重叠的数轴段（设备序号 × (days + 1)）后，一次累计最大值即可按设备分组合并
+    """
+    order = np.lexsort((starts, unit_index))
+    unit_index, starts, ends = unit_index[order], starts[order], ends[order]
+    offset = unit_index * (days + 1)
+    shifted_starts = starts + offset
+    running_end = np.maximum.accumulate(ends + offset)
+    # 开始晚于之前区间的最大结束（含其他设备的数轴段）时开始新的合并区间
+    new = np.ones(len(starts), dtype=bool)
+    new[1:] = shifted_starts[1:] > running_end[:-1]
+    first = np.flatnonzero(new)
+    last = np.append(first[1:] - 1, len(starts) - 1)
+    return unit_index[first], shifted_starts[first] - offset[first], running_end[last] - offset[first]
+
+
+def _cumulative(groups: np.ndarray, positions: np.ndarray, weights: np.ndarray, group_count: int, days: int) -> np.ndarray:
+    """差分数组前缀和：在 (分组, 位置) 处累加 weights，返回 (分组数, days) 的逐日累计值"""
+    diff = np.bincount(groups * (days + 1) + positions, weights=weights, minlength=group_count * (days + 1))
+    return np.cumsum(diff.reshape(group_count, days + 1), axis=1)[:, :days].round().astype(np.int64)
+
+
+def _rate(occupied: np.ndarray, in_service: np.ndarray) -> List[float]:
+    rate = np.divide(occupied * 100.0, in_service, out=np.zeros(len(occupied)), where=in_service > 0)
+    return [round(value, 2) for value in rate.tolist()]
+
+
+def utilization(
+    db: Session,
+    first_day: date,
+    last_day: date,
+    group_by: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    [first_day, last_day] 内每天的在租设备台数、在役设备台数与利用率（%）
+    group_by 为 category / location 时另按装备类型 / 存放位置分组返回；
+    返回 {"days", "occupied", "in_service", "rate", "groups": [{"name", "occupied", "in_service", "rate"}]}
+    """
+    days = (last_day - first_day).days + 1
+    if days < 1:
+        raise ValueError("结束日期不能早于开始日期")
+
+    columns = [models.Equipment.equipment_id, models.Equipment.created_at]
+    if group_by is not None:
+        columns.append(GROUP_COLUMNS[group_by])
+    units = db.query(*columns).filter(
+        models.Equipment.is_deleted == 0,
+        models.Equipment.status != models.EquipmentStatus.SCRAPPED
+    ).order_by(models.Equipment.equipment_id).all()
+
+    rentals = db.query(
+        models.OrderItem.equipment_id,
+        models.LeaseOrder.status,
+        models.LeaseOrder.start_date,
+        models.LeaseOrder.expected_return_date,
+        models.LeaseOrder.actual_return_date
+    ).join(
+        models.LeaseOrder, models.LeaseOrder.order_id == models.OrderItem.order_id
+    ).filter(
+        models.LeaseOrder.is_deleted == 0,
+        models.LeaseOrder.status != models.OrderStatus.CANCELLED,
+        models.LeaseOrder.start_date <= last_day,
+        or_(
+            models.LeaseOrder.actual_return_date.is_(None),
+            models.LeaseOrder.actual_return_date >= first_day
+        )
+    ).all()
+
+    # 设备分组
+    if group_by is not None:
+        names = [row[2] or UNASSIGNED for row in units]
+        group_names = sorted(set(names))
+        group_lookup = {name: i for i, name in enumerate(group_names)}
+        unit_groups = np.array([group_lookup[name] for name in names], dtype=np.int64)
+    else:
+        group_names = []
+        unit_groups = np.zeros(len(units), dtype=np.int64)
+    group_count = max(len(group_names), 1)
+
+    # 在役台数：设备自入库当天起计入
+    unit_ids = np.array([row[0] for row in units], dtype=np.int64)
+    created = _day_offsets([row[1].date() if row[1] else None for row in units], first_day, days, 0)
+    in_service = _cumulative(unit_groups, created, np.ones(len(units)), group_count, days)
+
+    # 在租台数：区间映射到设备序号（已删除、已报废的设备不计），合并重叠后差分累计
+    occupied = np.zeros((group_count, days), dtype=np.int64)
+    if rentals and len(unit_ids):
+        rental_ids = np.array([row[0] for row in rentals], dtype=np.int64)
+        unit_index = np.minimum(np.searchsorted(unit_ids, rental_ids), len(unit_ids) - 1)
+        known = unit_ids[unit_index] == rental_ids
+        # 入库前的租赁记录（如补录的历史订单）从入库当天起计，保证在租台数不超过在役台数
+        starts = np.maximum(_day_offsets([row[2] for row in rentals], first_day, days, 0), created[unit_index])
+        # 区间为 [开始, 结束)：结束取在租最后一天的次日
+        last_days = [_last_rental_day(status, start, expected, actual) for _, status, start, expected, actual in rentals]
+        ends = _day_offsets([day + timedelta(days=1) if day else None for day in last_days], first_day, days, days)
+        known &= ends > starts
+        if known.any():
+            merged_units, merged_starts, merged_ends = _merge_intervals(
+                unit_index[known], starts[known], ends[known], days
+            )
+            merged_groups = unit_groups[merged_units]
+            occupied = _cumulative(
+                np.concatenate([merged_groups, merged_groups]),
+                np.concatenate([merged_starts, merged_ends]),
+                np.concatenate([np.ones(len(merged_starts)), -np.ones(len(merged_ends))]),
+                group_count, days
+            )
+
+    total_occupied = occupied.sum(axis=0)
+    total_in_service = in_service.sum(axis=0)
+    return {
+        "days": [date.fromordinal(first_day.toordinal() + i) for i in range(days)],
+        "occupied": total_occupied.tolist(),
+        "in_service": total_in_service.tolist(),
+        "rate": _rate(total_occupied, total_in_service),
+        "groups": [
+            {
+                "name": name,
+                "occupied": occupied[i].tolist(),
+                "in_service": in_service[i].tolist(),
+                "rate": _rate(occupied[i], in_service[i]),
+            }
+            for i, name in enumerate(group_names)
+        ],
+    }